@@ -1,90 +1,255 @@
 import random
 import numpy as np
-from datetime import datetime
-from stable_baselines3 import PPO
-from stable_baselines3.common.env_checker import check_env
 import gymnasium as gym
+import instrumentation
+from ant_core import make_tables, run_steps, turn_string_from_rules
+from highway import HighwayDetector
+from observations import HISTOGRAM_BLOCK, Observer
+from packed_grid import PackedGrid
+from results_log import default_sink, rules_record
+from results_store import ResultsStore
+from snapshot import load_snapshot, save_snapshot
+from sparse_grid import ChunkedGrid
 
 # Constants
 GRID_SIZE = 160
 STEPS_BEFORE_CHECK = 50000  # Check for highway after this many steps
+STEPS_PER_ACTION = 100  # Steps simulated after every action
 MAX_HIGHWAYS = 10  # Maximum number of different highways to find
+NUM_ENVS = 16  # Environments stepped together by the batched VecEnv during training
+# "batched": all environments in this process (vec_env), "shm": one worker
+# process per environment, sharing grids and observations (shm_vec_env)
+VEC_ENV = "batched"
+OBS_MODE = "local"  # "local", "histogram" or "grid", see observations.Observer
 
 # Directions (up, right, down, left)
 DIRECTIONS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
 
 class LangtonsAntEnv(gym.Env):
-    def __init__(self):
+    def __init__(self, grid_backend="dense", results_store=None, obs_mode=OBS_MODE, results_log=None,
+                 recorder=None, grid=None):
         super().__init__()
+        # "dense": GRID_SIZE torus, "sparse": unbounded plane observed around the origin,
+        # "packed": GRID_SIZE torus at 1 bit per cell, 4 bits once a third color is added
+        if grid_backend not in ("dense", "sparse", "packed"):
+            raise ValueError(f"Unknown grid backend {grid_backend!r}")
+        self.grid_backend = grid_backend
+        # Optional ResultsStore: rulesets with a known outcome are looked up instead of simulated,
+        # and highways from clean runs on the unbounded plane are stored
+        self.results_store = results_store
+        # ResultsSink that successful rulesets are logged to, the shared default one if None
+        self.results_log = default_sink() if results_log is None else results_log
+        # Optional recorder.Recorder: the observed grid is queued to it every `recorder.every` steps
+        self.recorder = recorder
         self.action_space = gym.spaces.Discrete(2)  # 0: add rule, 1: remove rule
-        # Flatten the observation space to 1D
-        self.observation_space = gym.spaces.Box(low=0, high=1, shape=(GRID_SIZE * GRID_SIZE,), dtype=np.uint8)
-        # Initialize all instance variables
-        self.grid = None
+        # Observations are built into the observer's preallocated buffer
+        self.observer = Observer(obs_mode, grid_size=GRID_SIZE)
+        self.observation_space = self.observer.space
+        # Initialize all instance variables; the grid is allocated once and cleared on reset
+        if grid is not None and grid_backend != "dense":
+            raise ValueError("Only dense grids can be given a buffer")
+        # Caller-owned (GRID_SIZE, GRID_SIZE) uint8 buffer, e.g. in shared memory, stepped in place
+        self.shared_grid = grid
+        if grid_backend == "sparse":
+            self.grid = ChunkedGrid()
+        elif grid_backend == "packed":
+            self.grid = PackedGrid(GRID_SIZE, GRID_SIZE)
+        elif grid is not None:
+            if grid.shape != (GRID_SIZE, GRID_SIZE) or grid.dtype != np.uint8:
+                raise ValueError(f"grid must be a ({GRID_SIZE}, {GRID_SIZE}) uint8 array")
+            self.grid = grid
+        else:
+            self.grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
         self.x = None
         self.y = None
         self.dir = None
         self.rules = None
         self.turns = None
-        self.previous_positions = None
+        self.rule_table = None
+        self.turn_table = None
+        self.highway_detector = HighwayDetector()
+        self.headings = np.empty(STEPS_PER_ACTION, dtype=np.uint8)  # Per-step history buffers for the detector
+        self.colors = np.empty(STEPS_PER_ACTION, dtype=np.uint8)
         self.steps = None
         self.highway_detected = None
+        # True while the episode has run one ruleset from an empty grid, the
+        # only runs whose outcome is the ruleset's own and fit for the store
+        self.clean_run = None
         # Reset the environment
         self.reset()
     
     def step(self, action):
+        # One action, then STEPS_PER_ACTION simulated steps. The episode ends
+        # (terminated) on a highway or on reaching STEPS_BEFORE_CHECK without
+        # one; the caller resets, as with any Gymnasium env. The results store
+        # never ends an episode early: every episode starts from RL and grows
+        # one color at a time through rulesets a search has already stored.
+        # It only withholds the reward and log of a highway that is already
+        # known (as does the results log for one already logged), and skips simulating the last steps of a budget spent on a
+        # ruleset known not to form one. vec_env's BatchedLangtonsAntVecEnv
+        # gives the same rewards and dones.
         if action == 0:
             self.add_rule()
         elif action == 1:
             self.remove_rule()
-        
-        for _ in range(100):  # Simulate 100 steps per action
-            self._move_ant()
-        
-        self.steps += 100
+
         reward = 0
-        
+        info = {}
+        known = self.lookup_known_result()
+        if known is not None:
+            info["known_outcome"] = known["outcome"]
+            if known["outcome"] != "highway" and self.steps + STEPS_PER_ACTION >= STEPS_BEFORE_CHECK:
+                # The budget runs out with this action: end with the known outcome
+                reward -= 20  # Same penalty as failing to create a highway
+                return self._observation(), reward, True, False, info
+
+        self._move_ant(STEPS_PER_ACTION)
+        self.steps += STEPS_PER_ACTION
+        if self.recorder is not None and self.recorder.advance(STEPS_PER_ACTION):
+            self.recorder.capture(self.observed_grid())
+
         # Check for highway formation
         if self.detect_highway():
-            reward += 50  # Large reward for highway
+            highway = self.highway_detector.highway
+            info["highway_period"], info["highway_drift"] = highway.period, highway.drift
             self.highway_detected = True
-            self.save_successful_rules()
-            # Reset the environment to search for a new highway
-            self.reset()
-        
-        if self.steps >= STEPS_BEFORE_CHECK and not self.highway_detected:
+            # A highway that is already known or logged earns nothing, the goal is finding new ones
+            if (known is None or known["outcome"] != "highway") and self.save_successful_rules():
+                reward += 50  # Large reward for highway
+                self.store_result(highway)
+        elif self.steps >= STEPS_BEFORE_CHECK:
             reward -= 20  # Penalize for failing to create a highway
-            # Reset the environment to try again
-            self.reset()
-        
-        terminated = self.steps >= STEPS_BEFORE_CHECK
+
+        terminated = self.highway_detected or self.steps >= STEPS_BEFORE_CHECK
         truncated = False  # We don't truncate episodes early
-        
-        # Normalize the grid values to stay within observation space bounds
-        normalized_grid = np.clip(self.grid, 0, 1)
-        return normalized_grid.flatten(), reward, terminated, truncated, {}
+        return self._observation(), reward, terminated, truncated, info
+
+    def _observation(self):
+        # Row of the observer's buffer (a view of the grid in "grid" mode), valid until the next step
+        with instrumentation.phase("env.observe"):
+            observation = self._build_observation()
+        instrumentation.count("observation_bytes", observation.nbytes)
+        return observation
+
+    def _build_observation(self):
+        observer = self.observer
+        if observer.mode == "histogram":
+            return observer.histogram()[0]
+        if self.grid_backend == "dense":
+            return observer.observe(self.grid[None], np.array([self.x]), np.array([self.y]))[0]
+        if observer.mode == "local":
+            size = observer.local_size
+            x0, y0 = self.x - size // 2, self.y - size // 2
+        elif self.grid_backend == "packed":
+            # Packed grid mode: unpacked straight into the observation buffer
+            self.grid.unpack(out=observer.buffer[0].reshape(GRID_SIZE, GRID_SIZE))
+            return observer.buffer[0]
+        else:
+            size = GRID_SIZE
+            x0 = y0 = -(GRID_SIZE // 2)
+        # Sparse grids are observed around the origin, packed ones are a torus the window wraps around
+        self.grid.window(x0, y0, size, size, out=observer.buffer[0].reshape(size, size))
+        return observer.buffer[0]
     
-    def reset(self, seed=None):
+    def reset(self, seed=None, options=None):
         super().reset(seed=seed)
-        self.grid = np.zeros((GRID_SIZE, GRID_SIZE), dtype=np.uint8)
-        self.x, self.y = GRID_SIZE // 2, GRID_SIZE // 2
+        instrumentation.count("resets")
+        if options and options.get("snapshot"):
+            # Start the episode from a saved warm-up state instead of an empty grid
+            self.load_snapshot(options["snapshot"])
+            return self._observation(), {}
+        if self.grid_backend == "sparse":
+            self.grid.clear()
+            self.x, self.y = 0, 0
+        elif self.grid_backend == "packed":
+            if self.grid.bits != 1:
+                self.grid = PackedGrid(GRID_SIZE, GRID_SIZE)
+            self.grid.clear()
+            self.x, self.y = GRID_SIZE // 2, GRID_SIZE // 2
+        else:
+            self.grid.fill(0)
+            self.x, self.y = GRID_SIZE // 2, GRID_SIZE // 2
         self.dir = 0
         self.rules = {0: 1, 1: 0}
         self.turns = {0: 1, 1: -1}
-        self.previous_positions = set()  # Initialize as empty set
+        self.update_tables()
+        self.observer.reset()
+        self.highway_detector.reset()
         self.steps = 0
         self.highway_detected = False
-        return self.grid.flatten(), {}
+        self.clean_run = True
+        return self._observation(), {}
+
+    def save_snapshot(self, path):
+        save_snapshot(path, self.grid, self.x, self.y, self.dir, self.rules, self.turns, self.steps)
+
+    def load_snapshot(self, path):
+        # The grid is memory-mapped copy-on-write, so many environments can
+        # fork from one snapshot file. The highway detector starts empty.
+        header, grid = load_snapshot(path)
+        if self.grid_backend == "sparse" and not isinstance(grid, ChunkedGrid):
+            raise ValueError("Snapshot does not hold a sparse grid")
+        if self.grid_backend == "packed" and not isinstance(grid, PackedGrid):
+            raise ValueError("Snapshot does not hold a packed grid")
+        if self.grid_backend != "sparse" and getattr(grid, "shape", None) != (GRID_SIZE, GRID_SIZE):
+            raise ValueError(f"Snapshot does not hold a {GRID_SIZE}x{GRID_SIZE} grid")
+        if self.shared_grid is not None:
+            # Keep stepping the caller's buffer: copy the snapshot in instead of mapping it
+            self.shared_grid[:] = grid
+            grid = self.shared_grid
+        self.grid = grid
+        self.x, self.y, self.dir, self.steps = header["x"], header["y"], header["dir"], header["steps"]
+        self.rules, self.turns = header["rules"], header["turns"]
+        self.update_tables()
+        self.highway_detector.reset()
+        self.highway_detected = False
+        self.clean_run = False
+        self.observer.reset()
+        if self.observer.mode == "histogram" and self.grid_backend == "packed":
+            # A band of block rows at a time, never the whole board unpacked
+            for block_row in range(GRID_SIZE // HISTOGRAM_BLOCK):
+                band = self.grid.window(0, block_row * HISTOGRAM_BLOCK, GRID_SIZE, HISTOGRAM_BLOCK)
+                self.observer.recount(0, band, block_row)
+        elif self.observer.mode == "histogram":
+            self.observer.recount(0, self.observed_grid())
+
+    def update_tables(self):
+        self.rule_table, self.turn_table = make_tables(self.rules, self.turns)
+        self.observer.set_rules(0, self.turns)
+
+    def observed_grid(self):
+        # The GRID_SIZE x GRID_SIZE area the agent sees
+        if self.grid_backend == "sparse":
+            return self.grid.window(-(GRID_SIZE // 2), -(GRID_SIZE // 2), GRID_SIZE, GRID_SIZE)
+        if self.grid_backend == "packed":
+            return self.grid.unpack()
+        return self.grid
     
-    def _move_ant(self):
-        current_color = int(self.grid[self.y, self.x])  # Convert to int to ensure valid key
-        if current_color in self.rules:  # Only proceed if color exists in rules
-            self.grid[self.y, self.x] = self.rules[current_color]
-            self.dir = (self.dir + self.turns[current_color]) % 4
-            dx, dy = DIRECTIONS[self.dir]
-            self.x = (self.x + dx) % GRID_SIZE
-            self.y = (self.y + dy) % GRID_SIZE
-            self.previous_positions.add((self.x, self.y))
+    def _move_ant(self, steps=1):
+        # The core stops early on a color that has no rule, leaving the ant in place
+        if len(self.headings) < steps:
+            self.headings = np.empty(steps, dtype=np.uint8)
+            self.colors = np.empty(steps, dtype=np.uint8)
+        x0, y0 = self.x, self.y
+        with instrumentation.phase("env.simulate"):
+            if self.grid_backend != "dense":
+                self.x, self.y, self.dir, taken = self.grid.run_steps(self.x, self.y, self.dir,
+                                                                      self.rule_table, self.turn_table, steps,
+                                                                      self.headings, self.colors)
+            else:
+                self.x, self.y, self.dir, taken = run_steps(self.grid, self.x, self.y, self.dir,
+                                                            self.rule_table, self.turn_table, steps,
+                                                            self.headings, self.colors)
+        instrumentation.count("steps", taken)
+        # Stream the recorded (heading, color) history into the highway detector
+        with instrumentation.phase("env.highway"):
+            self.highway_detector.extend(self.headings[:taken], self.colors[:taken])
+        # Keep the observation histogram in step with the cells just rewritten
+        with instrumentation.phase("env.observe"):
+            offset = GRID_SIZE // 2 if self.grid_backend == "sparse" else 0
+            self.observer.record(np.array([x0 + offset]), np.array([y0 + offset]),
+                                 self.headings[:taken, None], self.colors[:taken, None], self.rule_table[None],
+                                 wrap=self.grid_backend != "sparse")
     
     def add_rule(self):
         if len(self.rules) < 10:  # Limit to 10 rules
@@ -92,48 +257,91 @@ class LangtonsAntEnv(gym.Env):
             self.rules[new_color] = 0
             self.rules[new_color - 1] = new_color
             self.turns[new_color] = random.choice([-1, 1])
+            if self.grid_backend == "packed" and len(self.rules) > self.grid.colors:
+                self.grid = self.grid.repacked(4)  # A third color needs more than 1 bit per cell
+            self.update_tables()
+            self.clean_run = self.clean_run and self.steps == 0
     
     def remove_rule(self):
         if len(self.rules) > 2:
             last_color = len(self.rules) - 1
             # Convert all cells with the last color to 0
-            self.grid[self.grid == last_color] = 0
+            if self.grid_backend == "dense":
+                self.grid[self.grid == last_color] = 0
+            else:
+                self.grid.replace(last_color, 0)
             del self.rules[last_color]
             del self.turns[last_color]
+            self.update_tables()
+            self.observer.replace_color(0, last_color, 0)
+            self.clean_run = self.clean_run and self.steps == 0
     
+    def lookup_known_result(self):
+        # Outcome of the current ruleset from the results store, if it has a full-length result
+        if self.results_store is None:
+            return None
+        turn_string = turn_string_from_rules(self.rules, self.turns)
+        if turn_string is None:
+            return None
+        return self.results_store.get(turn_string, min_steps=STEPS_BEFORE_CHECK)
+
+    def store_result(self, highway):
+        # The store holds what a ruleset does on its own from an empty plane
+        # (see ruleset_search). A highway found after rule changes, from a
+        # snapshot or on a torus the trail may have wrapped around is a
+        # property of this episode, not of the ruleset, and is only logged.
+        if self.results_store is None or not self.clean_run or self.grid_backend != "sparse":
+            return
+        turn_string = turn_string_from_rules(self.rules, self.turns)
+        if turn_string is not None:
+            self.results_store.put({"turns": turn_string, "outcome": "highway", "steps": highway.step,
+                                    "period": highway.period, "drift": list(highway.drift)})
+
     def detect_highway(self):
-        last_positions = list(self.previous_positions)[-50:]
-        if len(set(last_positions)) == 1:
-            return True  # If the last 50 positions are the same, it's a highway
-        return False
+        # The detector checks the step history as it streams in, so this is a lookup
+        return self.highway_detector.highway is not None
     
     def save_successful_rules(self):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open("successful_rules.txt", "a") as file:
-            file.write(f"\n=== Successful Rules Found at {timestamp} ===\n")
-            file.write(f"Steps taken: {self.steps}\n")
-            file.write("Rules:\n")
-            for color, next_color in self.rules.items():
-                file.write(f"  Color {color} -> {next_color} (Turn: {self.turns[color]})\n")
-            file.write("=" * 50 + "\n")
+        # False if the ruleset's highway was logged before
+        highway = self.highway_detector.highway
+        return self.results_log.write(rules_record(self.rules, self.turns, self.steps,
+                                            highway and highway.period, highway and highway.drift, "env"))
 
 
 def main():
-    # Initialize and check environment
-    env = LangtonsAntEnv()
+    # SB3 pulls in torch, which takes seconds to import, so only training loads it
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.env_checker import check_env
+    from training_callbacks import InstrumentationCallback
+
+    # Initialize and check environment, sharing outcomes with ruleset_search.py
+    results_store = ResultsStore()
+    results_log = default_sink()
+    env = LangtonsAntEnv(results_store=results_store, obs_mode=OBS_MODE, results_log=results_log)
     check_env(env)
 
-    # Create and train the model
-    model = PPO("MlpPolicy", env, verbose=1)
+    # Create and train the model on a batch of environments stepped together
+    if VEC_ENV == "shm":
+        from shm_vec_env import SharedMemoryVecEnv
+        train_env = SharedMemoryVecEnv(NUM_ENVS, obs_mode=OBS_MODE, results_store_path=results_store.path,
+                                       results_log=results_log)
+    else:
+        from vec_env import BatchedLangtonsAntVecEnv
+        train_env = BatchedLangtonsAntVecEnv(NUM_ENVS, results_store=results_store, obs_mode=OBS_MODE,
+                                             results_log=results_log)
+    model = PPO("MlpPolicy", train_env, verbose=1)
     
     # Train until we find MAX_HIGHWAYS different highways
-    highways_found = 0
+    # The log keeps its own running count of distinct rulesets, so the file is never re-read
+    highways_found = len(results_log)
     total_timesteps = 0
     max_timesteps = 1000000  # Maximum total training steps
     
     while highways_found < MAX_HIGHWAYS and total_timesteps < max_timesteps:
         # Train for a batch of steps
-        model.learn(total_timesteps=100000)
+        # With ANT_PROFILE=1 the phase timings are logged alongside the training stats
+        callback = InstrumentationCallback() if instrumentation.ENABLED else None
+        model.learn(total_timesteps=100000, callback=callback)
         total_timesteps += 100000
         
         # Test the current model
@@ -145,8 +353,7 @@ def main():
             done = terminated or truncated
         
         # Count highways found
-        with open("successful_rules.txt", "r") as file:
-            highways_found = file.read().count("=== Successful Rules Found")
+        highways_found = len(results_log)
         
         print(f"Highways found: {highways_found}/{MAX_HIGHWAYS}")
         print(f"Total timesteps: {total_timesteps}")
@@ -0,0 +1,146 @@
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # Numba is optional, fall back to the pure Python loop
+    HAVE_NUMBA = False
+
+# Constants
+MAX_COLORS = 256  # Every value a uint8 cell can hold
+NO_RULE = -1  # Marks a color without a rule; the ant stops when it reads one
+
+# Directions (up, right, down, left) as separate x and y offsets
+DX = (0, 1, 0, -1)
+DY = (-1, 0, 1, 0)
+
+
+def make_tables(rules, turns):
+    # Turn the color -> color and color -> turn dicts into flat lookup tables
+    rule_table = np.full(MAX_COLORS, NO_RULE, dtype=np.int16)
+    turn_table = np.zeros(MAX_COLORS, dtype=np.int8)
+    for color, next_color in rules.items():
+        rule_table[color] = next_color
+        turn_table[color] = turns[color]
+    return rule_table, turn_table
+
+
+def _step_loop(cells, width, height, x, y, d, rules, turns, steps, headings, colors, wrap):
+    # Shared by both backends: Numba compiles it as is, the Python backend
+    # runs it over memoryviews and plain lists. When the trace arrays are long
+    # enough, the direction the ant moved in and the color it read are
+    # recorded for every step. Without `wrap` the loop returns as soon as the
+    # ant leaves the grid, with x/y pointing at the cell outside it.
+    record = len(headings) >= steps and len(colors) >= steps
+    for i in range(steps):
+        pos = y * width + x
+        color = cells[pos]
+        next_color = rules[color]
+        if next_color < 0:
+            return x, y, d, i
+        cells[pos] = next_color
+        d = (d + turns[color]) & 3
+        if record:
+            headings[i] = d
+            colors[i] = color
+        x += DX[d]
+        y += DY[d]
+        if wrap:
+            x %= width
+            y %= height
+        elif x < 0 or x >= width or y < 0 or y >= height:
+            return x, y, d, i + 1
+    return x, y, d, steps
+
+
+def _python_kernel(grid, width, height, x, y, d, rule_table, turn_table, steps, headings, colors, wrap):
+    return _step_loop(memoryview(grid), width, height, x, y, d, rule_table.tolist(),
+                      turn_table.tolist(), steps, memoryview(headings), memoryview(colors), wrap)
+
+
+def _batch_step_loop(cells, size, xs, ys, ds, rules, turns, moves, steps, headings, colors, active):
+    # Many ants, one (size, size) torus each: cells is (ants, size * size) and
+    # the tables are (ants, colors). Used by BatchAntEngine when Numba is
+    # available; headings/colors are (steps, ants) traces, heading 4 = stuck.
+    # Ants with active[n] == 0 are skipped and traced as stuck on color 0.
+    record = headings.shape[0] >= steps and colors.shape[0] >= steps
+    for n in range(cells.shape[0]):
+        if not active[n]:
+            if record:
+                for i in range(steps):
+                    headings[i, n] = 4
+                    colors[i, n] = 0
+            continue
+        x, y, d = xs[n], ys[n], ds[n]
+        for i in range(steps):
+            pos = y * size + x
+            color = cells[n, pos]
+            cells[n, pos] = rules[n, color]
+            d = (d + turns[n, color]) & 3
+            heading = 4
+            if moves[n, color]:
+                heading = d
+                x = (x + DX[d]) % size
+                y = (y + DY[d]) % size
+            if record:
+                headings[i, n] = heading
+                colors[i, n] = color
+        xs[n], ys[n], ds[n] = x, y, d
+
+
+KERNELS = {"python": _python_kernel}
+BATCH_KERNEL = None  # Only compiled; BatchAntEngine falls back to NumPy without Numba
+if HAVE_NUMBA:
+    KERNELS["numba"] = njit(cache=True, nogil=True)(_step_loop)
+    BATCH_KERNEL = njit(cache=True, nogil=True)(_batch_step_loop)
+
+DEFAULT_BACKEND = "numba" if HAVE_NUMBA else "python"
+NO_TRACE = np.empty(0, dtype=np.uint8)
+
+
+def get_kernel(backend=None):
+    if backend is None:
+        backend = DEFAULT_BACKEND
+    if backend not in KERNELS:
+        raise ValueError(f"Unknown or unavailable backend {backend!r}, choose from {sorted(KERNELS)}")
+    return KERNELS[backend]
+
+
+def run_steps(grid, x, y, d, rule_table, turn_table, steps, headings=NO_TRACE, colors=NO_TRACE,
+              wrap=True, backend=None):
+    # Advance one ant on a (height, width) uint8 torus grid, in place.
+    # Returns the new x, y, direction and how many steps were actually taken,
+    # which is less than requested only if the ant reached a color without a
+    # rule or, with wrap=False, walked off the grid.
+    # Pass uint8 `headings` and `colors` arrays of at least `steps` entries to
+    # record the path and the color under the ant at every step.
+    if not grid.flags.c_contiguous:
+        raise ValueError("run_steps needs a C-contiguous grid to step in place")
+    height, width = grid.shape
+    kernel = get_kernel(backend)
+    x, y, d, taken = kernel(grid.reshape(-1), width, height, x, y, d, rule_table, turn_table, steps,
+                             headings, colors, wrap)
+    return int(x), int(y), int(d), int(taken)
+
+
+def trace_positions(x, y, headings, width, height):
+    # Rebuild the cells visited after each recorded step from the start position
+    xs = (x + np.cumsum(np.take(DX, headings))) % width
+    ys = (y + np.cumsum(np.take(DY, headings))) % height
+    return xs, ys
+
+
+def rules_from_turn_string(turn_string):
+    # "RL" -> the classic ant: color i turns right (R) or left (L) and becomes color i + 1
+    count = len(turn_string)
+    rules = {color: (color + 1) % count for color in range(count)}
+    turns = {color: 1 if turn == "R" else -1 for color, turn in enumerate(turn_string.upper())}
+    return rules, turns
+
+
+def turn_string_from_rules(rules, turns):
+    # Inverse of rules_from_turn_string, or None if the rules are not a single color cycle
+    count = len(rules)
+    if any(rules.get(color) != (color + 1) % count for color in range(count)):
+        return None
+    return "".join("R" if turns[color] == 1 else "L" for color in range(count))
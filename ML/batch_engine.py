@@ -0,0 +1,118 @@
+import numpy as np
+from ant_core import BATCH_KERNEL
+
+# Constants
+GRID_SIZE = 160
+MAX_COLORS = 10  # Same limit as LangtonsAntEnv.add_rule
+
+# Directions (up, right, down, left) split into x and y lookup tables
+DIRECTIONS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+DX = np.array([d[0] for d in DIRECTIONS], dtype=np.int64)
+DY = np.array([d[1] for d in DIRECTIONS], dtype=np.int64)
+STUCK = 4  # Heading recorded for an ant standing on a color without a rule
+NO_TRACE = np.empty((0, 0), dtype=np.uint8)
+
+
+class BatchAntEngine:
+    # Advances many independent ants, each on its own toroidal grid, in one
+    # call: a compiled loop over all ants when Numba is installed ("numba"),
+    # otherwise one set of NumPy operations per step across the batch ("numpy").
+    def __init__(self, num_ants, grid_size=GRID_SIZE, max_colors=MAX_COLORS, backend=None):
+        if backend is None:
+            backend = "numba" if BATCH_KERNEL is not None else "numpy"
+        if backend not in ("numba", "numpy") or (backend == "numba" and BATCH_KERNEL is None):
+            raise ValueError(f"Unknown or unavailable backend {backend!r}")
+        self.backend = backend
+        self.num_ants = num_ants
+        self.grid_size = grid_size
+        self.max_colors = max_colors
+        self.grids = np.zeros((num_ants, grid_size, grid_size), dtype=np.uint8)
+        self.x = np.full(num_ants, grid_size // 2, dtype=np.int64)
+        self.y = np.full(num_ants, grid_size // 2, dtype=np.int64)
+        self.dir = np.zeros(num_ants, dtype=np.int64)
+        self.steps = np.zeros(num_ants, dtype=np.int64)
+        # Lookup tables indexed by [ant, color]. A color without a rule keeps
+        # its value, does not turn and does not move, matching _move_ant.
+        self.rule_table = np.tile(np.arange(max_colors, dtype=np.uint8), (num_ants, 1))
+        self.turn_table = np.zeros((num_ants, max_colors), dtype=np.int64)
+        self.move_table = np.zeros((num_ants, max_colors), dtype=np.int64)
+        # Flat views used by the stepping loop
+        self._cells = self.grids.reshape(-1)
+        self._grid_offset = np.arange(num_ants, dtype=np.int64) * grid_size * grid_size
+        self._table_offset = np.arange(num_ants, dtype=np.int64) * max_colors
+        self._all_active = np.ones(num_ants, dtype=np.uint8)
+
+    @classmethod
+    def from_rulesets(cls, rulesets, grid_size=GRID_SIZE, max_colors=MAX_COLORS, backend=None):
+        # Build an engine from a list of (rules, turns) dict pairs
+        engine = cls(len(rulesets), grid_size=grid_size, max_colors=max_colors, backend=backend)
+        for i, (rules, turns) in enumerate(rulesets):
+            engine.set_rules(i, rules, turns)
+        return engine
+
+    def set_rules(self, i, rules, turns):
+        # Load the color -> color and color -> turn dicts of ant i into the tables
+        self.rule_table[i] = np.arange(self.max_colors, dtype=np.uint8)
+        self.turn_table[i] = 0
+        self.move_table[i] = 0
+        for color, next_color in rules.items():
+            if color >= self.max_colors or next_color >= self.max_colors:
+                raise ValueError(f"Color {max(color, next_color)} exceeds max_colors={self.max_colors}")
+            self.rule_table[i, color] = next_color
+            self.turn_table[i, color] = turns[color]
+            self.move_table[i, color] = 1
+
+    def reset(self, indices=None):
+        # Clear the grids and put the ants back in the center facing up
+        if indices is None:
+            indices = slice(None)
+        self.grids[indices] = 0
+        self.x[indices] = self.grid_size // 2
+        self.y[indices] = self.grid_size // 2
+        self.dir[indices] = 0
+        self.steps[indices] = 0
+
+    def step(self, k=1, headings=None, colors=None, active=None):
+        # Advance every ant k steps. Optional (k, num_ants) uint8 arrays record
+        # the direction each ant moved in (STUCK if it had no rule to follow)
+        # and the color it read at every step. With a boolean `active` mask
+        # only those ants are stepped; the others keep their grid and position
+        # and are recorded as STUCK on color 0.
+        if self.backend == "numba":
+            BATCH_KERNEL(self.grids.reshape(self.num_ants, -1), self.grid_size, self.x, self.y, self.dir,
+                         self.rule_table, self.turn_table, self.move_table, k,
+                         NO_TRACE if headings is None else headings,
+                         NO_TRACE if colors is None else colors,
+                         self._all_active if active is None else active.view(np.uint8))
+            if active is None:
+                self.steps += k
+            else:
+                self.steps[active] += k
+            return
+
+        size = self.grid_size
+        cells = self._cells
+        rule_table = self.rule_table.reshape(-1)
+        turn_table = self.turn_table.reshape(-1)
+        move_table = self.move_table.reshape(-1)
+        x, y, direction = self.x, self.y, self.dir
+        ants = slice(None) if active is None else np.flatnonzero(active)
+        grid_offset, table_offset = self._grid_offset[ants], self._table_offset[ants]
+        if headings is not None and active is not None:
+            headings[:k] = STUCK
+            colors[:k] = 0
+
+        for i in range(k):
+            cell = grid_offset + y[ants] * size + x[ants]
+            color = cells[cell]
+            entry = table_offset + color
+            cells[cell] = rule_table[entry]
+            direction[ants] = (direction[ants] + turn_table[entry]) & 3
+            moves = move_table[entry]
+            x[ants] = (x[ants] + DX[direction[ants]] * moves) % size
+            y[ants] = (y[ants] + DY[direction[ants]] * moves) % size
+            if headings is not None:
+                headings[i, ants] = np.where(moves, direction[ants], STUCK)
+                colors[i, ants] = color
+
+        self.steps[ants] += k
@@ -0,0 +1,355 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+import numpy as np
+from ant_core import HAVE_NUMBA, KERNELS, make_tables, rules_from_turn_string, run_steps, trace_positions
+from batch_engine import BatchAntEngine
+from macro_step import MacroGrid
+from multi_ant import MULTI_KERNEL, MultiAntEngine, turmite_from_turn_string
+from packed_grid import PACKED_KERNELS, PackedGrid
+from sparse_grid import ChunkedGrid
+
+# Constants
+GRID_SIZE = 160
+GRID_SIZES = [160, 512, 2048]
+STEPS = 1_000_000
+BATCH_SIZE = 256
+ENV_STEPS = 2000  # Env transitions timed per environment benchmark
+RESETS = 200
+FRAMES = 100
+STEPS_PER_FRAME = 100  # Simulation steps between frames in the redraw benchmarks
+CELL_SIZE = 5
+VIEWPORT_GRID_SIZE = 4096  # Board drawn through the zoomable viewport
+VIEW_SIZE = 800
+
+# Classic RL ant and the three color ant used by game.py
+RULESETS = {
+    "RL": ({0: 1, 1: 0}, {0: 1, 1: -1}),
+    "RLR": ({0: 1, 1: 2, 2: 0}, {0: 1, 1: -1, 2: 1}),
+}
+# Rule lengths for the steps/sec sweep
+TURN_STRINGS = ["RL", "RLR", "LLRR", "RRLLLRLR", "RRLRLLRLRR"]
+
+
+def bench_backend(backend, rules, turns, steps, grid_size):
+    grid = np.zeros((grid_size, grid_size), dtype=np.uint8)
+    rule_table, turn_table = make_tables(rules, turns)
+    # Warm up once so a JIT backend is not timed while compiling
+    run_steps(grid, 0, 0, 0, rule_table, turn_table, 1, backend=backend)
+    grid.fill(0)
+    start = time.perf_counter()
+    run_steps(grid, grid_size // 2, grid_size // 2, 0, rule_table, turn_table, steps, backend=backend)
+    return steps / (time.perf_counter() - start)
+
+
+def bench_sparse(backend, rules, turns, steps):
+    grid = ChunkedGrid()
+    rule_table, turn_table = make_tables(rules, turns)
+    grid.run_steps(0, 0, 0, rule_table, turn_table, 1, backend=backend)
+    grid.clear()
+    start = time.perf_counter()
+    grid.run_steps(0, 0, 0, rule_table, turn_table, steps, backend=backend)
+    return steps / (time.perf_counter() - start)
+
+
+def bench_packed(backend, rules, turns, steps, grid_size):
+    # Steps on a grid packed at the smallest depth that holds the rule's colors
+    grid = PackedGrid(grid_size, grid_size, bits=1 if len(rules) <= 2 else 4)
+    rule_table, turn_table = make_tables(rules, turns)
+    grid.run_steps(0, 0, 0, rule_table, turn_table, 1, backend=backend)
+    grid.clear()
+    start = time.perf_counter()
+    grid.run_steps(grid_size // 2, grid_size // 2, 0, rule_table, turn_table, steps, backend=backend)
+    return steps / (time.perf_counter() - start)
+
+
+def bench_macro(rules, turns, steps):
+    # Memoized macro-steps on the unbounded grid; also returns the cache stats
+    grid = MacroGrid()
+    rule_table, turn_table = make_tables(rules, turns)
+    start = time.perf_counter()
+    grid.run_steps(0, 0, 0, rule_table, turn_table, steps)
+    return steps / (time.perf_counter() - start), grid.stats()
+
+
+def bench_multi(turn_string, steps, grid_size, num_ants, backend=None):
+    # Ant-steps/sec for num_ants ants sharing one grid
+    engine = MultiAntEngine([turmite_from_turn_string(turn_string)], grid_size=grid_size, backend=backend)
+    rng = np.random.default_rng(0)
+    engine.add_ants(rng.integers(0, grid_size, num_ants), rng.integers(0, grid_size, num_ants))
+    engine.step(1)
+    ticks = max(1, steps // num_ants)
+    start = time.perf_counter()
+    engine.step(ticks)
+    return ticks * num_ants / (time.perf_counter() - start)
+
+
+def bench_batch(rules, turns, steps, grid_size, batch_size, backend=None):
+    engine = BatchAntEngine.from_rulesets([(rules, turns)] * batch_size, grid_size=grid_size, backend=backend)
+    engine.step(1)
+    steps_per_ant = max(1, steps // batch_size)
+    start = time.perf_counter()
+    engine.step(steps_per_ant)
+    return steps_per_ant * batch_size / (time.perf_counter() - start)
+
+
+def bench_env(steps, resets, obs_mode=None, grid_backend="dense"):
+    # Transitions/sec of LangtonsAntEnv.step and the mean cost of reset
+    from ai_training import LangtonsAntEnv
+    kwargs = {"grid_backend": grid_backend}
+    if obs_mode is not None:
+        kwargs["obs_mode"] = obs_mode
+    env = LangtonsAntEnv(**kwargs)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 2, steps).tolist()
+    env.step(0)  # Warm up
+    start = time.perf_counter()
+    for action in actions:
+        if env.step(action)[2]:
+            env.reset()
+    rate = steps / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(resets):
+        env.reset()
+    return rate, (time.perf_counter() - start) / resets
+
+
+def bench_vec_env(steps, num_envs, obs_mode=None):
+    from vec_env import BatchedLangtonsAntVecEnv
+    kwargs = {} if obs_mode is None else {"obs_mode": obs_mode}
+    env = BatchedLangtonsAntVecEnv(num_envs, **kwargs)
+    env.reset()
+    rng = np.random.default_rng(0)
+    env.step(rng.integers(0, 2, num_envs))  # Warm up
+    calls = max(1, steps // num_envs)
+    actions = rng.integers(0, 2, (calls, num_envs))
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return calls * num_envs / (time.perf_counter() - start)
+
+
+def bench_shm_vec_env(steps, num_envs, obs_mode=None):
+    from shm_vec_env import SharedMemoryVecEnv
+    kwargs = {} if obs_mode is None else {"obs_mode": obs_mode}
+    env = SharedMemoryVecEnv(num_envs, **kwargs)
+    try:
+        env.reset()
+        rng = np.random.default_rng(0)
+        env.step(rng.integers(0, 2, num_envs))  # Warm up
+        calls = max(1, steps // num_envs)
+        actions = rng.integers(0, 2, (calls, num_envs))
+        start = time.perf_counter()
+        for step_actions in actions:
+            env.step(step_actions)
+        return calls * num_envs / (time.perf_counter() - start)
+    finally:
+        env.close()
+
+
+def bench_redraw(frames, grid_size=GRID_SIZE, cell_size=CELL_SIZE):
+    # Mean draw time per frame in ms for the per-cell pygame.draw.rect loop
+    # game.py used to run, the full GridRenderer blit and the incremental
+    # redraw of only the cells visited since the previous frame
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from renderer import GridRenderer
+    pygame.init()
+    screen = pygame.display.set_mode((grid_size * cell_size, grid_size * cell_size))
+    colors = [(255, 255, 255), (0, 0, 0), (255, 0, 0)]
+    rules, turns = RULESETS["RLR"]
+    rule_table, turn_table = make_tables(rules, turns)
+    grid = np.zeros((grid_size, grid_size), dtype=np.uint8)
+    headings = np.empty(STEPS_PER_FRAME, dtype=np.uint8)
+    trace_colors = np.empty(STEPS_PER_FRAME, dtype=np.uint8)
+    renderer = GridRenderer(grid_size, grid_size, cell_size)
+    results = {}
+
+    def advance(state):
+        # One frame's worth of steps; returns the cells touched
+        x, y, d = state
+        new_x, new_y, new_d, _ = run_steps(grid, x, y, d, rule_table, turn_table, STEPS_PER_FRAME,
+                                           headings, trace_colors)
+        xs, ys = trace_positions(x, y, headings, grid_size, grid_size)
+        state[:] = [new_x, new_y, new_d]
+        return np.append(xs, x), np.append(ys, y)
+
+    state = [grid_size // 2, grid_size // 2, 0]
+    elapsed = 0.0
+    for _ in range(frames):
+        advance(state)
+        start = time.perf_counter()
+        for y in range(grid_size):
+            for x in range(grid_size):
+                pygame.draw.rect(screen, colors[grid[y, x]], (x * cell_size, y * cell_size, cell_size, cell_size))
+        elapsed += time.perf_counter() - start
+    results["rect_loop"] = 1000 * elapsed / frames
+
+    for name in ("full", "incremental"):
+        grid.fill(0)
+        state = [grid_size // 2, grid_size // 2, 0]
+        renderer.draw(screen, grid, colors)
+        elapsed = 0.0
+        for _ in range(frames):
+            xs, ys = advance(state)
+            start = time.perf_counter()
+            if name == "full":
+                renderer.draw(screen, grid, colors)
+            else:
+                renderer.draw_cells(screen, grid, xs, ys, colors)
+            elapsed += time.perf_counter() - start
+        results[name] = 1000 * elapsed / frames
+    pygame.quit()
+    return results
+
+
+def bench_viewport(frames, grid_size=VIEWPORT_GRID_SIZE, view_size=VIEW_SIZE):
+    # Mean ms per frame to refresh the mip pyramid from the tiles changed by
+    # STEPS_PER_FRAME * 100 steps and draw the viewport, at three zoom levels
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from mip_pyramid import MipPyramid
+    from renderer import Viewport
+    pygame.init()
+    screen = pygame.display.set_mode((view_size, view_size))
+    colors = [(255, 255, 255), (0, 0, 0), (255, 0, 0)]
+    rules, turns = RULESETS["RLR"]
+    rule_table, turn_table = make_tables(rules, turns)
+    grid = np.zeros((grid_size, grid_size), dtype=np.uint8)
+    pyramid = MipPyramid(grid_size, grid_size)
+    viewport = Viewport(view_size, view_size, grid_size, grid_size)
+    state = [grid_size // 2, grid_size // 2, 0]
+    results = {}
+    for name, zoom in (("fit", None), ("1px", 1.0), ("8px", 8.0)):
+        viewport.fit()
+        if zoom is not None:
+            viewport.zoom_by(zoom / viewport.zoom)
+        elapsed = 0.0
+        for _ in range(frames):
+            state[:3] = run_steps(grid, *state, rule_table, turn_table, STEPS_PER_FRAME * 100)[:3]
+            start = time.perf_counter()
+            pyramid.update(grid)
+            viewport.draw(screen, pyramid, colors)
+            elapsed += time.perf_counter() - start
+        results[name] = 1000 * elapsed / frames
+    pygame.quit()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    # Print the change of every metric present in both runs
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    old = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in baseline["results"]}
+    print(f"\nCompared with {baseline_path} ({baseline.get('commit')}):")
+    for result in results:
+        previous = old.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if previous is None or not previous["value"]:
+            continue
+        ratio = result["value"] / previous["value"]
+        better = ratio if result["unit"].endswith(("/sec", "%")) else 1 / ratio
+        flag = "  REGRESSION" if better < 0.9 else ""
+        print(f"  {result['name']} {result['params']}: {previous['value']:,.3f} -> {result['value']:,.3f} "
+              f"{result['unit']} (x{ratio:.2f}){flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simulation, env stepping and rendering")
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--grid-size", type=int, nargs="+", default=GRID_SIZES)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--env-steps", type=int, default=ENV_STEPS)
+    parser.add_argument("--frames", type=int, default=FRAMES)
+    parser.add_argument("--skip-env", action="store_true", help="skip the RL environment benchmarks")
+    parser.add_argument("--skip-render", action="store_true", help="skip the pygame redraw benchmarks")
+    parser.add_argument("--json", default=None, help="write the results to this file")
+    parser.add_argument("--compare", default=None, help="JSON file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    results = []
+
+    def report(name, params, value, unit):
+        results.append({"name": name, "params": params, "value": value, "unit": unit})
+        label = " ".join(f"{key}={param}" for key, param in params.items())
+        print(f"{name:>12} {label:<44} {value:>14,.2f} {unit}")
+
+    for turn_string in TURN_STRINGS:
+        rules, turns = rules_from_turn_string(turn_string)
+        for grid_size in args.grid_size:
+            for backend in KERNELS:
+                # The Python loop is slow enough that a tenth of the steps gives a stable number
+                steps = args.steps if backend != "python" else max(1, args.steps // 10)
+                rate = bench_backend(backend, rules, turns, steps, grid_size)
+                report("core", {"rules": turn_string, "grid": grid_size, "backend": backend}, rate, "steps/sec")
+            if len(rules) <= 16:
+                for backend in PACKED_KERNELS:
+                    steps = args.steps if backend != "python" else max(1, args.steps // 10)
+                    rate = bench_packed(backend, rules, turns, steps, grid_size)
+                    report("packed", {"rules": turn_string, "grid": grid_size, "backend": backend}, rate,
+                           "steps/sec")
+            for backend in ("numba", "numpy") if HAVE_NUMBA else ("numpy",):
+                rate = bench_batch(rules, turns, args.steps, grid_size, args.batch_size, backend)
+                report("batch", {"rules": turn_string, "grid": grid_size, "backend": backend,
+                                 "ants": args.batch_size}, rate, "steps/sec")
+            for backend in ("numba", "numpy") if MULTI_KERNEL is not None else ("numpy",):
+                rate = bench_multi(turn_string, args.steps, grid_size, args.batch_size, backend)
+                report("multi", {"rules": turn_string, "grid": grid_size, "backend": backend,
+                                 "ants": args.batch_size}, rate, "steps/sec")
+        for backend in KERNELS:
+            steps = args.steps if backend != "python" else max(1, args.steps // 10)
+            rate = bench_sparse(backend, rules, turns, steps)
+            report("core", {"rules": turn_string, "grid": "unbounded", "backend": backend}, rate, "steps/sec")
+        rate, stats = bench_macro(rules, turns, args.steps)
+        report("macro", {"rules": turn_string, "grid": "unbounded"}, rate, "steps/sec")
+        report("macro_hits", {"rules": turn_string, "grid": "unbounded"}, 100 * stats["hit_rate"], "%")
+
+    if not args.skip_env:
+        try:
+            for grid_backend in ("dense", "sparse", "packed"):
+                for obs_mode in ("local", "histogram", "grid"):
+                    rate, reset_time = bench_env(args.env_steps, RESETS, obs_mode, grid_backend)
+                    params = {"grid": grid_backend, "obs": obs_mode}
+                    report("env_step", params, rate, "transitions/sec")
+                    report("env_reset", params, 1000 * reset_time, "ms")
+            for obs_mode in ("local", "histogram", "grid"):
+                rate = bench_vec_env(args.env_steps, 16, obs_mode)
+                report("vec_env_step", {"envs": 16, "obs": obs_mode}, rate, "transitions/sec")
+            for obs_mode in ("local", "grid"):
+                rate = bench_shm_vec_env(args.env_steps, 4, obs_mode)
+                report("shm_vec_env_step", {"envs": 4, "obs": obs_mode}, rate, "transitions/sec")
+        except ImportError as error:
+            print(f"Skipping env benchmarks: {error}")
+
+    if not args.skip_render:
+        try:
+            for name, frame_ms in bench_redraw(args.frames).items():
+                report("redraw", {"mode": name, "grid": GRID_SIZE}, frame_ms, "ms/frame")
+            for name, frame_ms in bench_viewport(args.frames).items():
+                report("viewport", {"zoom": name, "grid": VIEWPORT_GRID_SIZE}, frame_ms, "ms/frame")
+        except ImportError as error:
+            print(f"Skipping redraw benchmarks: {error}")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"commit": git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+                       "python": platform.python_version(), "numba": HAVE_NUMBA, "args": vars(args),
+                       "results": results}, file, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
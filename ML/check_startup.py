@@ -0,0 +1,68 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Constants
+# Modules on the simulation, search and headless paths; none of them may pull in a heavy package
+MODULES = ["ant_core", "batch_engine", "sparse_grid", "macro_step", "packed_grid", "highway", "snapshot",
+           "observations", "results_log", "results_store", "instrumentation", "image_io", "recorder", "langtons_ant",
+           "run_headless", "ruleset_search", "ai_training", "shm_worker", "stream_server"]
+HEAVY_PACKAGES = {"torch", "stable_baselines3", "pygame", "tensorboard"}
+BUDGET = 1.0  # Seconds of import time allowed per module
+TOP_IMPORTS = 5  # Slowest imports listed per module
+
+
+def import_times(module):
+    # {imported name: (self seconds, cumulative seconds)} from `python -X importtime`, in a fresh process
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue  # Column header
+        times[name.strip()] = (int(own) / 1e6, int(cumulative) / 1e6)
+    return times
+
+
+def check(module, budget=BUDGET):
+    # Returns a list of problems with importing `module`, printing its timings
+    times = import_times(module)
+    total = times[module][1]
+    heavy = sorted({name.split(".")[0] for name in times} & HEAVY_PACKAGES)
+    print(f"{module:<18} {1000 * total:>8.1f} ms")
+    top_level = [(cumulative, name) for name, (_, cumulative) in times.items() if "." not in name and name != module]
+    for cumulative, name in sorted(top_level, reverse=True)[:TOP_IMPORTS]:
+        print(f"    {name:<28} {1000 * cumulative:>8.1f} ms")
+    problems = []
+    if heavy:
+        problems.append(f"{module} imports {', '.join(heavy)}")
+    if total > budget:
+        problems.append(f"{module} takes {total:.2f} s to import, over the {budget:.2f} s budget")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the simulation entry points import quickly "
+                                                 "and without torch, SB3 or pygame")
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--budget", type=float, default=BUDGET, help="seconds allowed per module")
+    args = parser.parse_args()
+
+    problems = []
+    for module in args.modules:
+        problems += check(module, args.budget)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if problems:
+        sys.exit(1)
+    print(f"All {len(args.modules)} modules import within {args.budget:.2f} s without heavy packages")
+
+
+if __name__ == "__main__":
+    main()
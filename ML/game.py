@@ -1,150 +1,50 @@
+import argparse
 import pygame
-import random
-from datetime import datetime
+import time
+import instrumentation
+from langtons_ant import BLACK, BLUE, COLORS, GREEN, GRID_BACKEND, GRID_BACKENDS, GRID_SIZE, RED, WHITE, LangtonsAnt
+from mip_pyramid import MipPyramid
+from recorder import FORMATS, RECORD_EVERY, Recorder, make_encoder, recording_path
+from renderer import Viewport
+from simulation_worker import SimulationWorker, SPEED_PRESETS, TARGET_FPS
 
 # Constants
-STEPS_PER_FRAME = 0
-GRID_SIZE = 160
-CELL_SIZE = 5
-WIDTH, HEIGHT = GRID_SIZE * CELL_SIZE + 200, GRID_SIZE * CELL_SIZE 
-
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-RED = (255, 0, 0)
-GREEN = (0, 255, 0)
-BLUE = (0, 0, 255)
-COLORS = [WHITE, BLACK, RED, GREEN, BLUE]
-
-# Directions (up, right, down, left)
-DIRECTIONS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
-
-class LangtonsAnt:
-    def __init__(self):
-        # Initialize the grid with zeros (white cells)
-        self.grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-        # Start the ant in the center of the grid
-        self.x, self.y = GRID_SIZE // 2, GRID_SIZE // 2
-        self.dir = 0  # Start facing upward
-        # Rules for color changes: current color -> next color
-        self.rules = {0: 1, 1: 2, 2: 0}
-        # Turn rules: 1 = turn right, -1 = turn left
-        self.turns = {0: 1, 1: -1, 2: 1}
-    
-    def step(self):
-        # Get current cell color
-        current_color = self.grid[self.y][self.x]
-        # Update cell color based on rules
-        self.grid[self.y][self.x] = self.rules[current_color]
-        # Update direction based on turn rules
-        self.dir = (self.dir + self.turns[current_color]) % 4
-        # Move ant in current direction
-        dx, dy = DIRECTIONS[self.dir]
-        self.x = (self.x + dx) % GRID_SIZE
-        self.y = (self.y + dy) % GRID_SIZE
-
-    def add_rule_left(self):
-        # Add a new color to the sequence
-        new_color = len(self.rules)
-        
-        # Add a random new color to the COLORS list
-        COLORS.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
-
-        # Update rules to maintain the cycle
-        self.rules[new_color] = 0  # New color returns to start (0)
-        
-        # Update the previous rule to point to the new color
-        if new_color > 0:
-            self.rules[new_color - 1] = new_color  
-
-        # Set the turn direction to left (-1)
-        self.turns[new_color] = -1
-
-    def add_rule_right(self):
-        # Add a new color to the sequence
-        new_color = len(self.rules)
-        
-        # Add a random new color to the COLORS list
-        COLORS.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
-
-        # Update rules to maintain the cycle
-        self.rules[new_color] = 0  # New color returns to start (0)
-        
-        # Update the previous rule to point to the new color
-        if new_color > 0:
-            self.rules[new_color - 1] = new_color  
-
-        # Set the turn direction to right (1)
-        self.turns[new_color] = 1
-
-    def remove_rule(self):
-        if len(self.rules) > 0:
-            # Remove the last element from rules and turns
-            last_color = len(self.rules) - 1
-            del self.rules[last_color]
-            del self.turns[last_color]
-            
-            # Update the cycle in rules if there are remaining elements
-            if len(self.rules) > 0:
-                # Last added color should point to the first color
-                self.rules[len(self.rules) - 1] = 0
-            
-            # Remove the last color from COLORS
-            COLORS.pop()
-
-    def reser_simulatin(self):
-        # Reset the simulation to initial state
-        self.__init__()
-
-    def draw_rules_and_turns(self, screen, font):
-        # Calculate position for rule display
-        x_offset = GRID_SIZE * CELL_SIZE + 10  # Offset to the right of the grid
-        y_offset = 10  # Initial offset from top
-
-        # Draw each rule and its corresponding turn direction
-        for key in self.rules.keys():
-            rule_text = f"Rule {key} -> {self.rules[key]}"
-            turn_text = f"{'Right' if self.turns[key] == 1 else 'Left'}"
-
-            # Render the text
-            rule_rendered = font.render(rule_text, True, BLACK)
-            turn_rendered = font.render(turn_text, True, BLACK)
-
-            # Display text side by side (100px spacing between them)
-            screen.blit(rule_rendered, (x_offset, y_offset))
-            screen.blit(turn_rendered, (x_offset + 120, y_offset))  
-
-            # Move down for the next line
-            y_offset += 30
-
-    def save_successful_rules(self):
-        # Save the current rules configuration to a file with timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open("successful_rules.txt", "a") as file:
-            file.write(f"\n=== Successful Rules Found at {timestamp} ===\n")
-            file.write(f"Steps taken: {self.steps}\n")
-            file.write("Rules:\n")
-            for color, next_color in self.rules.items():
-                file.write(f"  Color {color} -> {next_color} (Turn: {self.turns[color]})\n")
-            file.write("=" * 50 + "\n")
-
-# Initialize Pygame
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-clock = pygame.time.Clock()
-ant = LangtonsAnt()
-running = True
-font = pygame.font.Font(None, 24)
+VIEW_SIZE = 800  # Pixels of board area; the grid is panned and zoomed inside it, whatever its size
+WIDTH, HEIGHT = VIEW_SIZE + 200, VIEW_SIZE
+PAN_STEP = 50  # Pixels moved per arrow key press
+ZOOM_STEP = 2  # Zoom factor per wheel notch or +/- key press
+
+def draw_rules_and_turns(screen, font, ant):
+    # Calculate position for rule display
+    x_offset = VIEW_SIZE + 10  # Offset to the right of the grid
+    y_offset = 10  # Initial offset from top
+
+    # Draw each rule and its corresponding turn direction
+    for key in ant.rules.keys():
+        rule_text = f"Rule {key} -> {ant.rules[key]}"
+        turn_text = f"{'Right' if ant.turns[key] == 1 else 'Left'}"
+
+        # Render the text
+        rule_rendered = font.render(rule_text, True, BLACK)
+        turn_rendered = font.render(turn_text, True, BLACK)
+
+        # Display text side by side (100px spacing between them)
+        screen.blit(rule_rendered, (x_offset, y_offset))
+        screen.blit(turn_rendered, (x_offset + 120, y_offset))  
+
+        # Move down for the next line
+        y_offset += 30
+
+# Display state shared with the drawing helpers below, set up by main()
+screen = clock = font = worker = None
 
 def start_simulation():
-    # Start the simulation by setting steps per frame
-    global STEPS_PER_FRAME
-    STEPS_PER_FRAME = 100
+    # Start stepping the ant on the simulation thread
+    worker.start_simulation()
 
 def pause_simulation():
-    # Pause the simulation by setting steps per frame to 0
-    global STEPS_PER_FRAME
-    STEPS_PER_FRAME = 0
+    # Stop stepping the ant until Start is pressed again
+    worker.pause_simulation()
 
 def draw_buttons_add_rul_left():
     # Draw the "Add Rule Left" button
@@ -186,6 +86,15 @@ def draw_buttons_reset_button():
     text = font.render("Reset", True, WHITE)
     screen.blit(text, (470, HEIGHT - 35))
 
+def draw_buttons_speed():
+    # Draw one button per speed preset, highlighting the selected one
+    small_font = pygame.font.Font(None, 18)
+    for i, (label, steps_per_frame) in enumerate(SPEED_PRESETS.items()):
+        color = GREEN if worker.steps_per_frame == steps_per_frame else BLUE
+        pygame.draw.rect(screen, color, (570 + i * 80, HEIGHT - 40, 70, 30))
+        text = small_font.render(label, True, WHITE)
+        screen.blit(text, (580 + i * 80, HEIGHT - 35))
+
 def draw_on_no_play_buttons():
     # Draw all buttons when simulation is paused
     draw_buttons_add_rul_left()
@@ -193,61 +102,162 @@ def draw_on_no_play_buttons():
     draw_buttons_remove_rule()
     draw_buttons_start()
     draw_buttons_reset_button()
+    draw_buttons_speed()
 
 def draw_on_play_buttons():
-    # Draw only the pause button when simulation is running
+    # Draw the pause and speed buttons when simulation is running
     draw_buttons_pause()
-
-# Main game loop
-while running:
-    screen.fill(WHITE)
-    
-    # Handle events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.MOUSEBUTTONDOWN:  # Check for clicks
-            x, y = event.pos  # Get mouse coordinates
-            
-            if STEPS_PER_FRAME == 0:
-                # Handle button clicks when simulation is paused
-                if 10 <= x <= 110 and HEIGHT - 40 <= y <= HEIGHT - 10:
-                    ant.add_rule_left()  # Add new left turn rule
-                                       
-                if 120 <= x <= 220 and HEIGHT - 40 <= y <= HEIGHT - 10:
-                    ant.add_rule_right()  # Add new right turn rule
-
-                if 240 <= x <= 340 and HEIGHT - 40 <= y <= HEIGHT - 10:
-                    ant.remove_rule()  # Remove last rule
-                    
-                if 360 <= x <= 460 and HEIGHT - 40 <= y <= HEIGHT - 10:
-                    start_simulation()  # Start the simulation
-
-                if 480 <= x <= 580 and HEIGHT - 40 <= y <= HEIGHT - 10:
-                    ant.reser_simulatin()  # Reset the simulation
-            else:
-                if 360 <= x <= 460 and HEIGHT - 40 <= y <= HEIGHT - 10:
-                    pause_simulation()  # Pause the simulation
-
-    # Update ant position multiple times per frame
-    for _ in range(STEPS_PER_FRAME):
-        ant.step()
-
-    # Draw the grid
-    for y in range(GRID_SIZE):
-        for x in range(GRID_SIZE):
-            pygame.draw.rect(screen, COLORS[ant.grid[y][x]], (x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE))
-    
-    # Display rules and turns on the side
-    ant.draw_rules_and_turns(screen, font)
-
-    # Draw appropriate buttons based on simulation state
-    if STEPS_PER_FRAME == 0:
-        draw_on_no_play_buttons()
-    else:
-        draw_on_play_buttons()
-    
-    pygame.display.flip()
-    clock.tick(60)
-
-pygame.quit()
+    draw_buttons_speed()
+
+def main():
+    global screen, clock, font, worker
+    parser = argparse.ArgumentParser(description="Interactive Langton's ant")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="cells per side of the board")
+    parser.add_argument("--backend", choices=GRID_BACKENDS, default=GRID_BACKEND)
+    parser.add_argument("--record-every", type=int, default=RECORD_EVERY, help="steps between recorded frames")
+    parser.add_argument("--record-format", choices=FORMATS, default="png",
+                        help="R records to a PNG sequence, a GIF (needs Pillow) or a video (needs ffmpeg)")
+    args = parser.parse_args()
+
+    # Initialize Pygame
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    clock = pygame.time.Clock()
+    ant = LangtonsAnt(args.backend, args.grid_size)
+    running = True
+    font = pygame.font.Font(None, 24)
+    # Wheel or +/- zooms, right or middle drag or the arrow keys pan, F fits the board
+    viewport = Viewport(VIEW_SIZE, VIEW_SIZE, args.grid_size, args.grid_size)
+    pyramid = MipPyramid(args.grid_size, args.grid_size)
+    # The ant is stepped on a background thread, the loop below only draws
+    worker = SimulationWorker(ant, TARGET_FPS)
+    worker.start()
+    last_total_steps = 0
+    recorder = None  # R starts and stops recording
+
+    # Main game loop
+    while running:
+        screen.fill(WHITE)
+
+        # Handle events
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key in (pygame.K_s, pygame.K_l):
+                # S saves a snapshot of the current run, L continues from the saved one
+                with worker.lock:
+                    if event.key == pygame.K_s:
+                        ant.save_snapshot()
+                    else:
+                        try:
+                            ant.load_snapshot()
+                        except (OSError, ValueError) as error:
+                            print(f"Could not load snapshot: {error}")
+                        worker.invalidate()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+                if recorder is None:
+                    try:
+                        path = recording_path(args.record_format)
+                        recorder = Recorder(make_encoder(path, args.record_format), args.record_every)
+                        print(f"Recording to {path}")
+                    except (OSError, ImportError) as error:
+                        print(f"Could not start recording: {error}")
+                else:
+                    recorder.close()
+                    print(f"Recording stopped: {recorder.stats()}")
+                    recorder = None
+            if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    viewport.zoom_by(ZOOM_STEP)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    viewport.zoom_by(1 / ZOOM_STEP)
+                elif event.key == pygame.K_f:
+                    viewport.fit()
+                elif event.key in (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN):
+                    dx = PAN_STEP * ((event.key == pygame.K_LEFT) - (event.key == pygame.K_RIGHT))
+                    dy = PAN_STEP * ((event.key == pygame.K_UP) - (event.key == pygame.K_DOWN))
+                    viewport.pan(dx, dy)
+            if event.type == pygame.MOUSEWHEEL:
+                mouse_x, mouse_y = pygame.mouse.get_pos()
+                if mouse_x < VIEW_SIZE:
+                    viewport.zoom_by(ZOOM_STEP ** event.y, (mouse_x, mouse_y))
+            if event.type == pygame.MOUSEMOTION and (event.buttons[1] or event.buttons[2]):
+                viewport.pan(*event.rel)
+            if event.type == pygame.MOUSEBUTTONDOWN:  # Check for clicks
+                x, y = event.pos  # Get mouse coordinates
+
+                # Speed presets can be changed while running or paused
+                for i, steps_per_frame in enumerate(SPEED_PRESETS.values()):
+                    if 570 + i * 80 <= x <= 640 + i * 80 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                        worker.set_speed(steps_per_frame)
+
+                if not worker.running:
+                    # Handle button clicks when simulation is paused
+                    with worker.lock:
+                        if 10 <= x <= 110 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                            ant.add_rule_left()  # Add new left turn rule
+
+                        if 120 <= x <= 220 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                            ant.add_rule_right()  # Add new right turn rule
+
+                        if 240 <= x <= 340 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                            ant.remove_rule()  # Remove last rule
+
+                        if 480 <= x <= 560 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                            ant.reser_simulatin()  # Reset the simulation
+
+                        worker.invalidate()  # The edits above may recolor cells the ant never visited
+
+                    if 360 <= x <= 460 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                        start_simulation()  # Start the simulation
+                else:
+                    if 360 <= x <= 460 and HEIGHT - 40 <= y <= HEIGHT - 10:
+                        pause_simulation()  # Pause the simulation
+
+        # Refresh the pyramid tiles holding the cells the ant visited since the
+        # last frame, straight from the grid between two simulation batches,
+        # then draw the view
+        render_start = time.perf_counter()
+        instrumentation.count("pyramid_tiles", worker.read(pyramid.update, positions=True))
+        steps_this_frame = worker.total_steps - last_total_steps
+        last_total_steps = worker.total_steps
+        if recorder is not None and recorder.advance(steps_this_frame):
+            # Level 0 is already a copy of the grid, so recording never waits on the simulation
+            recorder.capture(pyramid.levels[0], COLORS)
+        viewport.draw(screen, pyramid, COLORS)
+
+        # Display rules and turns on the side
+        draw_rules_and_turns(screen, font, ant)
+
+        # Display the frame-time counter under the rules
+        small_font = pygame.font.Font(None, 18)
+        viewport.draw_frame_time(screen, small_font, clock, (VIEW_SIZE + 10, HEIGHT - 80))
+        steps_text = small_font.render(f"Steps/frame: {steps_this_frame}", True, BLACK)
+        screen.blit(steps_text, (VIEW_SIZE + 10, HEIGHT - 100))
+        zoom_text = small_font.render(f"Zoom: {viewport.zoom:g} px/cell", True, BLACK)
+        screen.blit(zoom_text, (VIEW_SIZE + 10, HEIGHT - 120))
+        if recorder is not None:
+            record_text = small_font.render(f"REC {recorder.written} frames, {recorder.dropped} dropped", True, RED)
+            screen.blit(record_text, (VIEW_SIZE + 10, HEIGHT - 140))
+
+        # Draw appropriate buttons based on simulation state
+        if not worker.running:
+            draw_on_no_play_buttons()
+        else:
+            draw_on_play_buttons()
+
+        pygame.display.flip()
+        instrumentation.add_time("game.render", time.perf_counter() - render_start)
+        instrumentation.count("frames")
+        # Prints a summary every SUMMARY_INTERVAL seconds when ANT_PROFILE=1
+        instrumentation.maybe_report()
+        clock.tick(TARGET_FPS)
+
+    worker.stop()
+    if recorder is not None:
+        recorder.close()
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
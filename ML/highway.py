@@ -0,0 +1,227 @@
+from collections import namedtuple
+import numpy as np
+import instrumentation
+
+# Constants
+MAX_PERIOD = 128  # Longest highway period looked for (the classic ant's is 104)
+REPEATS = 3  # How many full periods the history window must cover
+
+# Rolling hash parameters (polynomial hash modulo a Mersenne prime)
+HASH_MOD = (1 << 61) - 1
+HASH_BASE = 1_000_003
+
+# Directions (up, right, down, left) as separate x and y offsets
+DX = (0, 1, 0, -1)
+DY = (-1, 0, 1, 0)
+
+# Batch detector variant: heading 4 means the ant did not move (see batch_engine.STUCK),
+# and the modulus is small enough that hash * base products fit in int64
+BATCH_HASH_MOD = (1 << 31) - 1
+BATCH_DX = np.array(DX + (0,), dtype=np.int64)
+BATCH_DY = np.array(DY + (0,), dtype=np.int64)
+
+# period: steps per repetition, drift: (dx, dy) moved per period, step: when it was found
+Highway = namedtuple("Highway", ["period", "drift", "step"])
+
+
+class HighwayDetector:
+    # Streaming detector for highways. Every step pushes a (heading, color under
+    # the ant) symbol into a ring buffer of prefix hashes and unwrapped
+    # positions. The last window of REPEATS * max_period symbols is compared
+    # against itself shifted by each candidate period; a match with a non-zero
+    # net displacement is a highway. A check costs O(max_period) and runs once
+    # every max_period steps, so pushes are O(1) amortized and memory is fixed.
+    def __init__(self, max_period=MAX_PERIOD, repeats=REPEATS):
+        self.max_period = max_period
+        self.window = max_period * repeats
+        self.capacity = self.window + 1
+        self.powers = [1] * self.capacity
+        for i in range(1, self.capacity):
+            self.powers[i] = self.powers[i - 1] * HASH_BASE % HASH_MOD
+        self.hashes = [0] * self.capacity
+        self.symbols = [0] * self.capacity
+        self.xs = [0] * self.capacity
+        self.ys = [0] * self.capacity
+        self.reset()
+
+    def reset(self):
+        # Entry i % capacity holds the hash and position after the first i symbols
+        self.count = 0
+        self.hashes[0] = self.xs[0] = self.ys[0] = 0
+        self.next_check = self.max_period
+        self.highway = None
+
+    def push(self, heading, color):
+        return self.extend((heading,), (color,))
+
+    def extend(self, headings, colors):
+        # Feed a batch of recorded steps, checking at every check point it
+        # crosses. Returns the detected Highway or None.
+        if hasattr(headings, "tolist"):
+            headings, colors = headings.tolist(), colors.tolist()
+        start, total = 0, len(headings)
+        while start < total:
+            end = total if self.highway is not None else min(total, start + self.next_check - self.count)
+            self._append(headings[start:end], colors[start:end])
+            start = end
+            if self.highway is None and self.count >= self.next_check:
+                self.next_check = self.count + self.max_period
+                self.highway = self.check()
+                instrumentation.count("highway_checks")
+        return self.highway
+
+    def _append(self, headings, colors):
+        hashes, symbols, xs, ys, capacity = self.hashes, self.symbols, self.xs, self.ys, self.capacity
+        i = self.count % capacity
+        h, x, y = hashes[i], xs[i], ys[i]
+        for heading, color in zip(headings, colors):
+            symbol = (color << 2 | heading) + 1
+            h = (h * HASH_BASE + symbol) % HASH_MOD
+            x += DX[heading]
+            y += DY[heading]
+            i += 1
+            if i == capacity:
+                i = 0
+            hashes[i], symbols[i], xs[i], ys[i] = h, symbol, x, y
+        self.count += len(headings)
+
+    def _substring_hash(self, start, end):
+        capacity = self.capacity
+        return (self.hashes[end % capacity]
+                - self.hashes[start % capacity] * self.powers[end - start]) % HASH_MOD
+
+    def check(self):
+        # Look for the shortest period p such that the last `window` symbols
+        # equal themselves shifted by p, and the ant moved over one period
+        n = self.count
+        if n < self.window:
+            return None
+        start = n - self.window
+        capacity = self.capacity
+        symbols = self.symbols
+        last, before_last = symbols[n % capacity], symbols[(n - 1) % capacity]
+        for period in range(1, self.max_period + 1):
+            # Compare the two newest symbols directly before hashing the whole window
+            if (symbols[(n - period) % capacity] != last
+                    or symbols[(n - 1 - period) % capacity] != before_last):
+                continue
+            if self._substring_hash(start, n - period) != self._substring_hash(start + period, n):
+                continue
+            drift = (self.xs[n % capacity] - self.xs[(n - period) % capacity],
+                     self.ys[n % capacity] - self.ys[(n - period) % capacity])
+            if drift != (0, 0):
+                return Highway(period, drift, n)
+        return None
+
+
+class BatchHighwayDetector:
+    # HighwayDetector for many ants at once, as fed by BatchAntEngine.step.
+    # The ring buffers are time-major (capacity, num_ants) arrays sharing one
+    # write position, so a block of steps is written as whole rows. Hashes
+    # and positions are only ever compared as differences inside an ant's
+    # current window, so reset just clears its count. Pushes are vectorized
+    # over both ants and steps: with prefix sums of symbol * base^-t the
+    # rolling hash of a whole block is H_t = base^t * (H_0 + sum), and a check
+    # tests every candidate period for every due ant in one go. Each ant is
+    # checked when its own count reaches a multiple of max_period, as
+    # HighwayDetector is, so an ant reset mid-stream finds a highway at the
+    # same step a fresh single detector would.
+    def __init__(self, num_ants, max_period=MAX_PERIOD, repeats=REPEATS):
+        self.num_ants = num_ants
+        self.max_period = max_period
+        self.window = max_period * repeats
+        self.capacity = self.window + 1
+        inverse = pow(HASH_BASE, BATCH_HASH_MOD - 2, BATCH_HASH_MOD)  # Modulus is prime
+        self.powers = np.ones(self.capacity + 1, dtype=np.int64)
+        self.inverse_powers = np.ones(self.capacity + 1, dtype=np.int64)
+        for i in range(1, self.capacity + 1):
+            self.powers[i] = self.powers[i - 1] * HASH_BASE % BATCH_HASH_MOD
+            self.inverse_powers[i] = self.inverse_powers[i - 1] * inverse % BATCH_HASH_MOD
+        shape = (self.capacity, num_ants)
+        self.hashes = np.zeros(shape, dtype=np.int64)
+        self.symbols = np.zeros(shape, dtype=np.int64)
+        self.xs = np.zeros(shape, dtype=np.int64)
+        self.ys = np.zeros(shape, dtype=np.int64)
+        self.count = np.zeros(num_ants, dtype=np.int64)
+        # Detected highways; period 0 means none yet
+        self.period = np.zeros(num_ants, dtype=np.int64)
+        self.drift = np.zeros((num_ants, 2), dtype=np.int64)
+        self.found_at = np.zeros(num_ants, dtype=np.int64)
+        self._periods = np.arange(1, max_period + 1, dtype=np.int64)
+        self._pushed = 0
+
+    def reset(self, indices=None):
+        if indices is None:
+            indices = slice(None)
+        self.count[indices] = 0
+        self.period[indices] = 0
+
+    def extend(self, headings, colors):
+        # Feed (k, num_ants) arrays of recorded steps, checking at every check
+        # point crossed. Returns the boolean mask of ants with a highway.
+        done, k = 0, len(headings)
+        while done < k:
+            # Up to the next check point of any ant
+            until = self.max_period - self.count % self.max_period
+            end = min(k, done + int(until.min()))
+            self._append(headings[done:end], colors[done:end])
+            done = end
+            due = self.count % self.max_period == 0
+            if due.any():
+                self.check(due)
+                instrumentation.count("highway_checks", int(due.sum()))
+        return self.period > 0
+
+    def _append(self, headings, colors):
+        # Push an (m, num_ants) block with m <= max_period
+        m = len(headings)
+        if m == 0:
+            return
+        last = self._pushed % self.capacity
+        rows = (self._pushed + np.arange(1, m + 1)) % self.capacity
+        headings = headings.astype(np.int64)
+        symbols = (colors.astype(np.int64) << 3 | headings) + 1
+        scaled = symbols * self.inverse_powers[1:m + 1, None] % BATCH_HASH_MOD
+        prefix = (self.hashes[last] + np.cumsum(scaled, axis=0)) % BATCH_HASH_MOD
+        self.hashes[rows] = self.powers[1:m + 1, None] * prefix % BATCH_HASH_MOD
+        self.symbols[rows] = symbols
+        self.xs[rows] = self.xs[last] + np.cumsum(BATCH_DX[headings], axis=0)
+        self.ys[rows] = self.ys[last] + np.cumsum(BATCH_DY[headings], axis=0)
+        self.count += m
+        self._pushed += m
+
+    def check(self, due=None):
+        # Same test as HighwayDetector.check, for every ant (or every ant in
+        # the `due` mask) that has filled its window and has no highway yet;
+        # the shortest matching period wins
+        pending = (self.count >= self.window) & (self.period == 0)
+        if due is not None:
+            pending &= due
+        ants = np.flatnonzero(pending)
+        if len(ants) == 0:
+            return
+        capacity, periods, n = self.capacity, self._periods, self._pushed
+        now, before = n % capacity, (n - 1) % capacity
+        shifted = (n - periods) % capacity
+        symbols = self.symbols[:, ants]
+        candidates = ((symbols[shifted] == symbols[now])
+                      & (symbols[(n - 1 - periods) % capacity] == symbols[before]))
+        if not candidates.any():
+            return
+        hashes = self.hashes[:, ants]
+        start = n - self.window
+        lengths = self.powers[self.window - periods][:, None]
+        earlier = (hashes[shifted] - hashes[start % capacity] * lengths) % BATCH_HASH_MOD
+        later = (hashes[now] - hashes[(start + periods) % capacity] * lengths) % BATCH_HASH_MOD
+        drift_x = self.xs[now, ants] - self.xs[shifted][:, ants]
+        drift_y = self.ys[now, ants] - self.ys[shifted][:, ants]
+        found = candidates & (earlier == later) & ((drift_x != 0) | (drift_y != 0))
+        columns = np.flatnonzero(found.any(axis=0))
+        if len(columns) == 0:
+            return
+        first = found[:, columns].argmax(axis=0)
+        ants = ants[columns]
+        self.period[ants] = first + 1
+        self.drift[ants, 0] = drift_x[first, columns]
+        self.drift[ants, 1] = drift_y[first, columns]
+        self.found_at[ants] = self.count[ants]
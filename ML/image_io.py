@@ -0,0 +1,55 @@
+import struct
+import zlib
+import numpy as np
+
+# Constants
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+COMPRESSION = 6  # zlib level; cell grids are long runs of one color and compress well at any level
+
+
+def _chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def encode_png(pixels, palette=None, scale=1, level=COMPRESSION):
+    # PNG bytes for a (height, width) uint8 array of palette indices, written
+    # as an indexed-color image with `palette` (a list of RGB tuples), or for
+    # a (height, width, 3) uint8 RGB array. Each cell becomes a scale x scale
+    # block, compressed at zlib `level`. Needs only zlib, so it works without
+    # pygame or Pillow.
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if scale > 1:
+        pixels = pixels.repeat(scale, axis=0).repeat(scale, axis=1)
+    height, width = pixels.shape[:2]
+    if palette is not None:
+        if pixels.ndim != 2:
+            raise ValueError("Palette images take a 2D array of color indices")
+        if len(palette) > 256:
+            raise ValueError("A PNG palette holds at most 256 colors")
+        color_type = 3
+        extra = _chunk(b"PLTE", bytes(channel for color in palette for channel in color[:3]))
+    else:
+        if pixels.ndim != 3 or pixels.shape[2] != 3:
+            raise ValueError("RGB images take a (height, width, 3) array")
+        color_type = 2
+        extra = b""
+    # Every row starts with filter type 0 (none)
+    rows = np.zeros((height, 1 + pixels[0].size), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, -1)
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (PNG_SIGNATURE + _chunk(b"IHDR", header) + extra
+            + _chunk(b"IDAT", zlib.compress(rows.tobytes(), level)) + _chunk(b"IEND", b""))
+
+
+def write_png(path, pixels, palette=None, scale=1):
+    with open(path, "wb") as file:
+        file.write(encode_png(pixels, palette, scale))
+
+
+def make_palette(count, base=(), seed=0):
+    # `count` RGB colors: the `base` colors first, then random ones that are the same on every call
+    palette = list(base[:count])
+    rng = np.random.default_rng(seed)
+    while len(palette) < count:
+        palette.append(tuple(int(v) for v in rng.integers(0, 256, 3)))
+    return palette
@@ -0,0 +1,110 @@
+import os
+import time
+
+# Constants
+# Off unless ANT_PROFILE is set or enable() is called. Every hook checks this
+# flag first, so a disabled hook is one global lookup and a return; hooks sit
+# around whole phases (a kernel call, a detector batch, a frame), never inside
+# the per-step loops.
+ENABLED = os.environ.get("ANT_PROFILE", "") not in ("", "0")
+SUMMARY_INTERVAL = 30.0  # Seconds between summaries printed by maybe_report
+
+# name -> [seconds, calls] and name -> total, since the last reset
+timers = {}
+counters = {}
+_since = time.perf_counter()
+_last_report = time.perf_counter()
+
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+
+class _Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def phase(name):
+    # Context manager timing the block under `name`
+    if not ENABLED:
+        return _NULL_PHASE
+    return _Phase(name)
+
+
+def add_time(name, seconds):
+    if not ENABLED:
+        return
+    entry = timers.get(name)
+    if entry is None:
+        timers[name] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def count(name, amount=1):
+    if not ENABLED:
+        return
+    counters[name] = counters.get(name, 0) + amount
+
+
+def reset():
+    global _since
+    timers.clear()
+    counters.clear()
+    _since = time.perf_counter()
+
+
+def summary(clear=False):
+    # {"elapsed": seconds, "timers": {name: (seconds, calls)}, "counters": {name: total}}
+    result = {"elapsed": time.perf_counter() - _since,
+              "timers": {name: tuple(entry) for name, entry in timers.items()},
+              "counters": dict(counters)}
+    if clear:
+        reset()
+    return result
+
+
+def format_summary(stats):
+    elapsed = max(stats["elapsed"], 1e-9)
+    lines = [f"--- instrumentation: {elapsed:.1f}s ---"]
+    for name, (seconds, calls) in sorted(stats["timers"].items(), key=lambda item: -item[1][0]):
+        lines.append(f"  {name:<24} {1000 * seconds:>10.1f} ms {100 * seconds / elapsed:>6.1f}% "
+                     f"{calls:>9} calls {1e6 * seconds / calls:>9.1f} us/call")
+    for name, total in sorted(stats["counters"].items()):
+        lines.append(f"  {name:<24} {total:>14,} {total / elapsed:>14,.0f}/sec")
+    return "\n".join(lines)
+
+
+def maybe_report(interval=SUMMARY_INTERVAL):
+    # Print and clear the summary if `interval` seconds have passed since the last one
+    global _last_report
+    if not ENABLED:
+        return
+    now = time.perf_counter()
+    if now - _last_report >= interval:
+        _last_report = now
+        print(format_summary(summary(clear=True)), flush=True)
@@ -0,0 +1,172 @@
+import random
+import numpy as np
+import instrumentation
+from ant_core import NO_TRACE, make_tables, run_steps
+from results_log import default_sink, rules_record
+from macro_step import MacroGrid
+from packed_grid import PackedGrid
+from sparse_grid import ChunkedGrid
+from snapshot import SNAPSHOT_FILE, load_snapshot, save_snapshot
+
+# Constants
+GRID_SIZE = 160
+# "dense": GRID_SIZE torus, "sparse": unbounded plane drawn around the origin,
+# "macro": unbounded plane with memoized macro-steps for very long runs,
+# "packed": GRID_SIZE torus stored at 1 or 4 bits per cell
+GRID_BACKEND = "dense"
+GRID_BACKENDS = ("dense", "packed", "sparse", "macro")
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+# Display color per cell color; add_rule_* and remove_rule keep it in step with the rules
+COLORS = [WHITE, BLACK, RED, GREEN, BLUE]
+
+# Directions (up, right, down, left)
+DIRECTIONS = [(0, -1), (1, 0), (0, 1), (-1, 0)]
+
+class LangtonsAnt:
+    # One ant on a grid, with the rule editing used by the game. Nothing here
+    # touches pygame, so it also runs headless (see run_headless.py).
+    def __init__(self, grid_backend=GRID_BACKEND, grid_size=GRID_SIZE, rules=None, turns=None):
+        self.grid_backend = grid_backend
+        self.grid_size = grid_size
+        if grid_backend in ("sparse", "macro"):
+            # Unbounded grid that allocates chunks as the ant visits them, or
+            # that jumps across regions it has already seen
+            self.grid = ChunkedGrid() if grid_backend == "sparse" else MacroGrid()
+            # Start the ant at the origin, which is drawn in the center
+            self.x, self.y = 0, 0
+        else:
+            # Initialize the grid with zeros (white cells)
+            self.grid = np.zeros((grid_size, grid_size), dtype=np.uint8)
+            # Start the ant in the center of the grid
+            self.x, self.y = grid_size // 2, grid_size // 2
+        self.dir = 0  # Start facing upward
+        self.steps = 0
+        # Rules for color changes: current color -> next color
+        self.rules = {0: 1, 1: 2, 2: 0} if rules is None else dict(rules)
+        # Turn rules: 1 = turn right, -1 = turn left
+        self.turns = {0: 1, 1: -1, 2: 1} if turns is None else dict(turns)
+        if grid_backend == "packed":
+            self.grid = PackedGrid(grid_size, grid_size, bits=1 if len(self.rules) <= 2 else 4)
+        self.update_tables()
+
+    def update_tables(self):
+        # Rebuild the lookup tables used by the simulation core after a rule change
+        if self.grid_backend == "packed" and len(self.rules) > self.grid.colors:
+            # Widen the cells, or fall back to one byte per cell past 16 colors
+            if self.grid.bits == 1:
+                self.grid = self.grid.repacked(4)
+            else:
+                self.grid, self.grid_backend = self.grid.unpack(), "dense"
+        self.rule_table, self.turn_table = make_tables(self.rules, self.turns)
+
+    def step(self, steps=1, headings=NO_TRACE, colors=NO_TRACE):
+        # Recolor the current cell, turn and move, `steps` times in one core
+        # call, recording the path into `headings` and `colors` if they are
+        # given (see ant_core.run_steps). Returns the steps taken.
+        if self.grid_backend != "dense":
+            self.x, self.y, self.dir, taken = self.grid.run_steps(self.x, self.y, self.dir,
+                                                                  self.rule_table, self.turn_table, steps,
+                                                                  headings, colors)
+        else:
+            self.x, self.y, self.dir, taken = run_steps(self.grid, self.x, self.y, self.dir,
+                                                        self.rule_table, self.turn_table, steps,
+                                                        headings, colors)
+        self.steps += taken
+        instrumentation.count("steps", taken)
+        return taken
+
+    def visible_grid(self):
+        # The grid_size x grid_size area drawn on screen
+        if self.grid_backend == "packed":
+            return self.grid.unpack()
+        if self.grid_backend != "dense":
+            size = self.grid_size
+            return self.grid.window(-(size // 2), -(size // 2), size, size)
+        return self.grid
+
+    def add_rule_left(self):
+        # Add a new color to the sequence
+        new_color = len(self.rules)
+        
+        # Add a random new color to the COLORS list
+        COLORS.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+
+        # Update rules to maintain the cycle
+        self.rules[new_color] = 0  # New color returns to start (0)
+        
+        # Update the previous rule to point to the new color
+        if new_color > 0:
+            self.rules[new_color - 1] = new_color  
+
+        # Set the turn direction to left (-1)
+        self.turns[new_color] = -1
+        self.update_tables()
+
+    def add_rule_right(self):
+        # Add a new color to the sequence
+        new_color = len(self.rules)
+        
+        # Add a random new color to the COLORS list
+        COLORS.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+
+        # Update rules to maintain the cycle
+        self.rules[new_color] = 0  # New color returns to start (0)
+        
+        # Update the previous rule to point to the new color
+        if new_color > 0:
+            self.rules[new_color - 1] = new_color  
+
+        # Set the turn direction to right (1)
+        self.turns[new_color] = 1
+        self.update_tables()
+
+    def remove_rule(self):
+        if len(self.rules) > 0:
+            # Remove the last element from rules and turns
+            last_color = len(self.rules) - 1
+            del self.rules[last_color]
+            del self.turns[last_color]
+            
+            # Update the cycle in rules if there are remaining elements
+            if len(self.rules) > 0:
+                # Last added color should point to the first color
+                self.rules[len(self.rules) - 1] = 0
+            
+            # Remove the last color from COLORS
+            COLORS.pop()
+            self.update_tables()
+
+    def reser_simulatin(self):
+        # Reset the simulation to initial state
+        self.__init__(self.grid_backend, self.grid_size)
+
+    def save_snapshot(self, path=SNAPSHOT_FILE):
+        save_snapshot(path, self.grid, self.x, self.y, self.dir, self.rules, self.turns, self.steps)
+
+    def load_snapshot(self, path=SNAPSHOT_FILE):
+        # Continue from a snapshot; the grid is memory-mapped copy-on-write, not read
+        header, grid = load_snapshot(path)
+        if isinstance(grid, (np.ndarray, PackedGrid)):
+            if grid.shape != (self.grid_size, self.grid_size):
+                raise ValueError(f"Snapshot grid {grid.shape} does not match grid size {self.grid_size}")
+            self.grid_backend = "packed" if isinstance(grid, PackedGrid) else "dense"
+        else:
+            self.grid_backend = "macro" if isinstance(grid, MacroGrid) else "sparse"
+        self.grid = grid
+        self.x, self.y, self.dir, self.steps = header["x"], header["y"], header["dir"], header["steps"]
+        self.rules, self.turns = header["rules"], header["turns"]
+        # COLORS holds two more entries than there are rules (see add_rule_left)
+        while len(COLORS) < len(self.rules) + 2:
+            COLORS.append((random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)))
+        del COLORS[max(len(self.rules) + 2, 5):]
+        self.update_tables()
+
+    def save_successful_rules(self):
+        # Log the current rules configuration to the shared results log
+        default_sink().write(rules_record(self.rules, self.turns, self.steps, source="game"))
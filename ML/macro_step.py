@@ -0,0 +1,303 @@
+from collections import OrderedDict
+import numpy as np
+from ant_core import NO_TRACE, get_kernel
+
+# Constants
+LEAF_SIZE = 16  # Cells per side of the smallest memoized tile
+ROOT_LEVEL = 3  # At least 1. Initial tree: LEAF_SIZE * 2^ROOT_LEVEL cells per side, centered on the origin
+MEMORY_BUDGET = 256 * 1024 * 1024  # Bytes of tiles, nodes and cached results
+NODE_OVERHEAD = 120  # Rough cost of one interned node: list slot, dict entry and key
+STOP_LEVELS = 64  # Walks stop this many nodes (and a leaf) short of the node limit, the most one step can add
+ENTRY_OVERHEAD = 200  # Rough cost of one cached result: dict node, key and value tuples
+
+
+class MacroGrid:
+    # Unbounded grid stored as a hash-consed quadtree, with memoized
+    # macro-steps. Leaves are LEAF_SIZE x LEAF_SIZE tiles and every distinct
+    # tile or (nw, ne, sw, se) combination exists once, under an integer id.
+    # The ant's walk through a node only depends on the node and where and
+    # how it entered, so (node, entry x, y, direction) -> (node after, exit
+    # x, y, direction, steps taken) is cached. A walk through a big node is
+    # built from cached walks through its children, which makes repeating
+    # structure such as a highway cost a few lookups per level instead of
+    # one kernel call per tile.
+    #
+    # Cached results are evicted in LRU order to stay within memory_budget,
+    # both when a result is stored and when a node is interned. When the
+    # interned nodes alone near it, a walk stops where it is, even deep
+    # inside the root, and the tree is compacted to the nodes still in use
+    # before it goes on. The budget cannot go below the live tree itself:
+    # once that is over half the budget, compaction waits until the nodes
+    # reach twice the live size, so compactions stay amortized. Results are
+    # tied to one rule set and dropped when run_steps is called with
+    # different tables. Steps taken from the cache
+    # have no per-step history, so traces are not supported.
+    def __init__(self, leaf_size=LEAF_SIZE, memory_budget=MEMORY_BUDGET):
+        self.leaf_size = leaf_size
+        self.memory_budget = memory_budget
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compactions = 0
+        self._tables = None
+        self._scratch = np.empty(leaf_size * leaf_size, dtype=np.uint8)
+        self.clear()
+
+    def clear(self):
+        self.nodes = []  # id -> leaf bytes or (nw, ne, sw, se) child ids
+        self.index = {}  # leaf bytes or child tuple -> id
+        self.cache = OrderedDict()
+        self.node_bytes = 0
+        self.cache_bytes = 0
+        self._set_node_limit()
+        self.empty = [self._intern(bytes(self.leaf_size * self.leaf_size))]  # Empty node per level
+        self.level = ROOT_LEVEL
+        self.root = self._empty(ROOT_LEVEL)
+        self.origin_x = self.origin_y = -(self.size(ROOT_LEVEL) // 2)
+
+    def size(self, level):
+        return self.leaf_size << level
+
+    @property
+    def nbytes(self):
+        return self.node_bytes + self.cache_bytes
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {"nodes": len(self.nodes), "cached": len(self.cache), "bytes": self.nbytes, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hit_rate, "evictions": self.evictions,
+                "compactions": self.compactions}
+
+    def _intern(self, key):
+        node = self.index.get(key)
+        if node is None:
+            node = len(self.nodes)
+            self.nodes.append(key)
+            self.index[key] = node
+            self.node_bytes += NODE_OVERHEAD + (len(key) if isinstance(key, bytes) else 0)
+            while self.nbytes > self.memory_budget and self.cache:
+                self._evict()
+        return node
+
+    def _evict(self):
+        self.cache.popitem(last=False)
+        self.cache_bytes -= ENTRY_OVERHEAD
+        self.evictions += 1
+
+    def _empty(self, level):
+        while len(self.empty) <= level:
+            child = self.empty[-1]
+            self.empty.append(self._intern((child, child, child, child)))
+        return self.empty[level]
+
+    def _grow(self):
+        # Double the covered area, keeping the current tree in the center
+        empty = self._empty(self.level - 1)
+        nw, ne, sw, se = self.nodes[self.root]
+        self.root = self._intern((self._intern((empty, empty, empty, nw)), self._intern((empty, empty, ne, empty)),
+                                  self._intern((empty, sw, empty, empty)), self._intern((se, empty, empty, empty))))
+        self.level += 1
+        self._empty(self.level)
+        quarter = self.size(self.level) // 4
+        self.origin_x -= quarter
+        self.origin_y -= quarter
+
+    def _store(self, key, value):
+        if self.node_bytes + ENTRY_OVERHEAD > self.memory_budget:
+            return  # No room left for results until the next compaction
+        self.cache[key] = value
+        self.cache_bytes += ENTRY_OVERHEAD
+        while self.nbytes > self.memory_budget and self.cache:
+            self._evict()
+
+    def compact(self):
+        # Re-intern only the nodes reachable from the root; cached results are dropped
+        nodes, remap = self.nodes, {}
+        self.nodes, self.index, self.node_bytes = [], {}, 0
+        self.cache.clear()
+        self.cache_bytes = 0
+
+        def copy(node):
+            new = remap.get(node)
+            if new is None:
+                key = nodes[node]
+                new = self._intern(key if isinstance(key, bytes) else tuple(copy(child) for child in key))
+                remap[node] = new
+            return new
+
+        self.root = copy(self.root)
+        self.empty = [copy(node) for node in self.empty]
+        self._set_node_limit()
+        self.compactions += 1
+
+    def _set_node_limit(self):
+        # Node bytes at which walks stop for a compaction
+        slack = self.leaf_size * self.leaf_size + STOP_LEVELS * NODE_OVERHEAD
+        self.node_limit = max(self.memory_budget - slack, 2 * self.node_bytes)
+
+    def _walk(self, node, level, x, y, d, budget):
+        # Walk the ant through `node` from local (x, y) until it leaves the
+        # node, gets stuck or has taken `budget` steps. Returns (node after,
+        # x, y, direction, steps); a position outside the node means it left.
+        key = (node, x, y, d)
+        entry = self.cache.get(key)
+        if entry is not None and entry[4] <= budget:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        size = self.size(level)
+        if level == 0:
+            scratch = self._scratch
+            scratch[:] = np.frombuffer(self.nodes[node], dtype=np.uint8)
+            rule_table, turn_table = self._tables
+            x, y, d, taken = self.kernel(scratch, size, size, x, y, d, rule_table, turn_table, budget,
+                                         NO_TRACE, NO_TRACE, False)
+            x, y, d, taken = int(x), int(y), int(d), int(taken)
+            new = self._intern(scratch.tobytes())
+        else:
+            half = size // 2
+            children = list(self.nodes[node])
+            taken = 0
+            while taken < budget:
+                quadrant = (y >= half) * 2 + (x >= half)
+                left, top = (quadrant & 1) * half, (quadrant >> 1) * half
+                child, child_x, child_y, d, steps = self._walk(children[quadrant], level - 1, x - left, y - top, d,
+                                                               budget - taken)
+                children[quadrant] = child
+                x, y = left + child_x, top + child_y
+                taken += steps
+                if 0 <= child_x < half and 0 <= child_y < half:
+                    break  # Out of budget or stuck inside the child
+                if not (0 <= x < size and 0 <= y < size):
+                    break  # Left this node
+                if self.node_bytes > self.node_limit:
+                    break  # Stop here so run_steps can compact
+            new = self._intern(tuple(children))
+        result = (new, x, y, d, taken)
+        if not (0 <= x < size and 0 <= y < size):
+            self._store(key, result)
+        return result
+
+    def run_steps(self, x, y, d, rule_table, turn_table, steps, headings=NO_TRACE, colors=NO_TRACE,
+                  backend=None):
+        # Same contract as ChunkedGrid.run_steps, without traces
+        if len(headings) or len(colors):
+            raise ValueError("MacroGrid.run_steps does not record traces")
+        if self._tables is None or not (np.array_equal(rule_table, self._tables[0])
+                                        and np.array_equal(turn_table, self._tables[1])):
+            self._tables = (rule_table.copy(), turn_table.copy())
+            self.cache.clear()
+            self.cache_bytes = 0
+        self.kernel = get_kernel(backend)
+        taken = 0
+        while taken < steps:
+            size = self.size(self.level)
+            local_x, local_y = x - self.origin_x, y - self.origin_y
+            if not (0 <= local_x < size and 0 <= local_y < size):
+                self._grow()
+                continue
+            self.root, local_x, local_y, d, n = self._walk(self.root, self.level, local_x, local_y, d,
+                                                           steps - taken)
+            x, y = self.origin_x + local_x, self.origin_y + local_y
+            taken += n
+            if self.node_bytes > self.node_limit:
+                self.compact()
+                if n:
+                    continue
+            if 0 <= local_x < size and 0 <= local_y < size:
+                break  # Done, or stuck on a color without a rule
+        return x, y, d, taken
+
+    def tiles(self):
+        # ((tx, ty), tile) for every non-empty leaf, in tile coordinates
+        size = self.leaf_size
+
+        def visit(node, level, left, top):
+            if node == self.empty[level]:
+                return
+            if level == 0:
+                tile = np.frombuffer(self.nodes[node], dtype=np.uint8).reshape(size, size)
+                yield (left // size, top // size), tile
+                return
+            half = self.size(level) // 2
+            for quadrant, child in enumerate(self.nodes[node]):
+                yield from visit(child, level - 1, left + (quadrant & 1) * half, top + (quadrant >> 1) * half)
+
+        return visit(self.root, self.level, self.origin_x, self.origin_y)
+
+    def set_tile(self, tx, ty, tile):
+        # Replace the leaf at tile coordinates (tx, ty), growing the tree to reach it
+        size = self.leaf_size
+        while not (0 <= tx * size - self.origin_x < self.size(self.level)
+                   and 0 <= ty * size - self.origin_y < self.size(self.level)):
+            self._grow()
+        leaf = self._intern(np.ascontiguousarray(tile, dtype=np.uint8).tobytes())
+
+        def replace(node, level, x, y):
+            # (x, y) is the tile offset inside node, in leaves
+            if level == 0:
+                return leaf
+            half = 1 << (level - 1)
+            quadrant = (y >= half) * 2 + (x >= half)
+            children = list(self.nodes[node])
+            children[quadrant] = replace(children[quadrant], level - 1, x - (quadrant & 1) * half,
+                                         y - (quadrant >> 1) * half)
+            return self._intern(tuple(children))
+
+        self.root = replace(self.root, self.level, tx - self.origin_x // size, ty - self.origin_y // size)
+
+    def __getitem__(self, pos):
+        x, y = pos
+        return int(self.window(x, y, 1, 1)[0, 0])
+
+    def bounds(self):
+        # (x0, y0, x1, y1) cell bounds of the non-empty tiles, end exclusive
+        found = []
+
+        def visit(node, level, left, top):
+            if node == self.empty[level]:
+                return
+            size = self.size(level)
+            if level == 0:
+                found.append((left, top, left + size, top + size))
+                return
+            half = size // 2
+            for quadrant, child in enumerate(self.nodes[node]):
+                visit(child, level - 1, left + (quadrant & 1) * half, top + (quadrant >> 1) * half)
+
+        visit(self.root, self.level, self.origin_x, self.origin_y)
+        if not found:
+            return 0, 0, 0, 0
+        return (min(b[0] for b in found), min(b[1] for b in found),
+                max(b[2] for b in found), max(b[3] for b in found))
+
+    def window(self, x0, y0, width, height, out=None):
+        # Dense (height, width) copy of the region starting at (x0, y0)
+        if out is None:
+            out = np.zeros((height, width), dtype=np.uint8)
+        else:
+            out.fill(0)
+
+        def visit(node, level, left, top):
+            size = self.size(level)
+            if (node == self.empty[level] or left >= x0 + width or top >= y0 + height
+                    or left + size <= x0 or top + size <= y0):
+                return
+            if level == 0:
+                tile = np.frombuffer(self.nodes[node], dtype=np.uint8).reshape(size, size)
+                x_start, y_start = max(x0, left), max(y0, top)
+                x_end, y_end = min(x0 + width, left + size), min(y0 + height, top + size)
+                out[y_start - y0:y_end - y0, x_start - x0:x_end - x0] = \
+                    tile[y_start - top:y_end - top, x_start - left:x_end - left]
+                return
+            half = size // 2
+            for quadrant, child in enumerate(self.nodes[node]):
+                visit(child, level - 1, left + (quadrant & 1) * half, top + (quadrant >> 1) * half)
+
+        visit(self.root, self.level, self.origin_x, self.origin_y)
+        return out
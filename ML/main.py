@@ -1,10 +1,9 @@
 import gymnasium as gym
 import numpy as np
-import pygame
 import random
-from stable_baselines3 import PPO
-from stable_baselines3.common.env_checker import check_env
-from datetime import datetime
+from ant_core import make_tables, run_steps
+from highway import HighwayDetector
+from results_log import default_sink, rules_record
 
 # Constants
 GRID_SIZE = 100
@@ -25,7 +24,10 @@ class LangtonsAntEnv(gym.Env):
         self.dir = 0
         self.rules = {0: 1, 1: 0}  # Initial rule: flip black <-> white
         self.turns = {0: 1, 1: -1}  # Right turn for white, left turn for black
-        self.previous_positions = set()
+        self.rule_table, self.turn_table = make_tables(self.rules, self.turns)
+        self.highway_detector = HighwayDetector()
+        self.headings = np.empty(100, dtype=np.uint8)  # Per-step history buffers for the detector
+        self.colors = np.empty(100, dtype=np.uint8)
         self.steps = 0
         self.highway_detected = False
         
@@ -39,14 +41,14 @@ class LangtonsAntEnv(gym.Env):
         elif action == 1:
             self.remove_rule()
         
-        for _ in range(100):  # Simulate 100 steps per action
-            self._move_ant()
+        self._move_ant(100)  # Simulate 100 steps per action
         
         self.steps += 100
         reward = 0
         
-        # Check for highway formation
-        if self.detect_highway():
+        # Check for highway formation; it is rewarded and logged once, on the
+        # step it is found, and ends the episode as in ai_training.py
+        if not self.highway_detected and self.detect_highway():
             reward += 50  # Large reward for highway
             self.highway_detected = True
             self.save_successful_rules()
@@ -54,7 +56,7 @@ class LangtonsAntEnv(gym.Env):
         if self.steps >= STEPS_BEFORE_CHECK and not self.highway_detected:
             reward -= 20  # Penalize for failing to create a highway
         
-        terminated = self.steps >= STEPS_BEFORE_CHECK
+        terminated = self.highway_detected or self.steps >= STEPS_BEFORE_CHECK
         truncated = False  # We don't truncate episodes early
         
         return self.grid.flatten(), reward, terminated, truncated, {}
@@ -66,19 +68,21 @@ class LangtonsAntEnv(gym.Env):
         self.dir = 0
         self.rules = {0: 1, 1: 0}
         self.turns = {0: 1, 1: -1}
-        self.previous_positions.clear()
+        self.rule_table, self.turn_table = make_tables(self.rules, self.turns)
+        self.highway_detector.reset()
         self.steps = 0
         self.highway_detected = False
         return self.grid.flatten(), {}
     
-    def _move_ant(self):
-        current_color = self.grid[self.y, self.x]
-        self.grid[self.y, self.x] = self.rules[current_color]
-        self.dir = (self.dir + self.turns[current_color]) % 4
-        dx, dy = DIRECTIONS[self.dir]
-        self.x = (self.x + dx) % GRID_SIZE
-        self.y = (self.y + dy) % GRID_SIZE
-        self.previous_positions.add((self.x, self.y))
+    def _move_ant(self, steps=1):
+        if len(self.headings) < steps:
+            self.headings = np.empty(steps, dtype=np.uint8)
+            self.colors = np.empty(steps, dtype=np.uint8)
+        self.x, self.y, self.dir, taken = run_steps(self.grid, self.x, self.y, self.dir,
+                                                    self.rule_table, self.turn_table, steps,
+                                                    self.headings, self.colors)
+        # Stream the recorded (heading, color) history into the highway detector
+        self.highway_detector.extend(self.headings[:taken], self.colors[:taken])
     
     def add_rule(self):
         if len(self.rules) < 2:  # Keep only binary values in the grid
@@ -87,6 +91,7 @@ class LangtonsAntEnv(gym.Env):
             self.rules[new_color] = 0
             self.rules[new_color - 1] = new_color
             self.turns[new_color] = random.choice([-1, 1])
+            self.rule_table, self.turn_table = make_tables(self.rules, self.turns)
     
     def remove_rule(self):
         if len(self.rules) > 2:
@@ -95,31 +100,35 @@ class LangtonsAntEnv(gym.Env):
             self.grid[self.grid == last_color] = 0
             del self.rules[last_color]
             del self.turns[last_color]
+            self.rule_table, self.turn_table = make_tables(self.rules, self.turns)
             COLORS.pop()
     
     def detect_highway(self):
-        last_positions = list(self.previous_positions)[-50:]
-        if len(set(last_positions)) == 1:
-            return True  # If the last 50 positions are the same, it's a highway
-        return False
+        # The detector checks the step history as it streams in, so this is a lookup
+        return self.highway_detector.highway is not None
     
     def save_successful_rules(self):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open("successful_rules.txt", "a") as file:
-            file.write(f"\n=== Successful Rules Found at {timestamp} ===\n")
-            file.write(f"Steps taken: {self.steps}\n")
-            file.write("Rules:\n")
-            for color, next_color in self.rules.items():
-                file.write(f"  Color {color} -> {next_color} (Turn: {self.turns[color]})\n")
-            file.write("=" * 50 + "\n")
+        highway = self.highway_detector.highway
+        default_sink().write(rules_record(self.rules, self.turns, self.steps,
+                                          highway and highway.period, highway and highway.drift, "main"))
 
-# Initialize and check environment
-env = LangtonsAntEnv()
-check_env(env)
 
-# Train RL Model
-model = PPO("MlpPolicy", env, verbose=1)
-model.learn(total_timesteps=10000)
+def main():
+    # SB3 pulls in torch, so it is only imported when training actually runs
+    from stable_baselines3 import PPO
+    from stable_baselines3.common.env_checker import check_env
 
-# Save the trained model
-model.save("langtons_ant_rl")
+    # Initialize and check environment
+    env = LangtonsAntEnv()
+    check_env(env)
+
+    # Train RL Model
+    model = PPO("MlpPolicy", env, verbose=1)
+    model.learn(total_timesteps=10000)
+
+    # Save the trained model
+    model.save("langtons_ant_rl")
+
+
+if __name__ == "__main__":
+    main()
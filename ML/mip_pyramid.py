@@ -0,0 +1,128 @@
+import numpy as np
+
+# Constants
+TILE_SIZE = 64  # Cells per side of a dirty-tracking tile; a power of two
+
+
+def dominant_2x2(cells):
+    # Dominant color of every 2x2 block over the last two axes of a
+    # (..., 2h, 2w) array, as a (..., h, w) array. Ties go to the higher
+    # color, so thin lines of a non-background color stay visible when
+    # zoomed out.
+    candidates = np.stack([cells[..., 0::2, 0::2], cells[..., 0::2, 1::2],
+                           cells[..., 1::2, 0::2], cells[..., 1::2, 1::2]])
+    counts = (candidates[:, None] == candidates[None, :]).sum(axis=1, dtype=np.int32)
+    scores = counts * 256 + candidates
+    best = scores.argmax(axis=0)
+    return np.take_along_axis(candidates, best[None], axis=0)[0]
+
+
+class MipPyramid:
+    # Downsampled copies of a (height, width) uint8 grid: level k holds the
+    # dominant color of every 2^k x 2^k block, computed from the 2x2 blocks of
+    # level k - 1 (a dominant of dominants, close to the block's true mode and
+    # much cheaper). Level 0 is the pyramid's own copy of the grid.
+    #
+    # update() only recomputes the TILE_SIZE x TILE_SIZE tiles that changed,
+    # or that contain given cell positions: the levels where a tile still
+    # spans several blocks are refreshed for all dirty tiles in one
+    # vectorized pass, and the few levels above, at most one block per tile,
+    # are small enough to recompute whole. Keeping the pyramid current costs
+    # about the area the ant touched, not the board.
+    def __init__(self, height, width, tile_size=TILE_SIZE):
+        if tile_size & (tile_size - 1):
+            raise ValueError("tile_size must be a power of two")
+        self.height = height
+        self.width = width
+        self.tile_size = tile_size
+        self.tile_shift = tile_size.bit_length() - 1
+        self.tiles_y = -(-height // tile_size)
+        self.tiles_x = -(-width // tile_size)
+        # Up to the tile level, levels are stored padded to whole tiles (the
+        # padding stays background) so they reshape into (tile, cell) axes;
+        # self.levels holds views trimmed to the real size
+        self._storage = []
+        self._tiled = []
+        self.levels = []
+        h, w = height, width
+        for level in range(self.tile_shift + 1):
+            span = tile_size >> level
+            storage = np.zeros((self.tiles_y * span, self.tiles_x * span), dtype=np.uint8)
+            self._storage.append(storage)
+            self._tiled.append(storage.reshape(self.tiles_y, span, self.tiles_x, span))
+            self.levels.append(storage[:h, :w])
+            h, w = (h + 1) // 2, (w + 1) // 2
+        while max(self.levels[-1].shape) > 1:
+            h, w = self.levels[-1].shape
+            self.levels.append(np.zeros(((h + 1) // 2, (w + 1) // 2), dtype=np.uint8))
+        self._diff = np.zeros((self.tiles_y * tile_size, self.tiles_x * tile_size), dtype=bool)
+        # Faster comparison 8 cells at a time, when rows and tiles split into whole 64-bit words
+        self._word_diff = None
+        if width % 8 == 0 and tile_size % 64 == 0:
+            self._word_diff = np.zeros((self.tiles_y * tile_size, self.tiles_x * tile_size // 8), dtype=bool)
+
+    @property
+    def top(self):
+        return len(self.levels) - 1
+
+    def rebuild(self, grid):
+        self.levels[0][:] = grid
+        for level in range(1, self.tile_shift + 1):
+            self._storage[level][:] = dominant_2x2(self._storage[level - 1])
+        self._update_top()
+
+    def _update_top(self):
+        for level in range(self.tile_shift + 1, len(self.levels)):
+            h, w = self.levels[level].shape
+            self._recompute(level, 0, h, 0, w)
+
+    def _recompute(self, level, y0, y1, x0, x1):
+        # Refresh rows y0:y1, columns x0:x1 of `level` from the level below
+        below = self.levels[level - 1]
+        source = below[2 * y0:2 * y1, 2 * x0:2 * x1]
+        if source.shape != (2 * (y1 - y0), 2 * (x1 - x0)):
+            # Odd edge of the level below: pad with the background color
+            padded = np.zeros((2 * (y1 - y0), 2 * (x1 - x0)), dtype=np.uint8)
+            padded[:source.shape[0], :source.shape[1]] = source
+            source = padded
+        self.levels[level][y0:y1, x0:x1] = dominant_2x2(source)
+
+    def changed_tiles(self, grid):
+        # (ty, tx) arrays of the tiles where `grid` differs from level 0
+        size = self.tile_size
+        if self._word_diff is not None and grid.strides[1] == 1:
+            np.not_equal(grid.view(np.uint64), self.levels[0].view(np.uint64),
+                         out=self._word_diff[:self.height, :self.width // 8])
+            # Each tile row is size // 8 flags, read back as size // 64 words
+            words = self._word_diff.view(np.uint64)
+            tiles = words.reshape(self.tiles_y, size, self.tiles_x, size // 64).any(axis=(1, 3))
+        else:
+            np.not_equal(grid, self.levels[0], out=self._diff[:self.height, :self.width])
+            tiles = self._diff.reshape(self.tiles_y, size, self.tiles_x, size).any(axis=(1, 3))
+        return np.nonzero(tiles)
+
+    def update(self, grid, xs=None, ys=None):
+        # Bring the pyramid up to date with `grid`. With cell positions (e.g.
+        # from ant_core.trace_positions) only their tiles are refreshed;
+        # without, the tiles are found by comparing against level 0.
+        # Returns the number of tiles refreshed.
+        if xs is None:
+            ty, tx = self.changed_tiles(grid)
+        else:
+            keys = ((np.asarray(ys, dtype=np.int64) >> self.tile_shift) * self.tiles_x
+                    + (np.asarray(xs, dtype=np.int64) >> self.tile_shift))
+            touched = np.bincount(keys, minlength=self.tiles_y * self.tiles_x)
+            ty, tx = np.divmod(np.flatnonzero(touched), self.tiles_x)
+        if len(ty) == 0:
+            return 0
+        size = self.tile_size
+        for y, x in zip(ty.tolist(), tx.tolist()):
+            rows, cols = slice(y * size, (y + 1) * size), slice(x * size, (x + 1) * size)
+            self.levels[0][rows, cols] = grid[rows, cols]
+        # (tiles, span, span) blocks of the dirty tiles, one level at a time
+        blocks = self._tiled[0][ty, :, tx, :]
+        for level in range(1, self.tile_shift + 1):
+            blocks = dominant_2x2(blocks)
+            self._tiled[level][ty, :, tx, :] = blocks
+        self._update_top()
+        return len(ty)
@@ -0,0 +1,190 @@
+import numpy as np
+from ant_core import DX, DY, HAVE_NUMBA, rules_from_turn_string
+
+if HAVE_NUMBA:
+    from numba import njit
+
+# Constants
+GRID_SIZE = 160
+STUCK = 4  # Heading recorded for an ant without a rule for its (state, color), as in batch_engine
+NO_TRACE = np.empty((0, 0), dtype=np.uint8)
+
+# Turns are quarter turns clockwise, so the ant turns of ant_core (1 = right,
+# -1 = left) work unchanged and 2 is a U-turn
+NO_TURN, RIGHT, U_TURN, LEFT = 0, 1, 2, -1
+
+
+def turmite_from_rules(rules, turns):
+    # A Langton's ant rule set (color -> color and color -> turn dicts) as a one-state turmite
+    return {(0, color): (next_color, turns[color], 0) for color, next_color in rules.items()}
+
+
+def turmite_from_turn_string(turn_string):
+    return turmite_from_rules(*rules_from_turn_string(turn_string))
+
+
+def _multi_step_loop(cells, size, xs, ys, ds, ss, species, writes, turns, states, moves, steps, headings, colors,
+                     read):
+    # Every ant reads its cell, then all of them write, turn and move: one
+    # tick. Writes go from the highest ant index down, so when several ants
+    # share a cell the lowest index wins, the same rule as the NumPy backend.
+    record = headings.shape[0] >= steps and colors.shape[0] >= steps
+    n = xs.shape[0]
+    for i in range(steps):
+        for a in range(n):
+            read[a] = cells[ys[a] * size + xs[a]]
+        for a in range(n - 1, -1, -1):
+            cells[ys[a] * size + xs[a]] = writes[species[a], ss[a], read[a]]
+        for a in range(n):
+            t, s, c = species[a], ss[a], read[a]
+            d = (ds[a] + turns[t, s, c]) & 3
+            heading = 4
+            if moves[t, s, c]:
+                heading = d
+                xs[a] = (xs[a] + DX[d]) % size
+                ys[a] = (ys[a] + DY[d]) % size
+            ds[a] = d
+            ss[a] = states[t, s, c]
+            if record:
+                headings[i, a] = heading
+                colors[i, a] = c
+
+
+MULTI_KERNEL = njit(cache=True, nogil=True)(_multi_step_loop) if HAVE_NUMBA else None
+
+
+class MultiAntEngine:
+    # Many ants, or turmites, on one shared (grid_size, grid_size) torus.
+    # A turmite is a table (state, color) -> (color to write, turn, next
+    # state); a Langton's ant is a turmite with one state. Every ant has a
+    # species (which table it follows), a position, a heading and a state,
+    # all kept in arrays, and one tick advances all of them together: a
+    # compiled loop over the ants when Numba is installed ("numba"),
+    # otherwise a few NumPy operations across the whole population ("numpy").
+    #
+    # Ticks are simultaneous: every ant reads the color under it before any
+    # ant writes. When several ants stand on the same cell they all act on
+    # the color they read, and the write of the lowest ant index is the one
+    # that sticks.
+    def __init__(self, turmites, grid_size=GRID_SIZE, backend=None):
+        # turmites: list of {(state, color): (write, turn, next_state)} dicts, one per species
+        if backend is None:
+            backend = "numba" if MULTI_KERNEL is not None else "numpy"
+        if backend not in ("numba", "numpy") or (backend == "numba" and MULTI_KERNEL is None):
+            raise ValueError(f"Unknown or unavailable backend {backend!r}")
+        self.backend = backend
+        self.grid_size = grid_size
+        self.grid = np.zeros((grid_size, grid_size), dtype=np.uint8)
+        self._cells = self.grid.reshape(-1)
+        self.x = np.zeros(0, dtype=np.int64)
+        self.y = np.zeros(0, dtype=np.int64)
+        self.dir = np.zeros(0, dtype=np.int64)
+        self.state = np.zeros(0, dtype=np.int64)
+        self.species = np.zeros(0, dtype=np.int64)
+        self.set_turmites(turmites)
+        self.ticks = 0
+        self._read = np.zeros(0, dtype=np.uint8)
+
+    @property
+    def num_ants(self):
+        return len(self.x)
+
+    def set_turmites(self, turmites):
+        # Build the (species, state, color) lookup tables. A (state, color)
+        # without an entry keeps its color, state and heading and does not
+        # move, like a color without a rule in ant_core.
+        # Every state an ant can enter and every color on the board needs a
+        # table entry: the compiled loop does no bounds checks
+        num_states = 1 + max(max(state, next_state) for table in turmites
+                             for (state, _), (_, _, next_state) in table.items())
+        num_colors = 1 + max(max(color, write) for table in turmites for (_, color), (write, _, _) in table.items())
+        num_colors = max(num_colors, int(self.grid.max(initial=0)) + 1)
+        if num_colors > 256:
+            raise ValueError("Cells hold at most 256 colors")
+        if min(min(state, next_state, color, write) for table in turmites
+               for (state, color), (write, _, next_state) in table.items()) < 0:
+            raise ValueError("States and colors must not be negative")
+        if len(self.state) and self.state.max() >= num_states:
+            raise ValueError(f"States must be below {num_states}")
+        if len(self.species) and self.species.max() >= len(turmites):
+            raise ValueError(f"Species must be below {len(turmites)}")
+        shape = (len(turmites), num_states, num_colors)
+        self.write_table = np.empty(shape, dtype=np.uint8)
+        self.write_table[:] = np.arange(num_colors, dtype=np.uint8)
+        self.turn_table = np.zeros(shape, dtype=np.int64)
+        self.state_table = np.empty(shape, dtype=np.int64)
+        self.state_table[:] = np.arange(num_states, dtype=np.int64)[:, None]
+        self.move_table = np.zeros(shape, dtype=np.uint8)
+        for t, table in enumerate(turmites):
+            for (state, color), (write, turn, next_state) in table.items():
+                self.write_table[t, state, color] = write
+                self.turn_table[t, state, color] = turn
+                self.state_table[t, state, color] = next_state
+                self.move_table[t, state, color] = 1
+
+    def add_ants(self, xs, ys, dirs=0, states=0, species=0):
+        # Append ants; scalars are broadcast. Returns the indices of the new
+        # ants. Everything is checked before the engine is touched, so a
+        # rejected call leaves no ant behind for the unchecked compiled loop.
+        xs = np.atleast_1d(np.asarray(xs, dtype=np.int64)) % self.grid_size
+        count = len(xs)
+        ys = np.broadcast_to(np.asarray(ys, dtype=np.int64) % self.grid_size, count)
+        dirs = np.broadcast_to(np.asarray(dirs, dtype=np.int64) & 3, count)
+        states = np.broadcast_to(np.asarray(states, dtype=np.int64), count)
+        species = np.broadcast_to(np.asarray(species, dtype=np.int64), count)
+        if count and not 0 <= species.min() <= species.max() < len(self.write_table):
+            raise ValueError(f"Species must be in 0..{len(self.write_table) - 1}")
+        if count and not 0 <= states.min() <= states.max() < self.write_table.shape[1]:
+            raise ValueError(f"States must be in 0..{self.write_table.shape[1] - 1}")
+        start = self.num_ants
+        self.x = np.concatenate([self.x, xs])
+        self.y = np.concatenate([self.y, ys])
+        self.dir = np.concatenate([self.dir, dirs])
+        self.state = np.concatenate([self.state, states])
+        self.species = np.concatenate([self.species, species])
+        self._read = np.zeros(self.num_ants, dtype=np.uint8)
+        return np.arange(start, self.num_ants)
+
+    def add_ant(self, x, y, d=0, state=0, species=0):
+        return int(self.add_ants(x, y, d, state, species)[0])
+
+    def clear(self):
+        self.grid.fill(0)
+        self.ticks = 0
+
+    def step(self, k=1, headings=None, colors=None):
+        # Advance every ant k ticks. Optional (k, num_ants) uint8 arrays record
+        # the direction each ant moved in (STUCK if it had no rule to follow)
+        # and the color it read at every tick.
+        headings = NO_TRACE if headings is None else headings
+        colors = NO_TRACE if colors is None else colors
+        # The board may have been painted directly since the tables were built
+        if self.grid.max(initial=0) >= self.write_table.shape[2]:
+            raise ValueError(f"Grid colors must be below {self.write_table.shape[2]}; call set_turmites again")
+        if self.backend == "numba":
+            MULTI_KERNEL(self._cells, self.grid_size, self.x, self.y, self.dir, self.state, self.species,
+                         self.write_table, self.turn_table, self.state_table, self.move_table, k, headings, colors,
+                         self._read)
+        else:
+            self._step_numpy(k, headings, colors)
+        self.ticks += k
+
+    def _step_numpy(self, k, headings, colors):
+        record = len(headings) >= k and len(colors) >= k
+        size, cells, species = self.grid_size, self._cells, self.species
+        dx, dy = np.array(DX, dtype=np.int64), np.array(DY, dtype=np.int64)
+        for i in range(k):
+            pos = self.y * size + self.x
+            color = cells[pos]
+            # np.unique returns the first, so lowest, ant index on every occupied cell
+            occupied, first = np.unique(pos, return_index=True)
+            cells[occupied] = self.write_table[species[first], self.state[first], color[first]]
+            rule = (species, self.state, color)
+            self.dir = (self.dir + self.turn_table[rule]) & 3
+            moving = self.move_table[rule].astype(bool)
+            self.x = np.where(moving, (self.x + dx[self.dir]) % size, self.x)
+            self.y = np.where(moving, (self.y + dy[self.dir]) % size, self.y)
+            self.state = self.state_table[rule]
+            if record:
+                headings[i] = np.where(moving, self.dir, STUCK)
+                colors[i] = color
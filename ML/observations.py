@@ -0,0 +1,138 @@
+import numpy as np
+import gymnasium as gym
+
+# Constants
+GRID_SIZE = 160
+MAX_COLORS = 10  # Same limit as LangtonsAntEnv.add_rule
+OBS_MODES = ("local", "histogram", "grid")
+LOCAL_RADIUS = 7  # "local": (2 * radius + 1)^2 cells centered on the ant
+HISTOGRAM_BLOCK = 32  # "histogram": color fractions per HISTOGRAM_BLOCK^2 block
+
+# Moves per recorded heading; heading 4 means the ant did not move (batch_engine.STUCK)
+STEP_DX = np.array([0, 1, 0, -1, 0], dtype=np.int64)
+STEP_DY = np.array([-1, 0, 1, 0, 0], dtype=np.int64)
+
+
+def encode_turns(turns, max_colors=MAX_COLORS):
+    # Color -> turn dict as one feature per color: 0 no rule, 0.5 left, 1 right
+    row = np.zeros(max_colors, dtype=np.float32)
+    for color, turn in turns.items():
+        row[color] = (turn + 3) / 4
+    return row
+
+
+class Observer:
+    # Builds the observations of num_envs environments into one preallocated
+    # (num_envs, size) buffer:
+    #   "local":     colors in a window centered on the ant
+    #   "histogram": fraction of each color per block of the observed grid,
+    #                followed by the encoded turn table. The counts are kept
+    #                up to date from the recorded steps, never by a rescan.
+    #   "grid":      the full grid as is, a view instead of a copy when the
+    #                caller's grids are already laid out as (num_envs, size)
+    def __init__(self, mode, num_envs=1, grid_size=GRID_SIZE, max_colors=MAX_COLORS):
+        if mode not in OBS_MODES:
+            raise ValueError(f"Unknown observation mode {mode!r}, expected one of {OBS_MODES}")
+        if grid_size % HISTOGRAM_BLOCK:
+            raise ValueError(f"grid_size must be a multiple of {HISTOGRAM_BLOCK}")
+        self.mode = mode
+        self.num_envs = num_envs
+        self.grid_size = grid_size
+        self.max_colors = max_colors
+        self.local_size = 2 * LOCAL_RADIUS + 1
+        self.blocks = grid_size // HISTOGRAM_BLOCK
+        self.counts = np.zeros((num_envs, self.blocks * self.blocks, max_colors), dtype=np.int32)
+        self.rule_features = np.zeros((num_envs, max_colors), dtype=np.float32)
+        if mode == "local":
+            self.space = gym.spaces.Box(low=0, high=max_colors - 1, shape=(self.local_size ** 2,), dtype=np.uint8)
+        elif mode == "histogram":
+            size = self.counts[0].size + max_colors
+            self.space = gym.spaces.Box(low=0, high=1, shape=(size,), dtype=np.float32)
+        else:
+            self.space = gym.spaces.Box(low=0, high=max_colors - 1, shape=(grid_size * grid_size,), dtype=np.uint8)
+        self.buffer = np.zeros((num_envs,) + self.space.shape, dtype=self.space.dtype)
+        self._offsets = np.arange(-LOCAL_RADIUS, LOCAL_RADIUS + 1, dtype=np.int64)
+        self._rows = np.arange(num_envs)
+
+    def reset(self, indices=None):
+        # Environments back on an all-zero grid
+        if indices is None:
+            indices = slice(None)
+        self.counts[indices] = 0
+        self.counts[indices, :, 0] = HISTOGRAM_BLOCK * HISTOGRAM_BLOCK
+
+    def set_rules(self, i, turns):
+        self.rule_features[i] = encode_turns(turns, self.max_colors)
+
+    def recount(self, i, grid, block_row=0):
+        # Rebuild the histogram of environment i from a dense (grid_size,
+        # grid_size) frame, or the block rows covered by a band of whole
+        # block rows starting at `block_row`
+        if self.mode != "histogram":
+            return
+        rows = grid.shape[0] // HISTOGRAM_BLOCK
+        blocks = grid.reshape(rows, HISTOGRAM_BLOCK, self.blocks, HISTOGRAM_BLOCK).transpose(0, 2, 1, 3)
+        keys = np.arange(rows * self.blocks)[:, None] * self.max_colors + blocks.reshape(rows * self.blocks, -1)
+        start = block_row * self.blocks
+        counts = self.counts[i, start:start + rows * self.blocks]
+        counts[...] = np.bincount(keys.ravel(), minlength=counts.size).reshape(counts.shape)
+
+    def replace_color(self, i, old_color, new_color):
+        # Environment i had every old_color cell repainted new_color
+        self.counts[i, :, new_color] += self.counts[i, :, old_color]
+        self.counts[i, :, old_color] = 0
+
+    def record(self, xs, ys, headings, colors, rule_tables, wrap=True):
+        # Update the histograms from (k, num_envs) traces of the steps that
+        # started at xs, ys (in observed grid coordinates). Each step rewrote
+        # the cell it stood on from the color read to rule_tables[env, color].
+        # Without wrap, cells outside the observed grid are ignored.
+        if self.mode != "histogram" or len(headings) == 0:
+            return
+        size = self.grid_size
+        headings = headings.astype(np.int64)
+        # Cell of step i = start + moves of steps 0 .. i - 1
+        cell_x = xs + np.cumsum(STEP_DX[headings], axis=0) - STEP_DX[headings]
+        cell_y = ys + np.cumsum(STEP_DY[headings], axis=0) - STEP_DY[headings]
+        if wrap:
+            cell_x %= size
+            cell_y %= size
+        else:
+            inside = (cell_x >= 0) & (cell_x < size) & (cell_y >= 0) & (cell_y < size)
+            cell_x, cell_y = np.clip(cell_x, 0, size - 1), np.clip(cell_y, 0, size - 1)
+        block = (cell_y // HISTOGRAM_BLOCK) * self.blocks + cell_x // HISTOGRAM_BLOCK
+        old = colors.astype(np.int64)
+        new = rule_tables[self._rows, old].astype(np.int64)
+        base = (self._rows * self.blocks * self.blocks + block) * self.max_colors
+        added, removed = base + new, base + old
+        if wrap:
+            added, removed = added.ravel(), removed.ravel()
+        else:
+            added, removed = added[inside], removed[inside]
+        flat = self.counts.reshape(-1)
+        flat += np.bincount(added, minlength=flat.size).astype(np.int32)
+        flat -= np.bincount(removed, minlength=flat.size).astype(np.int32)
+
+    def observe(self, grids, xs, ys):
+        # Observations for (num_envs, grid_size, grid_size) toroidal grids with
+        # the ants at xs, ys. Returns the shared buffer (or a view of grids in
+        # "grid" mode), which is overwritten by the next call.
+        if self.mode == "local":
+            size = self.grid_size
+            rows = (ys[:, None] + self._offsets) % size
+            cols = (xs[:, None] + self._offsets) % size
+            window = self.buffer.reshape(self.num_envs, self.local_size, self.local_size)
+            window[...] = grids[self._rows[:, None, None], rows[:, :, None], cols[:, None, :]]
+            return self.buffer
+        if self.mode == "histogram":
+            return self.histogram()
+        if grids.flags.c_contiguous:
+            return grids.reshape(self.num_envs, -1)
+        self.buffer[...] = grids.reshape(self.num_envs, -1)
+        return self.buffer
+
+    def histogram(self):
+        split = self.counts[0].size
+        np.multiply(self.counts.reshape(self.num_envs, -1), 1.0 / HISTOGRAM_BLOCK ** 2, out=self.buffer[:, :split])
+        self.buffer[:, split:] = self.rule_features
+        return self.buffer
@@ -0,0 +1,157 @@
+import numpy as np
+from ant_core import DEFAULT_BACKEND, DX, DY, HAVE_NUMBA, NO_TRACE
+
+if HAVE_NUMBA:
+    from numba import njit
+
+# Constants
+BIT_DEPTHS = (1, 4)  # 2 colors at 8 cells per byte, or up to 16 colors at 2 cells per byte
+
+
+def _packed_step_loop(data, width, height, bits, x, y, d, rules, turns, steps, headings, colors):
+    # ant_core._step_loop on a torus packed 8 // bits cells per byte, lowest
+    # bits first. Shared by the Numba and Python backends.
+    record = len(headings) >= steps and len(colors) >= steps
+    per_byte_shift = 3 if bits == 1 else 1  # log2(cells per byte)
+    cell_mask = (1 << per_byte_shift) - 1
+    color_mask = (1 << bits) - 1
+    for i in range(steps):
+        pos = y * width + x
+        index = pos >> per_byte_shift
+        shift = (pos & cell_mask) * bits
+        byte = data[index]
+        color = (byte >> shift) & color_mask
+        next_color = rules[color]
+        if next_color < 0:
+            return x, y, d, i
+        data[index] = (byte & (255 ^ (color_mask << shift))) | (next_color << shift)
+        d = (d + turns[color]) & 3
+        if record:
+            headings[i] = d
+            colors[i] = color
+        x = (x + DX[d]) % width
+        y = (y + DY[d]) % height
+    return x, y, d, steps
+
+
+def _python_packed_kernel(data, width, height, bits, x, y, d, rule_table, turn_table, steps, headings, colors):
+    return _packed_step_loop(memoryview(data), width, height, bits, x, y, d, rule_table.tolist(),
+                             turn_table.tolist(), steps, memoryview(headings), memoryview(colors))
+
+
+PACKED_KERNELS = {"python": _python_packed_kernel}
+if HAVE_NUMBA:
+    PACKED_KERNELS["numba"] = njit(cache=True, nogil=True)(_packed_step_loop)
+
+
+class PackedGrid:
+    # Torus grid with 1 bit per cell (2 colors) or 4 bits per cell (up to 16
+    # colors), 8x or 2x smaller than a uint8 grid. The ant steps on the packed
+    # bytes directly; unpack() expands the whole grid for rendering and
+    # window() just the rows of a region, for local observations.
+    def __init__(self, width, height, bits=1, data=None):
+        if bits not in BIT_DEPTHS:
+            raise ValueError(f"bits must be one of {BIT_DEPTHS}")
+        if width * bits % 8:
+            raise ValueError(f"width must be a multiple of {8 // bits} for {bits}-bit cells")
+        self.width = width
+        self.height = height
+        self.bits = bits
+        self.shape = (height, width)
+        # data may be an existing buffer, e.g. a memory-mapped snapshot
+        self.data = np.zeros(width * height * bits // 8, dtype=np.uint8) if data is None else data
+
+    @classmethod
+    def from_array(cls, grid, bits=None):
+        # Pack a (height, width) uint8 array, with the smallest depth that fits if bits is None
+        highest = int(grid.max()) if grid.size else 0
+        if bits is None:
+            bits = 1 if highest < 2 else 4
+        if highest >= 1 << bits:
+            raise ValueError(f"Color {highest} does not fit in {bits} bits")
+        packed = cls(grid.shape[1], grid.shape[0], bits)
+        packed.pack(grid)
+        return packed
+
+    @property
+    def colors(self):
+        return 1 << self.bits
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def _locate(self, x, y):
+        pos = (y % self.height) * self.width + x % self.width
+        per_byte = 8 // self.bits
+        return pos // per_byte, (pos % per_byte) * self.bits
+
+    def __getitem__(self, pos):
+        index, shift = self._locate(*pos)
+        return (int(self.data[index]) >> shift) & (self.colors - 1)
+
+    def __setitem__(self, pos, color):
+        index, shift = self._locate(*pos)
+        mask = (self.colors - 1) << shift
+        self.data[index] = (int(self.data[index]) & (255 ^ mask)) | (color << shift)
+
+    def flip(self, x, y):
+        # Toggle the lowest bit of a cell, which is the whole 2-color step
+        index, shift = self._locate(x, y)
+        self.data[index] ^= 1 << shift
+
+    def clear(self):
+        self.data.fill(0)
+
+    def pack(self, grid):
+        # Overwrite the packed cells from a (height, width) uint8 array
+        cells = np.ascontiguousarray(grid, dtype=np.uint8).reshape(-1)
+        if self.bits == 1:
+            self.data[:] = np.packbits(cells, bitorder="little")
+        else:
+            self.data[:] = cells[0::2] | (cells[1::2] << 4)
+
+    def unpack(self, out=None):
+        # (height, width) uint8 copy of the grid, written into `out` if given
+        if out is None:
+            out = np.empty(self.shape, dtype=np.uint8)
+        cells = out.reshape(-1)
+        if self.bits == 1:
+            cells[:] = np.unpackbits(self.data, bitorder="little")
+        else:
+            np.bitwise_and(self.data, 15, out=cells[0::2])
+            np.right_shift(self.data, 4, out=cells[1::2])
+        return out
+
+    def window(self, x0, y0, width, height, out=None):
+        # Dense (height, width) copy of the region starting at (x0, y0),
+        # wrapping around the torus. Only the bytes it covers are read.
+        if out is None:
+            out = np.empty((height, width), dtype=np.uint8)
+        bit = ((x0 + np.arange(width)) % self.width) * self.bits
+        rows = ((y0 + np.arange(height)) % self.height) * (self.width * self.bits // 8)
+        cells = self.data[rows[:, None] + (bit >> 3)]
+        np.bitwise_and(cells >> (bit & 7).astype(np.uint8), self.colors - 1, out=out)
+        return out
+
+    def repacked(self, bits):
+        # Copy of this grid with another cell depth
+        return PackedGrid.from_array(self.unpack(), bits)
+
+    def replace(self, old_color, new_color):
+        grid = self.unpack()
+        grid[grid == old_color] = new_color
+        self.pack(grid)
+
+    def run_steps(self, x, y, d, rule_table, turn_table, steps, headings=NO_TRACE, colors=NO_TRACE,
+                  backend=None):
+        # Same contract as ant_core.run_steps on this torus. Rules must not
+        # produce a color the cell depth cannot hold.
+        if int(rule_table.max()) >= self.colors:
+            raise ValueError(f"Rules use colors beyond the {self.colors} a {self.bits}-bit grid holds")
+        backend = DEFAULT_BACKEND if backend is None else backend
+        if backend not in PACKED_KERNELS:
+            raise ValueError(f"Unknown or unavailable backend {backend!r}, choose from {sorted(PACKED_KERNELS)}")
+        x, y, d, taken = PACKED_KERNELS[backend](self.data, self.width, self.height, self.bits, x, y, d,
+                                                 rule_table, turn_table, steps, headings, colors)
+        return int(x), int(y), int(d), int(taken)
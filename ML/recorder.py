@@ -0,0 +1,222 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import numpy as np
+from image_io import encode_png, make_palette
+
+try:
+    from PIL import Image
+    HAVE_PIL = True
+except ImportError:
+    HAVE_PIL = False
+
+# Constants
+RECORD_EVERY = 10_000  # Steps between recorded frames
+QUEUE_SIZE = 32  # Frames waiting for the encoder before the policy applies
+POLICIES = ("drop", "block")  # Skip frames the encoder cannot keep up with, or wait for it
+FORMATS = ("png", "gif", "raw")
+FPS = 30  # Playback rate of GIF and video output
+PNG_COMPRESSION = 1  # zlib level of recorded frames: ~8x faster than the default for ~20% larger files
+GIF_MAX_BYTES = 256 << 20  # Frames a GIF recording holds in memory until it is written
+RECORDINGS_DIR = "recordings"
+EXTENSIONS = {"png": "", "gif": ".gif", "raw": ".mp4"}  # Default outputs: a directory, a GIF, a video
+
+
+def _rgb(frame, palette):
+    return np.asarray(palette, dtype=np.uint8)[frame]
+
+
+class PngSequenceEncoder:
+    # One palette-indexed PNG per frame: frame_000000.png, frame_000001.png, ...
+    def __init__(self, directory, scale=1):
+        self.directory = directory
+        self.scale = scale
+        self.frames = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame, palette):
+        path = os.path.join(self.directory, f"frame_{self.frames:06d}.png")
+        with open(path, "wb") as file:
+            file.write(encode_png(frame, palette, self.scale, PNG_COMPRESSION))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+class GifEncoder:
+    # Animated GIF, encoded with Pillow. Pillow only writes a GIF's frames
+    # all at once, at close(), so they are held in memory until then: up to
+    # max_bytes of cells. Frames past the cap are skipped (write() returns
+    # False) and counted in `skipped`; use png or raw for long recordings.
+    def __init__(self, path, scale=1, fps=FPS, max_bytes=GIF_MAX_BYTES):
+        if not HAVE_PIL:
+            raise ImportError("GIF recording needs Pillow (pip install pillow); use png or raw instead")
+        self.path = path
+        self.scale = scale
+        self.duration = round(1000 / fps)
+        self.max_bytes = max_bytes
+        self.held_bytes = 0
+        self.skipped = 0
+        self.images = []
+
+    def write(self, frame, palette):
+        if self.scale > 1:
+            frame = frame.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        if self.held_bytes + frame.nbytes > self.max_bytes:
+            if not self.skipped:
+                print(f"GIF recording is holding {self.held_bytes:,} bytes of frames; skipping the rest")
+            self.skipped += 1
+            return False
+        self.held_bytes += frame.nbytes
+        image = Image.fromarray(frame, mode="P")
+        image.putpalette([channel for color in palette[:256] for channel in color[:3]])
+        self.images.append(image)
+
+    def close(self):
+        if self.images:
+            self.images[0].save(self.path, save_all=True, append_images=self.images[1:], duration=self.duration,
+                                loop=0)
+        self.images = []
+
+
+class RawVideoEncoder:
+    # Raw RGB24 frames, piped to a local encoder or written to a file. With
+    # the default command, ffmpeg turns them into `path` (any format it
+    # knows, e.g. .mp4); a path ending in .rgb gets the raw frames as they are.
+    def __init__(self, path, scale=1, fps=FPS, command=None):
+        if command is None and not path.endswith(".rgb") and shutil.which("ffmpeg") is None:
+            raise FileNotFoundError("Video recording needs ffmpeg on the PATH; use a .rgb path for raw frames")
+        self.path = path
+        self.scale = scale
+        self.fps = fps
+        self.command = command
+        self.output = None
+        self.process = None
+        self.size = None
+
+    def _open(self, width, height):
+        self.size = (width, height)
+        if self.path.endswith(".rgb"):
+            self.output = open(self.path, "wb")
+            return
+        command = self.command or ["ffmpeg", "-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                                   "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+                                   "-pix_fmt", "yuv420p", self.path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.output = self.process.stdin
+
+    def write(self, frame, palette):
+        if self.scale > 1:
+            frame = frame.repeat(self.scale, axis=0).repeat(self.scale, axis=1)
+        if self.output is None:
+            self._open(frame.shape[1], frame.shape[0])
+        elif (frame.shape[1], frame.shape[0]) != self.size:
+            raise ValueError("Video frames must all have the same size")
+        self.output.write(_rgb(frame, palette).tobytes())
+
+    def close(self):
+        if self.output is not None:
+            self.output.close()
+        if self.process is not None:
+            self.process.wait()
+        self.output = self.process = None
+
+
+def recording_path(fmt="png", prefix="run"):
+    # A new timestamped output under RECORDINGS_DIR
+    os.makedirs(RECORDINGS_DIR, exist_ok=True)
+    return os.path.join(RECORDINGS_DIR, f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}{EXTENSIONS[fmt]}")
+
+
+def make_encoder(path, fmt=None, scale=1, fps=FPS):
+    # Encoder for a directory of PNGs, a .gif or a video file, by format or extension
+    if fmt is None:
+        fmt = "gif" if path.endswith(".gif") else "png" if not os.path.splitext(path)[1] else "raw"
+    if fmt == "png":
+        return PngSequenceEncoder(path, scale)
+    if fmt == "gif":
+        return GifEncoder(path, scale, fps)
+    if fmt == "raw":
+        return RawVideoEncoder(path, scale, fps)
+    raise ValueError(f"Unknown recording format {fmt!r}, choose from {FORMATS}")
+
+
+class Recorder:
+    # Records a run as frames without slowing it down. The simulation calls
+    # advance() with the steps it took and, when a frame is due, capture()
+    # with the grid: capture copies the grid and queues it, and a background
+    # thread encodes it. Frames can only be taken between the caller's
+    # batches, so they land on the first batch boundary at or after every
+    # `every` steps. When the queue is full, the "drop" policy skips the
+    # frame (counted in `dropped`) and "block" waits for the encoder.
+    def __init__(self, encoder, every=RECORD_EVERY, queue_size=QUEUE_SIZE, policy="drop", palette=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, choose from {POLICIES}")
+        self.encoder = encoder
+        self.every = every
+        self.policy = policy
+        self.palette = palette
+        self.steps = 0
+        self.next_frame = 0
+        self.captured = 0
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def advance(self, steps):
+        # Count simulated steps; True when a frame is due
+        self.steps += steps
+        if self.steps < self.next_frame:
+            return False
+        self.next_frame = self.steps - self.steps % self.every + self.every
+        return True
+
+    def capture(self, grid, palette=None):
+        # Queue a copy of the grid. Returns False if the frame was dropped.
+        if self.error is not None:
+            raise RuntimeError("Recording failed") from self.error
+        item = (np.array(grid, dtype=np.uint8), list(palette or self.palette or []))
+        if self.policy == "block":
+            self.queue.put(item)
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.captured += 1
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is None:
+                frame, palette = item
+                # Random colors past the given palette, as in run_headless PNGs
+                palette = make_palette(max(int(frame.max(initial=0)) + 1, len(palette), 2), palette)
+                try:
+                    if self.encoder.write(frame, palette) is not False:
+                        self.written += 1
+                except Exception as error:  # Reported to the simulation by the next capture()
+                    self.error = error
+
+    def close(self):
+        # Encode every queued frame and finish the output
+        self.queue.put(None)
+        self.thread.join()
+        self.encoder.close()
+        if self.error is not None:
+            raise RuntimeError("Recording failed") from self.error
+
+    def stats(self):
+        return {"captured": self.captured, "written": self.written, "dropped": self.dropped,
+                "queued": self.queue.qsize(), "skipped": getattr(self.encoder, "skipped", 0)}
@@ -0,0 +1,156 @@
+import math
+import time
+import numpy as np
+import pygame
+
+# Constants
+FRAME_SAMPLES = 60  # Frames averaged by the frame-time overlay
+MIN_ZOOM = 1 / 64  # Screen pixels per cell
+MAX_ZOOM = 64
+
+
+class FrameTimer:
+    # Keeps the draw times of the last FRAME_SAMPLES frames for the overlay
+    def __init__(self):
+        self.frame_times = []
+
+    def record_frame(self, start):
+        self.frame_times.append(time.perf_counter() - start)
+        if len(self.frame_times) > FRAME_SAMPLES:
+            self.frame_times.pop(0)
+
+    def draw_frame_time(self, screen, font, clock, pos, color=(0, 0, 0)):
+        # Overlay the average grid draw time and the whole frame time from the clock
+        if not self.frame_times:
+            return
+        draw_ms = 1000 * sum(self.frame_times) / len(self.frame_times)
+        lines = [f"Grid draw: {draw_ms:.2f} ms",
+                 f"Frame: {clock.get_rawtime()} ms ({clock.get_fps():.0f} FPS)"]
+        x, y = pos
+        for line in lines:
+            screen.blit(font.render(line, True, color), (x, y))
+            y += font.get_linesize()
+
+
+def padded_palette(colors):
+    # 8-bit surfaces hold 256 palette entries
+    palette = list(colors)[:256]
+    return palette + [(0, 0, 0)] * (256 - len(palette))
+
+
+class GridRenderer(FrameTimer):
+    # Draws the grid by blitting a palette-indexed surface built straight from
+    # the NumPy grid (one surfarray copy and one scaled blit per frame) instead
+    # of one pygame.draw.rect call per cell.
+    def __init__(self, grid_width, grid_height, cell_size):
+        super().__init__()
+        self.cell_size = cell_size
+        self.surface = pygame.Surface((grid_width, grid_height), depth=8)
+        self.scaled = pygame.Surface((grid_width * cell_size, grid_height * cell_size), depth=8)
+        self.palette = None
+
+    def set_palette(self, colors):
+        # Only update the surfaces when the colors change
+        palette = list(colors)[:256]
+        if palette != self.palette:
+            self.palette = palette
+            padded = padded_palette(palette)
+            self.surface.set_palette(padded)
+            self.scaled.set_palette(padded)
+
+    def draw(self, screen, grid, colors, dest=(0, 0)):
+        start = time.perf_counter()
+        self.set_palette(colors)
+        # surfarray indexes surfaces as [x, y], the grid is [y, x]
+        pygame.surfarray.blit_array(self.surface, grid.T)
+        pygame.transform.scale(self.surface, self.scaled.get_size(), self.scaled)
+        screen.blit(self.scaled, dest)
+        self.record_frame(start)
+
+    def draw_cells(self, screen, grid, xs, ys, colors, dest=(0, 0)):
+        # Incremental redraw: repaint only the cells at xs, ys (e.g. from
+        # ant_core.trace_positions) on the scaled surface kept from the last
+        # frame, instead of copying and scaling the whole grid
+        start = time.perf_counter()
+        self.set_palette(colors)
+        size = self.cell_size
+        cells = np.unique(np.asarray(ys, dtype=np.int64) * grid.shape[1] + np.asarray(xs, dtype=np.int64))
+        for cell, color in zip(cells.tolist(), grid.reshape(-1)[cells].tolist()):
+            y, x = divmod(cell, grid.shape[1])
+            self.scaled.fill(color, (x * size, y * size, size, size))
+        screen.blit(self.scaled, dest)
+        self.record_frame(start)
+
+
+class Viewport(FrameTimer):
+    # Pan/zoom view of a grid inside a fixed (width, height) pixel area, drawn
+    # from a mip_pyramid.MipPyramid. Zoomed out, every screen pixel covers
+    # several cells, so the view is cut from the pyramid level whose blocks
+    # are closest to one pixel; zoomed in, from level 0. Either way a frame
+    # copies and scales about one view's worth of pixels, whatever the size
+    # of the board.
+    def __init__(self, width, height, grid_width, grid_height):
+        super().__init__()
+        self.width = width
+        self.height = height
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.fit()
+
+    def fit(self):
+        # Show the whole grid, centered
+        self.zoom = min(self.width / self.grid_width, self.height / self.grid_height)
+        self.center_x = self.grid_width / 2
+        self.center_y = self.grid_height / 2
+
+    def screen_to_cell(self, px, py):
+        # Cell coordinates (floats) under pixel (px, py) of the view
+        return (self.center_x + (px - self.width / 2) / self.zoom,
+                self.center_y + (py - self.height / 2) / self.zoom)
+
+    def pan(self, dx, dy):
+        # Move the view by (dx, dy) screen pixels
+        self.center_x -= dx / self.zoom
+        self.center_y -= dy / self.zoom
+
+    def zoom_by(self, factor, anchor=None):
+        # Zoom by `factor`, keeping the cell under the anchor pixel (default: the center) in place
+        if anchor is None:
+            anchor = (self.width / 2, self.height / 2)
+        cell_x, cell_y = self.screen_to_cell(*anchor)
+        self.zoom = min(MAX_ZOOM, max(MIN_ZOOM, self.zoom * factor))
+        self.center_x = cell_x - (anchor[0] - self.width / 2) / self.zoom
+        self.center_y = cell_y - (anchor[1] - self.height / 2) / self.zoom
+
+    def level(self, pyramid):
+        # Pyramid level drawn at the current zoom: blocks of 2^level cells, at least one pixel each
+        if self.zoom >= 1:
+            return 0
+        return min(pyramid.top, int(math.floor(math.log2(1 / self.zoom))))
+
+    def draw(self, screen, pyramid, colors, dest=(0, 0)):
+        start = time.perf_counter()
+        level = self.level(pyramid)
+        block = 1 << level
+        cells = pyramid.levels[level]
+        # Visible area in cells, then in blocks of this level, clipped to the grid
+        left, top = self.screen_to_cell(0, 0)
+        right, bottom = self.screen_to_cell(self.width, self.height)
+        x0, y0 = max(0, int(left // block)), max(0, int(top // block))
+        x1 = min(cells.shape[1], int(math.ceil(right / block)))
+        y1 = min(cells.shape[0], int(math.ceil(bottom / block)))
+        clip = screen.get_clip()
+        screen.set_clip(pygame.Rect(dest, (self.width, self.height)))
+        if x1 > x0 and y1 > y0:
+            surface = pygame.Surface((x1 - x0, y1 - y0), depth=8)
+            surface.set_palette(padded_palette(colors))
+            pygame.surfarray.blit_array(surface, cells[y0:y1, x0:x1].T)
+            # Pixel edges of the visible blocks, rounded so neighboring frames line up
+            px0 = round((x0 * block - left) * self.zoom)
+            py0 = round((y0 * block - top) * self.zoom)
+            px1 = round((x1 * block - left) * self.zoom)
+            py1 = round((y1 * block - top) * self.zoom)
+            scaled = pygame.transform.scale(surface, (max(1, px1 - px0), max(1, py1 - py0)))
+            screen.blit(scaled, (dest[0] + px0, dest[1] + py0))
+        screen.set_clip(clip)
+        self.record_frame(start)
@@ -0,0 +1,112 @@
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from results_store import canonical_turn_string
+
+# Constants
+RESULTS_FILE = "successful_rules.jsonl"
+FLUSH_RECORDS = 64  # Write the buffer once this many records are waiting
+FLUSH_INTERVAL = 5.0  # ...or once the oldest waiting record is this many seconds old
+
+
+def rules_record(rules, turns, steps, period=None, drift=None, source=None):
+    # One JSON-serializable record for a ruleset that formed a highway; rules
+    # and turns are listed by color
+    colors = sorted(rules)
+    return {"time": datetime.now().isoformat(timespec="seconds"), "source": source, "steps": int(steps),
+            "rules": [int(rules[color]) for color in colors], "turns": [int(turns[color]) for color in colors],
+            "period": None if period is None else int(period),
+            "drift": None if drift is None else [int(v) for v in drift]}
+
+
+def record_key(record):
+    # Identity of a record's ruleset: the canonical turn string (a ruleset
+    # and its L/R mirror are the same highway, reflected) for the usual
+    # single color cycle, the raw tables otherwise
+    rules, turns = record["rules"], record["turns"]
+    count = len(rules)
+    if all(rules[color] == (color + 1) % count for color in range(count)):
+        return canonical_turn_string("".join("R" if turn == 1 else "L" for turn in turns))
+    return json.dumps([rules, turns])
+
+
+class ResultsSink:
+    # Append-only JSON Lines log of successful rulesets. Records are buffered
+    # and written in one go when FLUSH_RECORDS are waiting, when the oldest
+    # is FLUSH_INTERVAL seconds old and at exit. The interval is kept by a
+    # daemon timer started with the first buffered record, so a lone record
+    # reaches the file even if no more are written. Each ruleset is logged
+    # once: write() skips one already in the file or the buffer and returns
+    # False. `count` is the number of distinct rulesets logged, so callers
+    # never need to re-read the file; existing lines are read once when the
+    # sink is opened.
+    def __init__(self, path=RESULTS_FILE, flush_records=FLUSH_RECORDS, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.oldest = None
+        self.timer = None
+        self.lock = threading.Lock()  # The timer flushes from its own thread
+        self.rulesets = {record_key(record) for record in read_results(path)}
+        self.count = len(self.rulesets)
+        atexit.register(self.flush)
+
+    def write(self, record):
+        key = record_key(record)
+        line = json.dumps(record)
+        with self.lock:
+            if key in self.rulesets:
+                return False
+            self.rulesets.add(key)
+            if not self.buffer:
+                self.oldest = time.monotonic()
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+            self.buffer.append(line)
+            self.count += 1
+            full = len(self.buffer) >= self.flush_records or time.monotonic() - self.oldest >= self.flush_interval
+        if full:
+            self.flush()
+        return True
+
+    def flush(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.buffer:
+                return
+            with open(self.path, "a") as file:
+                file.write("\n".join(self.buffer) + "\n")
+            self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def __len__(self):
+        return self.count
+
+
+def read_results(path=RESULTS_FILE):
+    # All records in a results log, oldest first
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+_default_sink = None
+
+
+def default_sink():
+    # Process-wide sink for RESULTS_FILE, shared by every environment that is not given its own
+    global _default_sink
+    if _default_sink is None:
+        _default_sink = ResultsSink()
+    return _default_sink
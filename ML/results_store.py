@@ -0,0 +1,74 @@
+import sqlite3
+
+# Constants
+DB_FILE = "rulesets.sqlite"
+
+
+def mirror_turn_string(turn_string):
+    return turn_string.translate(str.maketrans("LR", "RL"))
+
+
+def canonical_turn_string(turn_string):
+    # A ruleset and its L/R mirror behave the same up to a reflection, so both
+    # are stored under the lexicographically smaller of the two
+    turn_string = turn_string.upper()
+    return min(turn_string, mirror_turn_string(turn_string))
+
+
+class ResultsStore:
+    # Persistent outcome per canonical ruleset: "highway", "symmetric" or
+    # "chaotic", the steps simulated (or steps to the highway), and the highway
+    # period and drift. Drift is stored for the canonical orientation and
+    # mirrored on the way in and out for the other one (the mirror image of
+    # an ant that starts facing up flips the x axis).
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS rulesets ("
+            "canonical TEXT PRIMARY KEY, outcome TEXT NOT NULL, steps INTEGER NOT NULL, "
+            "period INTEGER, drift_x INTEGER, drift_y INTEGER)"
+        )
+        self.connection.commit()
+
+    def get(self, turn_string, min_steps=0):
+        # Known result for the ruleset, or None. A non-highway result only
+        # counts if it was simulated for at least min_steps.
+        canonical = canonical_turn_string(turn_string)
+        row = self.connection.execute(
+            "SELECT outcome, steps, period, drift_x, drift_y FROM rulesets WHERE canonical = ?",
+            (canonical,),
+        ).fetchone()
+        if row is None:
+            return None
+        outcome, steps, period, drift_x, drift_y = row
+        if outcome != "highway" and steps < min_steps:
+            return None
+        drift = None
+        if drift_x is not None:
+            drift = [drift_x if turn_string.upper() == canonical else -drift_x, drift_y]
+        return {"turns": turn_string, "outcome": outcome, "steps": steps, "period": period, "drift": drift}
+
+    def put(self, result):
+        # Store a result dict as produced by ruleset_search.simulate
+        turn_string = result["turns"].upper()
+        canonical = canonical_turn_string(turn_string)
+        drift_x = drift_y = None
+        if result.get("drift") is not None:
+            drift_x, drift_y = result["drift"]
+            if turn_string != canonical:
+                drift_x = -drift_x
+        self.connection.execute(
+            "INSERT OR REPLACE INTO rulesets VALUES (?, ?, ?, ?, ?, ?)",
+            (canonical, result["outcome"], result["steps"], result.get("period"), drift_x, drift_y),
+        )
+        self.connection.commit()
+
+    def __contains__(self, turn_string):
+        return self.get(turn_string) is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM rulesets").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,132 @@
+import argparse
+import itertools
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from ant_core import make_tables, rules_from_turn_string
+from highway import HighwayDetector
+from results_store import DB_FILE, ResultsStore, canonical_turn_string
+from snapshot import load_snapshot
+from sparse_grid import ChunkedGrid
+
+# Constants
+STEPS_BEFORE_CHECK = 50000  # Same budget per ruleset as ai_training.py
+MIN_LENGTH = 2
+MAX_LENGTH = 10
+BATCH_STEPS = 10000  # Steps between symmetry checks
+
+
+def all_turn_strings(max_length=MAX_LENGTH, min_length=MIN_LENGTH):
+    for length in range(min_length, max_length + 1):
+        for turns in itertools.product("LR", repeat=length):
+            yield "".join(turns)
+
+
+def sample_turn_strings(count, max_length=MAX_LENGTH, min_length=MIN_LENGTH, seed=None):
+    rng = random.Random(seed)
+    for _ in range(count):
+        length = rng.randint(min_length, max_length)
+        yield "".join(rng.choice("LR") for _ in range(length))
+
+
+def is_symmetric(grid):
+    # True if the painted area maps onto itself under a mirror or a rotation
+    ys, xs = np.nonzero(grid)
+    if len(xs) == 0:
+        return False
+    pattern = grid[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    candidates = [pattern[:, ::-1], pattern[::-1, :], pattern[::-1, ::-1]]
+    if pattern.shape[0] == pattern.shape[1]:
+        candidates += [pattern.T, pattern[::-1, ::-1].T, np.rot90(pattern), np.rot90(pattern, -1)]
+    return any(np.array_equal(pattern, candidate) for candidate in candidates)
+
+
+def simulate(turn_string, steps=STEPS_BEFORE_CHECK, snapshot=None):
+    # Run one ruleset headless on the unbounded grid and classify the result
+    # as "highway", "symmetric" or "chaotic". With a snapshot file of a sparse
+    # grid the run forks from its state (memory-mapped copy-on-write, so
+    # every worker shares the unchanged pages) instead of an empty grid.
+    rule_table, turn_table = make_tables(*rules_from_turn_string(turn_string))
+    x = y = d = 0
+    if snapshot is None:
+        grid = ChunkedGrid()
+    else:
+        header, grid = load_snapshot(snapshot)
+        if not isinstance(grid, ChunkedGrid):
+            raise ValueError(f"{snapshot} does not hold a sparse grid")
+        x, y, d = header["x"], header["y"], header["dir"]
+    detector = HighwayDetector()
+    headings = np.empty(BATCH_STEPS, dtype=np.uint8)
+    colors = np.empty(BATCH_STEPS, dtype=np.uint8)
+    done = 0
+    # Symmetric only if the pattern is symmetric at every check from a tenth
+    # of the budget through the end: one that was symmetric early on and
+    # then broke is chaotic. Checks stop at the first asymmetric one.
+    symmetric = None
+    while done < steps:
+        batch = min(BATCH_STEPS, steps - done)
+        x, y, d, taken = grid.run_steps(x, y, d, rule_table, turn_table, batch, headings, colors)
+        done += taken
+        highway = detector.extend(headings[:taken], colors[:taken])
+        if highway is not None:
+            return {"turns": turn_string, "outcome": "highway", "steps": highway.step,
+                    "period": highway.period, "drift": list(highway.drift)}
+        if symmetric is not False and done >= steps // 10:
+            x0, y0, x1, y1 = grid.bounds()
+            symmetric = is_symmetric(grid.window(x0, y0, x1 - x0, y1 - y0))
+    return {"turns": turn_string, "outcome": "symmetric" if symmetric else "chaotic", "steps": done,
+            "period": None, "drift": None}
+
+
+def search(turn_strings, steps=STEPS_BEFORE_CHECK, workers=None, store_path=DB_FILE, snapshot=None):
+    # Simulate each canonical ruleset that the results store does not know yet
+    # on a process pool and store every result as soon as it arrives, so a
+    # crashed run resumes where it stopped. Runs forked from a snapshot are
+    # neither looked up nor stored: the store's results start from an empty
+    # grid, and a non-empty start breaks the L/R mirror symmetry that
+    # canonical keys rely on.
+    store = ResultsStore(store_path) if snapshot is None else None
+    if store is None:
+        pending = list(dict.fromkeys(turns.upper() for turns in turn_strings))
+        print(f"{len(pending)} rulesets to simulate from {snapshot}")
+    else:
+        canonical = list(dict.fromkeys(canonical_turn_string(turns) for turns in turn_strings))
+        pending = [turns for turns in canonical if store.get(turns, min_steps=steps) is None]
+        print(f"{len(canonical) - len(pending)} rulesets already known, {len(pending)} to simulate")
+    counts = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(simulate, turns, steps, snapshot) for turns in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            if store is not None:
+                store.put(result)
+            counts[result["outcome"]] = counts.get(result["outcome"], 0) + 1
+            if result["outcome"] == "highway":
+                print(f"Highway: {result['turns']} after {result['steps']} steps, "
+                      f"period {result['period']}, drift {tuple(result['drift'])}")
+    if store is not None:
+        store.close()
+    print(f"Search finished: {counts}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search turn strings for highways on a process pool")
+    parser.add_argument("--max-length", type=int, default=MAX_LENGTH)
+    parser.add_argument("--sample", type=int, default=None, help="sample this many random turn strings instead of enumerating all")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--steps", type=int, default=STEPS_BEFORE_CHECK)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--store", default=DB_FILE, help="results store shared with ai_training.py")
+    parser.add_argument("--snapshot", default=None, help="fork every run from this sparse grid snapshot")
+    args = parser.parse_args()
+
+    if args.sample is None:
+        turn_strings = all_turn_strings(args.max_length)
+    else:
+        turn_strings = sample_turn_strings(args.sample, args.max_length, seed=args.seed)
+    search(turn_strings, args.steps, args.workers, args.store, args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
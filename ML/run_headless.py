@@ -0,0 +1,208 @@
+import argparse
+import json
+import time
+import numpy as np
+from ant_core import rules_from_turn_string
+from image_io import make_palette, write_png
+from langtons_ant import COLORS, GRID_BACKENDS, GRID_SIZE, LangtonsAnt
+from recorder import FORMATS, POLICIES, RECORD_EVERY, Recorder, make_encoder
+from snapshot import read_header
+
+# Constants
+STEPS = 1_000_000
+CHUNK_STEPS = 10_000_000  # Steps per core call between progress checks; macro runs take all steps at once
+PNG_SCALE = 1
+MAX_IMAGE_CELLS = 1 << 26  # Largest image written (8192 x 8192 cells, 64 MiB); crop with --png-size beyond
+
+
+def whole_grid(ant):
+    # The full torus, or the allocated region of an unbounded grid, as a dense uint8 array
+    if ant.grid_backend == "dense":
+        return ant.grid
+    if ant.grid_backend == "packed":
+        return ant.grid.unpack()
+    x0, y0, x1, y1 = ant.grid.bounds()
+    if x1 <= x0:
+        return np.zeros((1, 1), dtype=np.uint8)
+    return ant.grid.window(x0, y0, x1 - x0, y1 - y0)
+
+
+def image_grid(ant, size=0):
+    # The cells written to an image: the whole torus or allocated region of
+    # an unbounded grid, or with `size` the size x size window centered on
+    # the ant. The region is checked against MAX_IMAGE_CELLS before anything
+    # is allocated, as long unbounded runs cover far more than fits in memory.
+    if size:
+        if size * size > MAX_IMAGE_CELLS:
+            raise ValueError(f"A {size} x {size} image is over the {MAX_IMAGE_CELLS:,}-cell limit")
+        x0, y0 = ant.x - size // 2, ant.y - size // 2
+        if ant.grid_backend == "dense":
+            rows, cols = (y0 + np.arange(size)) % ant.grid_size, (x0 + np.arange(size)) % ant.grid_size
+            return ant.grid[np.ix_(rows, cols)]
+        return ant.grid.window(x0, y0, size, size)
+    if ant.grid_backend not in ("dense", "packed"):
+        x0, y0, x1, y1 = ant.grid.bounds()
+        if (x1 - x0) * (y1 - y0) > MAX_IMAGE_CELLS:
+            raise ValueError(f"The {x1 - x0} x {y1 - y0} region the ant covered is over the "
+                             f"{MAX_IMAGE_CELLS:,}-cell image limit; pick a window with --png-size")
+    return whole_grid(ant)
+
+
+def record_grid(ant, size=0):
+    # One recorded frame, the same size all run long: the torus, the
+    # grid_size x grid_size view of an unbounded grid around the origin, or
+    # with `size` a window that follows the ant
+    if size:
+        return image_grid(ant, size)
+    if ant.grid_backend in ("dense", "packed"):
+        return whole_grid(ant)
+    return ant.visible_grid()
+
+
+def image_palette(ant, grid):
+    # Enough colors for every rule and every color on the grid, which can
+    # outnumber the rules after one was removed
+    return make_palette(max(len(ant.rules), int(grid.max(initial=0)) + 1), COLORS)
+
+
+def run_stats(ant, elapsed, taken):
+    stats = {"rules": "".join("R" if ant.turns[color] == 1 else "L" for color in sorted(ant.turns)),
+             "backend": ant.grid_backend, "steps": int(ant.steps), "steps_this_run": int(taken),
+             "seconds": elapsed, "steps_per_sec": taken / elapsed if elapsed else 0.0,
+             "ant": [int(ant.x), int(ant.y), int(ant.dir)]}
+    if ant.grid_backend in ("dense", "packed"):
+        stats["grid_size"] = ant.grid_size
+        stats["grid_bytes"] = int(ant.grid.nbytes)
+        stats["color_counts"] = np.bincount(whole_grid(ant).ravel(), minlength=len(ant.rules)).tolist()
+    else:
+        stats["bounds"] = list(ant.grid.bounds())
+        stats["grid_bytes"] = int(ant.grid.nbytes)
+    if ant.grid_backend == "macro":
+        stats["macro"] = ant.grid.stats()
+    return stats
+
+
+def run(ant, steps, chunk_steps=CHUNK_STEPS, snapshot_every=0, snapshot_prefix="run", progress=False,
+        recorder=None, record_size=0):
+    # Step the ant `steps` times in large core calls, saving a snapshot every
+    # `snapshot_every` steps and handing record_grid(ant, record_size) to
+    # `recorder` (a recorder.Recorder) every `recorder.every` steps.
+    # Returns (steps taken, seconds).
+    taken = 0
+    start = time.perf_counter()
+    next_snapshot = ant.steps + snapshot_every if snapshot_every else None
+    if recorder is not None and recorder.advance(0):
+        recorder.capture(record_grid(ant, record_size), COLORS)
+    while taken < steps:
+        chunk = min(steps - taken, chunk_steps)
+        if next_snapshot is not None:
+            chunk = min(chunk, next_snapshot - ant.steps)
+        if recorder is not None:
+            chunk = min(chunk, recorder.next_frame - recorder.steps)
+        before = ant.steps
+        ant.step(chunk)
+        done = ant.steps - before
+        taken += done
+        if recorder is not None and recorder.advance(done):
+            recorder.capture(record_grid(ant, record_size), COLORS)
+        if next_snapshot is not None and ant.steps >= next_snapshot:
+            ant.save_snapshot(f"{snapshot_prefix}_{ant.steps:012d}.snap")
+            next_snapshot += snapshot_every
+        if progress:
+            elapsed = time.perf_counter() - start
+            print(f"{ant.steps:,} steps, {taken / elapsed:,.0f} steps/sec", flush=True)
+        if done < chunk:
+            print(f"Ant stopped after {ant.steps:,} steps: a color has no rule")
+            break
+    return taken, time.perf_counter() - start
+
+
+def add_ant_arguments(parser):
+    # Options shared by the scripts that run a LangtonsAnt, read back by ant_from_args
+    parser.add_argument("rules", nargs="?", default=None,
+                        help="turn string such as RL or RLR (default: the game's RLR, or the loaded snapshot's)")
+    parser.add_argument("--grid-size", type=int, default=GRID_SIZE, help="torus size for dense and packed grids")
+    parser.add_argument("--backend", choices=GRID_BACKENDS, default="dense",
+                        help="sparse and macro grids are unbounded")
+    parser.add_argument("--load", default=None, help="continue from this snapshot")
+
+
+def ant_from_args(args):
+    if args.load:
+        # The snapshot decides the backend and grid size
+        info = read_header(args.load)["grid"]
+        kind = info["kind"]
+        backend = info["backend"] if kind == "chunked" else kind
+        grid_size = info["shape"][0] if "shape" in info else args.grid_size
+        ant = LangtonsAnt(backend, grid_size)
+        ant.load_snapshot(args.load)
+        if args.rules:
+            ant.rules, ant.turns = rules_from_turn_string(args.rules)
+            ant.update_tables()
+        return ant
+    rules, turns = rules_from_turn_string(args.rules) if args.rules else (None, None)
+    return LangtonsAnt(args.backend, args.grid_size, rules, turns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Langton's ant without a display")
+    add_ant_arguments(parser)
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--chunk", type=int, default=CHUNK_STEPS, help="steps per core call")
+    parser.add_argument("--save", default=None, help="write a snapshot of the final state here")
+    parser.add_argument("--snapshot-every", type=int, default=0, help="also save a snapshot every N steps")
+    parser.add_argument("--snapshot-prefix", default="run", help="periodic snapshots go to PREFIX_<steps>.snap")
+    parser.add_argument("--png", default=None, help="write the final grid to this PNG file")
+    parser.add_argument("--png-size", type=int, default=0,
+                        help="write only a window of this many cells per side around the ant")
+    parser.add_argument("--scale", type=int, default=PNG_SCALE, help="PNG pixels per cell")
+    parser.add_argument("--record", default=None,
+                        help="record frames to this directory (PNGs), .gif (needs Pillow), .rgb (raw RGB24) "
+                             "or video file (needs ffmpeg)")
+    parser.add_argument("--record-every", type=int, default=RECORD_EVERY, help="steps between recorded frames")
+    parser.add_argument("--record-size", type=int, default=0,
+                        help="record a window of this many cells per side that follows the ant (default: the "
+                             "torus, or the --grid-size view around the origin of an unbounded grid)")
+    parser.add_argument("--record-format", choices=FORMATS, default=None, help="default: from the --record path")
+    parser.add_argument("--record-policy", choices=POLICIES, default="block",
+                        help="when the encoder falls behind, wait for it or drop frames")
+    parser.add_argument("--stats", default=None, help="write run statistics as JSON to this file, - for stdout")
+    parser.add_argument("--progress", action="store_true", help="print the rate after every chunk")
+    args = parser.parse_args()
+    if args.png_size * args.png_size > MAX_IMAGE_CELLS:
+        parser.error(f"--png-size {args.png_size} is over the {MAX_IMAGE_CELLS:,}-cell image limit")
+    if args.record_size * args.record_size > MAX_IMAGE_CELLS:
+        parser.error(f"--record-size {args.record_size} is over the {MAX_IMAGE_CELLS:,}-cell image limit")
+
+    ant = ant_from_args(args)
+    recorder = None
+    if args.record:
+        encoder = make_encoder(args.record, args.record_format, args.scale)
+        recorder = Recorder(encoder, args.record_every, policy=args.record_policy)
+
+    chunk = args.steps if ant.grid_backend == "macro" and not args.progress else args.chunk
+    taken, elapsed = run(ant, args.steps, chunk, args.snapshot_every, args.snapshot_prefix, args.progress, recorder,
+                         args.record_size)
+    print(f"{taken:,} steps in {elapsed:.3f} s ({taken / elapsed if elapsed else 0:,.0f} steps/sec)")
+    if recorder is not None:
+        recorder.close()
+        print(f"Recorded {recorder.written} frames to {args.record} ({recorder.dropped} dropped)")
+        if recorder.stats()["skipped"]:
+            print(f"Skipped {recorder.stats()['skipped']} frames over the GIF memory cap")
+
+    if args.save:
+        ant.save_snapshot(args.save)
+    if args.png:
+        grid = image_grid(ant, args.png_size)
+        write_png(args.png, grid, image_palette(ant, grid), args.scale)
+    if args.stats:
+        stats = json.dumps(run_stats(ant, elapsed, taken), indent=2)
+        if args.stats == "-":
+            print(stats)
+        else:
+            with open(args.stats, "w") as file:
+                file.write(stats + "\n")
+
+
+if __name__ == "__main__":
+    main()
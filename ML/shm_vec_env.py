@@ -0,0 +1,131 @@
+import multiprocessing as mp
+import numpy as np
+import gymnasium as gym
+from stable_baselines3.common.vec_env import VecEnv
+from ai_training import GRID_SIZE, OBS_MODE
+from observations import Observer
+from results_log import default_sink
+from shm_worker import create_shared, worker
+
+
+class SharedMemoryVecEnv(VecEnv):
+    # N LangtonsAntEnv copies in worker processes, like SB3's SubprocVecEnv,
+    # but with every grid and observation in multiprocessing.shared_memory:
+    # the pipes carry only actions, rewards, dones and infos, so the IPC cost
+    # of a step does not grow with the grid or observation size.
+    #
+    # Observations are double-buffered. step() and reset() return a view of
+    # one of two shared (num_envs, *obs_shape) buffers, alternating, so the
+    # array stays valid through the next step, the whole time SB3 keeps it as
+    # the previous observation, with no copy. `grids` are zero-copy views of
+    # the workers' dense grids, for viewers and debugging. Highways found in
+    # the workers are logged here, to `results_log`, so its count covers
+    # every environment.
+    #
+    # Workers start clean and re-import the launching script, so scripts
+    # should import this module inside main(), as ai_training does, to keep
+    # stable_baselines3 and torch out of the workers.
+    def __init__(self, num_envs, grid_backend="dense", obs_mode=OBS_MODE, results_store_path=None,
+                 start_method=None, results_log=None):
+        observation_space = Observer(obs_mode, grid_size=GRID_SIZE).space
+        action_space = gym.spaces.Discrete(2)  # 0: add rule, 1: remove rule
+        shape, dtype = observation_space.shape, observation_space.dtype
+        self._blocks = []
+        layout = {}
+        for key, key_shape, key_dtype in (("observations", (2, num_envs) + shape, dtype),
+                                          ("terminal", (num_envs,) + shape, dtype),
+                                          ("grids", (num_envs, GRID_SIZE, GRID_SIZE), np.uint8)):
+            if key == "grids" and grid_backend != "dense":
+                continue
+            block, array = create_shared(key_shape, key_dtype)
+            self._blocks.append(block)
+            setattr(self, "_" + key, array)
+            layout[key] = (block.name, key_shape, np.dtype(key_dtype).str)
+        self.grids = self._grids if grid_backend == "dense" else None
+        self.results_log = default_sink() if results_log is None else results_log
+        self.slot = 0
+        self.waiting = False
+        self.closed = False
+
+        # forkserver and spawn start clean processes, safe after torch has started its threads
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        context = mp.get_context(start_method)
+        env_kwargs = {"grid_backend": grid_backend, "obs_mode": obs_mode}
+        self.remotes, self.processes = [], []
+        for i in range(num_envs):
+            remote, work_remote = context.Pipe()
+            process = context.Process(target=worker, args=(work_remote, remote, i, layout, env_kwargs,
+                                                           results_store_path, self.results_log.rulesets),
+                                      daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        # Last, as it asks the workers for their render_mode
+        super().__init__(num_envs, observation_space, action_space)
+
+    def reset(self):
+        self.slot ^= 1
+        for i, remote in enumerate(self.remotes):
+            remote.send(("reset", (self.slot, self._seeds[i], self._options[i])))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        self._reset_seeds()
+        self._reset_options()
+        return self._observations[self.slot]
+
+    def step_async(self, actions):
+        self.slot ^= 1
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", (int(action), self.slot)))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        rewards = np.array([reward for reward, _, _ in results], dtype=np.float32)
+        dones = np.array([done for _, done, _ in results], dtype=bool)
+        infos = [info for _, _, info in results]
+        for info in infos:
+            for record in info.pop("results", ()):
+                self.results_log.write(record)
+        for i in np.flatnonzero(dones):
+            # The terminal buffer is reused by the next episode end, so infos get a copy
+            infos[i]["terminal_observation"] = self._terminal[i].copy()
+        return self._observations[self.slot], rewards, dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+        self._observations = self._terminal = self._grids = self.grids = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self.closed = True
+
+    def _call(self, command, data, indices):
+        remotes = [self.remotes[i] for i in self._get_indices(indices)]
+        for remote in remotes:
+            remote.send((command, data))
+        return [remote.recv() for remote in remotes]
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call("get_attr", attr_name, indices)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call("set_attr", (attr_name, value), indices)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call("env_method", (method_name, method_args, method_kwargs), indices)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
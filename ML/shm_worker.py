@@ -0,0 +1,116 @@
+from multiprocessing import shared_memory
+import numpy as np
+from ai_training import LangtonsAntEnv
+from results_log import record_key
+from results_store import ResultsStore
+
+# Worker side of shm_vec_env.SharedMemoryVecEnv. Kept apart from it so the
+# worker processes import the environment only, never stable_baselines3 and
+# torch.
+
+
+def create_shared(shape, dtype):
+    # A new shared memory block and a NumPy array over it
+    size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def attach_shared(name, shape, dtype):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+class ForwardingSink:
+    # Stands in for the environment's ResultsSink in a worker: new records
+    # are held until the next step reply carries them to the parent, which
+    # writes them to its own log, so highways found in any worker count
+    # there. Rulesets the parent had logged when it started, or that this
+    # worker has already forwarded, are skipped like ResultsSink skips them;
+    # one found by two workers at once is deduplicated by the parent's log.
+    def __init__(self, rulesets):
+        self.rulesets = set(rulesets)
+        self.records = []
+
+    def write(self, record):
+        key = record_key(record)
+        if key in self.rulesets:
+            return False
+        self.rulesets.add(key)
+        self.records.append(record)
+        return True
+
+    def take(self):
+        records, self.records = self.records, []
+        return records
+
+    def close(self):
+        pass
+
+    def __len__(self):
+        return len(self.rulesets)
+
+
+def worker(remote, parent_remote, index, layout, env_kwargs, results_store_path, logged_rulesets):
+    # Runs environment `index` of the batch. `layout` maps "observations"
+    # (2, num_envs, *obs_shape), "terminal" (num_envs, *obs_shape) and, for
+    # dense grids, "grids" (num_envs, GRID_SIZE, GRID_SIZE) to their (shared
+    # memory name, shape, dtype). Observations are written into the shared
+    # buffers; the pipe carries only commands, rewards, dones and infos, and
+    # the records of highways found, in info["results"], for the parent to
+    # log (`logged_rulesets` are the keys already in its log).
+    parent_remote.close()
+    blocks, arrays = [], {}
+    for key, (name, shape, dtype) in layout.items():
+        block, array = attach_shared(name, shape, dtype)
+        blocks.append(block)
+        arrays[key] = array
+    observations, terminal = arrays["observations"][:, index], arrays["terminal"][index]
+    grid = arrays["grids"][index] if "grids" in arrays else None
+    results_store = ResultsStore(results_store_path) if results_store_path else None
+    results_log = ForwardingSink(logged_rulesets)
+    env = LangtonsAntEnv(results_store=results_store, grid=grid, results_log=results_log, **env_kwargs)
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                action, slot = data
+                observation, reward, terminated, truncated, info = env.step(action)
+                # SB3 VecEnv convention: finished episodes restart at once
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                records = results_log.take()
+                if records:
+                    info["results"] = records
+                if done:
+                    terminal[...] = observation
+                    observation, _ = env.reset()
+                observations[slot] = observation
+                remote.send((float(reward), done, info))
+            elif command == "reset":
+                slot, seed, options = data
+                observation, info = env.reset(seed=seed, options=options)
+                observations[slot] = observation
+                remote.send(info)
+            elif command == "get_attr":
+                remote.send(getattr(env, data))
+            elif command == "set_attr":
+                setattr(env, *data)
+                remote.send(None)
+            elif command == "env_method":
+                name, args, kwargs = data
+                remote.send(getattr(env, name)(*args, **kwargs))
+            elif command == "close":
+                break
+            else:
+                raise ValueError(f"Unknown command {command!r}")
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if results_store is not None:
+            results_store.close()
+        # Drop the views before closing the blocks they point into
+        del observations, terminal, grid, arrays, env
+        for block in blocks:
+            block.close()
+        remote.close()
@@ -0,0 +1,168 @@
+import threading
+import time
+import numpy as np
+from ant_core import trace_positions
+
+# Constants
+TARGET_FPS = 60
+BATCH_FRACTION = 0.25  # Share of a frame a single batch may hold the ant for
+MIN_BATCH = 100
+MAX_BATCH = 10_000_000
+TRACE_STEPS = 1 << 20  # Most steps traced between two reads; past that readers diff the grid
+
+# Speed presets shown in the button bar: label -> steps per frame (None = as fast as possible)
+SPEED_PRESETS = {"1x": 100, "10x": 1000, "Max": None}
+
+
+class SimulationWorker(threading.Thread):
+    # Steps the ant on a background thread so the render loop only has to draw.
+    # Fixed presets are paced to a number of steps per target frame; the "Max"
+    # preset runs back to back, adapting the batch size so one batch stays
+    # around BATCH_FRACTION of a frame and the renderer never waits long for a
+    # snapshot. The renderer reads consistent copies of the grid via snapshot().
+    #
+    # On torus grids the worker also traces the cells the ant visits, so a
+    # reader can refresh only those (see read(..., positions=True)) instead
+    # of comparing the whole board every frame.
+    def __init__(self, ant, target_fps=TARGET_FPS):
+        super().__init__(daemon=True)
+        self.ant = ant
+        self.lock = threading.Lock()  # Held while the ant is stepped or edited
+        self.frame_time = 1 / target_fps
+        self.steps_per_frame = SPEED_PRESETS["1x"]
+        self.batch_size = MIN_BATCH
+        self.total_steps = 0
+        self._running = threading.Event()
+        self._stopped = threading.Event()
+        self._snapshot_requested = threading.Event()
+        self._snapshot_ready = threading.Event()
+        self._snapshot = None
+        self._reader = None
+        self._positions = False
+        # Cells visited since the last positions read, as (xs, ys) pairs of
+        # arrays; None when unknown (grid edits, untraced or long batches)
+        self._trace = None
+        self._traced_steps = 0
+        self._headings = np.empty(0, dtype=np.uint8)
+        self._colors = np.empty(0, dtype=np.uint8)
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start_simulation(self):
+        self._running.set()
+
+    def pause_simulation(self):
+        self._running.clear()
+
+    def set_speed(self, steps_per_frame):
+        self.steps_per_frame = steps_per_frame
+
+    def stop(self):
+        self._stopped.set()
+        self._running.set()  # Wake the loop so it can exit
+        self.join()
+
+    def invalidate(self):
+        # Cells changed outside the simulation (rule edits, reset, loading a
+        # snapshot): the next positions read gets None. Call with the lock held.
+        self._trace = None
+
+    def read(self, reader, positions=False):
+        # reader(grid) called between two batches, never mid-batch, and its
+        # result. The grid is the live one, so a reader that only needs part
+        # of it can skip copying the rest. With `positions`, the reader is
+        # called as reader(grid, xs, ys) with the cells the ant visited since
+        # the last such read, or None, None if they are not known, which
+        # suits MipPyramid.update.
+        if self.running:
+            self._reader = reader
+            self._positions = positions
+            self._snapshot_ready.clear()
+            self._snapshot_requested.set()
+            if self._snapshot_ready.wait(timeout=self.frame_time):
+                return self._snapshot
+        with self.lock:
+            # Withdraw a request the simulation thread has not served yet
+            self._snapshot_requested.clear()
+            return self._call_reader(reader, positions)
+
+    def snapshot(self):
+        # Copy of the grid taken between two batches
+        return self.read(lambda grid: grid.copy())
+
+    def _take_snapshot(self):
+        with self.lock:
+            if not self._snapshot_requested.is_set():
+                return
+            self._snapshot_requested.clear()
+            self._snapshot = self._call_reader(self._reader, self._positions)
+        self._snapshot_ready.set()
+
+    def _call_reader(self, reader, positions):
+        # With the lock held
+        if not positions:
+            return reader(self.ant.visible_grid())
+        trace = self._trace
+        self._trace, self._traced_steps = [], 0
+        if trace is None:
+            return reader(self.ant.visible_grid(), None, None)
+        if not trace:
+            return reader(self.ant.visible_grid(), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        xs, ys = zip(*trace)
+        return reader(self.ant.visible_grid(), np.concatenate(xs), np.concatenate(ys))
+
+    def _step(self, steps):
+        # One batch, with the lock held, tracing the visited cells on a torus.
+        # Returns the steps taken, fewer than `steps` once the ant is stuck.
+        ant = self.ant
+        if self._trace is None or ant.grid_backend not in ("dense", "packed") \
+                or self._traced_steps + steps > TRACE_STEPS:
+            self._trace = None
+            return ant.step(steps)
+        if len(self._headings) < steps:
+            self._headings = np.empty(steps, dtype=np.uint8)
+            self._colors = np.empty(steps, dtype=np.uint8)
+        x0, y0 = ant.x, ant.y
+        taken = ant.step(steps, self._headings, self._colors)
+        xs, ys = trace_positions(x0, y0, self._headings[:taken], ant.grid_size, ant.grid_size)
+        # The start cell is recolored by the first step
+        self._trace.append((np.array([x0]), np.array([y0])))
+        self._trace.append((xs, ys))
+        self._traced_steps += taken
+        return taken
+
+    def run(self):
+        next_frame = time.perf_counter()
+        while not self._stopped.is_set():
+            if not self._running.wait(timeout=0.1):
+                continue
+            if self._stopped.is_set():
+                break
+            if self._snapshot_requested.is_set():
+                self._take_snapshot()
+
+            steps_per_frame = self.steps_per_frame
+            steps = self.batch_size if steps_per_frame is None else steps_per_frame
+            start = time.perf_counter()
+            with self.lock:
+                taken = self._step(steps)
+            now = time.perf_counter()
+            self.total_steps += taken
+
+            if steps_per_frame is None and taken:
+                # Grow or shrink the batch (at most 2x per batch) towards the frame share
+                target = steps * self.frame_time * BATCH_FRACTION / max(now - start, 1e-6)
+                self.batch_size = int(min(MAX_BATCH, max(MIN_BATCH, steps / 2, min(target, steps * 2))))
+                next_frame = now
+            else:
+                # Pace fixed presets, and an ant stuck on a color without a rule, to one batch per target frame
+                next_frame = max(next_frame + self.frame_time, now - self.frame_time)
+                while True:
+                    delay = next_frame - time.perf_counter()
+                    if delay <= 0:
+                        break
+                    # Serve snapshot requests while waiting for the next frame
+                    if self._snapshot_requested.wait(timeout=delay):
+                        self._take_snapshot()
@@ -0,0 +1,103 @@
+import json
+import struct
+import numpy as np
+from macro_step import MacroGrid
+from packed_grid import PackedGrid
+from sparse_grid import ChunkedGrid
+
+# Constants
+MAGIC = b"ANTSNAP1"
+VERSION = 1
+ALIGNMENT = 64  # Grid data starts on a multiple of this many bytes, so memmaps map whole cache lines
+SNAPSHOT_FILE = "langtons_ant.snap"
+
+# Layout: MAGIC, little-endian uint32 header length, UTF-8 JSON header, zero
+# padding up to ALIGNMENT, then the raw uint8 grid data at header["offset"]:
+#   "dense":   one (height, width) array
+#   "packed":  the PackedGrid bytes, header["bits"] per cell
+#   "chunked": header["tiles"] (tx, ty) entries followed by one
+#              (tile_size, tile_size) array per tile, in the same order
+
+
+def _grid_header(grid):
+    # Grid description for the header, and the tiles to write after it
+    if isinstance(grid, np.ndarray):
+        return {"kind": "dense", "shape": list(grid.shape)}, [grid]
+    if isinstance(grid, PackedGrid):
+        return {"kind": "packed", "shape": list(grid.shape), "bits": grid.bits}, [grid.data]
+    if isinstance(grid, ChunkedGrid):
+        keys = list(grid.chunks)
+        return ({"kind": "chunked", "backend": "sparse", "tile_size": grid.chunk_size, "tiles": keys},
+                [grid.chunks[key] for key in keys])
+    if isinstance(grid, MacroGrid):
+        tiles = list(grid.tiles())
+        return ({"kind": "chunked", "backend": "macro", "tile_size": grid.leaf_size,
+                 "tiles": [key for key, _ in tiles]}, [tile for _, tile in tiles])
+    raise TypeError(f"Cannot snapshot a grid of type {type(grid).__name__}")
+
+
+def save_snapshot(path, grid, x, y, d, rules, turns, steps, extra=None):
+    # Write the ant state and its grid (a NumPy array, PackedGrid, ChunkedGrid or MacroGrid)
+    grid_header, arrays = _grid_header(grid)
+    header = {"version": VERSION, "x": int(x), "y": int(y), "dir": int(d), "steps": int(steps),
+              "rules": {str(color): int(next_color) for color, next_color in rules.items()},
+              "turns": {str(color): int(turn) for color, turn in turns.items()},
+              "grid": grid_header, "extra": extra or {}}
+    # The offset is part of the header, so size the header with a placeholder first
+    header["offset"] = 0
+    prefix = len(MAGIC) + 4
+    encoded = json.dumps(header).encode()
+    offset = -(-(prefix + len(encoded) + 16) // ALIGNMENT) * ALIGNMENT
+    header["offset"] = offset
+    encoded = json.dumps(header).encode()
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<I", len(encoded)))
+        file.write(encoded)
+        file.write(bytes(offset - prefix - len(encoded)))
+        for array in arrays:
+            file.write(np.ascontiguousarray(array, dtype=np.uint8).tobytes())
+
+
+def read_header(path):
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a snapshot file")
+        (length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(length))
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported snapshot version {header['version']}")
+    header["rules"] = {int(color): next_color for color, next_color in header["rules"].items()}
+    header["turns"] = {int(color): turn for color, turn in header["turns"].items()}
+    return header
+
+
+def load_snapshot(path, mode="c"):
+    # Returns (header, grid). The grid data is memory-mapped, not read: mode
+    # "c" (copy-on-write) gives a writable grid whose untouched pages stay
+    # shared with the file and with every other process that mapped it, so
+    # many runs can fork from one warm-up snapshot; "r" maps it read-only and
+    # "r+" writes changes back to the file. A macro grid is rebuilt from its
+    # tiles, which copies them into the tree.
+    header = read_header(path)
+    info = header["grid"]
+    if info["kind"] == "dense":
+        grid = np.memmap(path, dtype=np.uint8, mode=mode, offset=header["offset"], shape=tuple(info["shape"]))
+        return header, grid
+    if info["kind"] == "packed":
+        height, width = info["shape"]
+        data = np.memmap(path, dtype=np.uint8, mode=mode, offset=header["offset"],
+                         shape=(width * height * info["bits"] // 8,))
+        return header, PackedGrid(width, height, info["bits"], data=data)
+    size = info["tile_size"]
+    keys = [tuple(key) for key in info["tiles"]]
+    tiles = np.memmap(path, dtype=np.uint8, mode=mode, offset=header["offset"],
+                      shape=(len(keys), size, size)) if keys else np.zeros((0, size, size), dtype=np.uint8)
+    if info["backend"] == "macro":
+        grid = MacroGrid(leaf_size=size)
+        for key, tile in zip(keys, tiles):
+            grid.set_tile(key[0], key[1], tile)
+        return header, grid
+    grid = ChunkedGrid(chunk_size=size)
+    grid.chunks.update(zip(keys, tiles))
+    return header, grid
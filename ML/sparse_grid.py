@@ -0,0 +1,104 @@
+import numpy as np
+from ant_core import NO_TRACE, get_kernel
+
+# Constants
+CHUNK_SIZE = 64
+
+
+class ChunkedGrid:
+    # Unbounded grid stored as CHUNK_SIZE x CHUNK_SIZE uint8 tiles in a dict
+    # keyed by chunk coordinates. Tiles are only allocated where the ant has
+    # been, so memory follows the visited area instead of the bounding box.
+    # Missing tiles read as color 0.
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = {}
+        # Most lookups hit the chunk the ant is already in
+        self._cached_key = None
+        self._cached_chunk = None
+
+    def chunk(self, cx, cy):
+        # Get the tile at chunk coordinates (cx, cy), allocating it if needed
+        key = (cx, cy)
+        if key == self._cached_key:
+            return self._cached_chunk
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = np.zeros((self.chunk_size, self.chunk_size), dtype=np.uint8)
+            self.chunks[key] = chunk
+        self._cached_key, self._cached_chunk = key, chunk
+        return chunk
+
+    def __getitem__(self, pos):
+        x, y = pos
+        size = self.chunk_size
+        chunk = self.chunks.get((x // size, y // size))
+        return 0 if chunk is None else int(chunk[y % size, x % size])
+
+    def __setitem__(self, pos, color):
+        x, y = pos
+        size = self.chunk_size
+        self.chunk(x // size, y // size)[y % size, x % size] = color
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def clear(self):
+        self.chunks.clear()
+        self._cached_key = self._cached_chunk = None
+
+    def replace(self, old_color, new_color):
+        for chunk in self.chunks.values():
+            chunk[chunk == old_color] = new_color
+
+    def bounds(self):
+        # (x0, y0, x1, y1) cell bounds of the allocated tiles, end exclusive
+        if not self.chunks:
+            return 0, 0, 0, 0
+        size = self.chunk_size
+        cxs = [cx for cx, _ in self.chunks]
+        cys = [cy for _, cy in self.chunks]
+        return min(cxs) * size, min(cys) * size, (max(cxs) + 1) * size, (max(cys) + 1) * size
+
+    def window(self, x0, y0, width, height, out=None):
+        # Dense (height, width) copy of the region starting at (x0, y0)
+        if out is None:
+            out = np.zeros((height, width), dtype=np.uint8)
+        else:
+            out.fill(0)
+        size = self.chunk_size
+        for cy in range(y0 // size, (y0 + height - 1) // size + 1):
+            for cx in range(x0 // size, (x0 + width - 1) // size + 1):
+                chunk = self.chunks.get((cx, cy))
+                if chunk is None:
+                    continue
+                # Overlap of this chunk with the window, in plane coordinates
+                left, top = max(x0, cx * size), max(y0, cy * size)
+                right, bottom = min(x0 + width, (cx + 1) * size), min(y0 + height, (cy + 1) * size)
+                out[top - y0:bottom - y0, left - x0:right - x0] = \
+                    chunk[top - cy * size:bottom - cy * size, left - cx * size:right - cx * size]
+        return out
+
+    def run_steps(self, x, y, d, rule_table, turn_table, steps, headings=NO_TRACE, colors=NO_TRACE,
+                  backend=None):
+        # Same contract as ant_core.run_steps, on the unbounded plane. The
+        # kernel runs inside one chunk until the ant walks out of it, so the
+        # dict is only consulted when the ant crosses a chunk border.
+        kernel = get_kernel(backend)
+        size = self.chunk_size
+        record = len(headings) >= steps and len(colors) >= steps
+        taken = 0
+        while taken < steps:
+            cx, cy = x // size, y // size
+            chunk = self.chunk(cx, cy)
+            trace_headings = headings[taken:] if record else NO_TRACE
+            trace_colors = colors[taken:] if record else NO_TRACE
+            local_x, local_y, d, n = kernel(chunk.reshape(-1), size, size, x - cx * size, y - cy * size, d,
+                                            rule_table, turn_table, steps - taken,
+                                            trace_headings, trace_colors, False)
+            x, y, d = cx * size + int(local_x), cy * size + int(local_y), int(d)
+            taken += int(n)
+            if 0 <= local_x < size and 0 <= local_y < size:
+                break  # Still inside the chunk, so either done or stuck on a color without a rule
+        return x, y, d, taken
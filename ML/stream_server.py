@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import struct
+import time
+import zlib
+import numpy as np
+from image_io import make_palette
+from langtons_ant import COLORS
+from run_headless import add_ant_arguments, ant_from_args
+
+# Constants
+HOST = "127.0.0.1"
+PORT = 8765
+TICK_RATE = 30  # Simulation ticks per second, one delta message each
+STEPS_PER_TICK = 10_000  # 300,000 steps/sec: a 10^7-step run plays in about half a minute
+KEYFRAME_EVERY = 150  # Ticks between keyframes, the catch-up point for new and lagging clients
+LOG_SIZE = 300  # Deltas kept for clients that fell behind; at least KEYFRAME_EVERY
+CLIENT_FPS = 30  # Most messages per second sent to one client; extra deltas are batched
+CLIENT_BYTES_PER_SEC = 2_000_000  # Bandwidth allowed per client
+KEYFRAME_COMPRESSION = 6  # zlib level of keyframe cells
+
+# Binary protocol, little-endian. Every message starts with HEADER:
+#   type (u8), sequence number (u32), total steps (u64), ant x and y in view
+#   cells (i32, i32)
+# MSG_KEYFRAME: KEYFRAME_INFO (width u32, height u32, palette colors u16), the
+#   palette as RGB bytes, then the height x width cells as zlib-compressed
+#   bytes, row by row. The view is the state after delta `sequence number`.
+# MSG_DELTA: DELTA_INFO (changed cells u32), the changed cell indices
+#   (y * width + x) as u32, then their new colors as u8. Applies on top of
+#   the message with the previous sequence number.
+MSG_KEYFRAME = 0
+MSG_DELTA = 1
+HEADER = struct.Struct("<BIQii")
+KEYFRAME_INFO = struct.Struct("<IIH")
+DELTA_INFO = struct.Struct("<I")
+
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+MAX_CLIENT_FRAME = 1 << 16  # Viewers send nothing but control frames
+
+
+def encode_frame(payload, opcode=OP_BINARY):
+    # One unmasked, unfragmented WebSocket frame, as a server sends them
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_frame(reader):
+    # (opcode, payload) of the next frame from a client, unmasked
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", await reader.readexactly(8))[0]
+    if length > MAX_CLIENT_FRAME:
+        raise ValueError("Client frame too large")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask is not None:
+        payload = (np.frombuffer(payload, dtype=np.uint8) ^ np.resize(np.frombuffer(mask, dtype=np.uint8),
+                                                                     length)).tobytes()
+    return first & 0x0F, payload
+
+
+class DeltaLog:
+    # Encoded messages shared by every client: each is built once per tick,
+    # whatever the number of viewers. Holds the last LOG_SIZE deltas and the
+    # latest keyframe.
+    def __init__(self, size=LOG_SIZE):
+        self.deltas = collections.deque(maxlen=size)  # (sequence number, frame bytes)
+        self.keyframe = None  # (sequence number, frame bytes)
+        self.seq = 0
+        self.changed = asyncio.Condition()
+
+    async def publish(self, seq, delta, keyframe=None):
+        async with self.changed:
+            if delta is not None:
+                self.deltas.append((seq, delta))
+            if keyframe is not None:
+                self.keyframe = (seq, keyframe)
+            self.seq = seq
+            self.changed.notify_all()
+
+    def since(self, seq):
+        # Frames of the deltas after `seq`, or None once they have left the log
+        if seq >= self.seq:
+            return []
+        if not self.deltas or self.deltas[0][0] > seq + 1:
+            return None
+        start = seq + 1 - self.deltas[0][0]
+        return [frame for _, frame in list(self.deltas)[start:]]
+
+
+class StreamSimulation:
+    # Steps one LangtonsAnt and turns each tick into a delta message: the
+    # cells of the view (the grid_size x grid_size area the game draws) that
+    # differ from the previous tick, found by comparing against a shadow
+    # copy. Message size follows the cells changed, not the board.
+    def __init__(self, ant, steps_per_tick=STEPS_PER_TICK, keyframe_every=KEYFRAME_EVERY, max_steps=0):
+        self.ant = ant
+        self.steps_per_tick = steps_per_tick
+        self.keyframe_every = keyframe_every
+        self.max_steps = max_steps
+        self.shadow = ant.visible_grid().copy()
+        self.seq = 0
+        self.stopped = False
+        self.sim_seconds = 0.0
+
+    def _header(self, kind):
+        # Unbounded grids draw the origin in the center of the view
+        offset = 0 if self.ant.grid_backend in ("dense", "packed") else self.ant.grid_size // 2
+        x, y = (min(max(v + offset, -2 ** 31), 2 ** 31 - 1) for v in (self.ant.x, self.ant.y))
+        return HEADER.pack(kind, self.seq, self.ant.steps, x, y)
+
+    def keyframe(self):
+        height, width = self.shadow.shape
+        palette = make_palette(max(len(self.ant.rules), int(self.shadow.max(initial=0)) + 1), COLORS)
+        cells = zlib.compress(self.shadow.tobytes(), KEYFRAME_COMPRESSION)
+        return encode_frame(self._header(MSG_KEYFRAME) + KEYFRAME_INFO.pack(width, height, len(palette))
+                            + bytes(channel for color in palette for channel in color[:3]) + cells)
+
+    def tick(self):
+        # Advance one tick. Returns (delta frame, keyframe frame or None), or
+        # None once the ant has stopped or reached max_steps.
+        if self.stopped:
+            return None
+        steps = self.steps_per_tick
+        if self.max_steps:
+            steps = min(steps, self.max_steps - self.ant.steps)
+        start = time.perf_counter()
+        before = self.ant.steps
+        self.ant.step(steps)
+        if self.ant.steps - before < steps or (self.max_steps and self.ant.steps >= self.max_steps):
+            self.stopped = True  # A color without a rule, or the requested length reached
+        view = self.ant.visible_grid().reshape(-1)
+        shadow = self.shadow.reshape(-1)
+        changed = np.flatnonzero(view != shadow)
+        colors = view[changed]
+        shadow[changed] = colors
+        self.seq += 1
+        delta = encode_frame(self._header(MSG_DELTA) + DELTA_INFO.pack(len(changed))
+                             + changed.astype("<u4").tobytes() + colors.tobytes())
+        keyframe = self.keyframe() if self.seq % self.keyframe_every == 0 or self.stopped else None
+        self.sim_seconds += time.perf_counter() - start
+        return delta, keyframe
+
+
+class StreamServer:
+    # Serves one StreamSimulation to any number of WebSocket viewers. New
+    # viewers get the latest keyframe and then every delta after it. Each
+    # viewer is limited to client_fps messages and client_bytes_per_sec: the
+    # deltas that pile up meanwhile go out together, and a viewer that falls
+    # further behind than the log, or whose backlog outweighs a keyframe,
+    # skips ahead to the latest keyframe. A plain HTTP GET returns the stats
+    # as JSON.
+    def __init__(self, simulation, tick_rate=TICK_RATE, client_fps=CLIENT_FPS,
+                 client_bytes_per_sec=CLIENT_BYTES_PER_SEC, log_size=LOG_SIZE):
+        if log_size < simulation.keyframe_every:
+            raise ValueError("log_size must cover at least keyframe_every ticks")
+        self.simulation = simulation
+        self.tick_rate = tick_rate
+        self.client_fps = client_fps
+        self.client_bytes_per_sec = client_bytes_per_sec
+        self.log = DeltaLog(log_size)
+        self.clients = 0
+        self.bytes_sent = 0
+        self.keyframes_sent = 0
+        self.started = time.perf_counter()
+
+    async def simulate(self):
+        loop = asyncio.get_running_loop()
+        await self.log.publish(0, None, self.simulation.keyframe())
+        next_tick = time.perf_counter()
+        while True:
+            # The Numba core releases the GIL, so clients are served while it runs
+            result = await loop.run_in_executor(None, self.simulation.tick)
+            if result is None:
+                return
+            await self.log.publish(self.simulation.seq, *result)
+            next_tick += 1 / self.tick_rate
+            await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+            next_tick = max(next_tick, time.perf_counter() - 1 / self.tick_rate)
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        simulation = self.simulation
+        return {"steps": int(simulation.ant.steps), "seq": simulation.seq, "clients": self.clients,
+                "bytes_sent": self.bytes_sent, "keyframes_sent": self.keyframes_sent,
+                "steps_per_sec": simulation.ant.steps / elapsed if elapsed else 0.0,
+                "sim_load": simulation.sim_seconds / elapsed if elapsed else 0.0,
+                "stopped": simulation.stopped}
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            headers = {}
+            for line in request.decode("latin-1").split("\r\n")[1:]:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            key = headers.get("sec-websocket-key")
+            if headers.get("upgrade", "").lower() != "websocket" or key is None:
+                body = json.dumps(self.stats()).encode()
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Access-Control-Allow-Origin: *\r\nConnection: close\r\n"
+                             + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+                await writer.drain()
+                return
+            accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest()).decode()
+            writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+            await writer.drain()
+            self.clients += 1
+            try:
+                await self._serve_client(reader, writer)
+            finally:
+                self.clients -= 1
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_client(self, reader, writer):
+        closed = asyncio.Event()
+
+        async def read_control():
+            # Answer pings and notice closes; anything else a viewer sends is ignored
+            try:
+                while True:
+                    opcode, payload = await read_frame(reader)
+                    if opcode == OP_PING:
+                        writer.write(encode_frame(payload, OP_PONG))
+                    elif opcode == OP_CLOSE:
+                        writer.write(encode_frame(payload[:2], OP_CLOSE))
+                        return
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                return
+            finally:
+                closed.set()
+                async with self.log.changed:
+                    self.log.changed.notify_all()
+
+        control = asyncio.create_task(read_control())
+        seq = None
+        tokens = float(self.client_bytes_per_sec)
+        last_send = time.perf_counter()
+        try:
+            while not closed.is_set():
+                async with self.log.changed:
+                    await self.log.changed.wait_for(lambda: closed.is_set() or self.log.keyframe is not None
+                                                    and (seq is None or self.log.seq > seq))
+                if closed.is_set():
+                    return
+                frames = None if seq is None else self.log.since(seq)
+                keyframe_seq, keyframe = self.log.keyframe
+                if frames is None or sum(map(len, frames)) > len(keyframe):
+                    # Start, or catch up, from the latest keyframe and the deltas after it
+                    seq = keyframe_seq
+                    frames = [keyframe] + (self.log.since(seq) or [])
+                    self.keyframes_sent += 1
+                seq = self.log.seq
+                size = sum(map(len, frames))
+                writer.write(b"".join(frames))
+                await writer.drain()
+                self.bytes_sent += size
+                # Token bucket: pay for what was sent, then wait for the fps and bandwidth limits
+                now = time.perf_counter()
+                tokens = min(tokens + (now - last_send) * self.client_bytes_per_sec, self.client_bytes_per_sec)
+                tokens -= size
+                last_send = now
+                delay = max(1 / self.client_fps, -tokens / self.client_bytes_per_sec)
+                await asyncio.sleep(delay)
+        finally:
+            control.cancel()
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Streaming on ws://{host}:{port}, stats at http://{host}:{port}", flush=True)
+        async with server:
+            await self.simulate()
+            print(f"Simulation stopped after {self.simulation.ant.steps:,} steps; still serving the final view",
+                  flush=True)
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a Langton's ant run to browsers over WebSocket")
+    add_ant_arguments(parser)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--steps", type=int, default=0, help="stop after this many steps, 0 to run on")
+    parser.add_argument("--steps-per-tick", type=int, default=STEPS_PER_TICK)
+    parser.add_argument("--tick-rate", type=float, default=TICK_RATE, help="ticks per second")
+    parser.add_argument("--keyframe-every", type=int, default=KEYFRAME_EVERY, help="ticks between keyframes")
+    parser.add_argument("--client-fps", type=float, default=CLIENT_FPS, help="messages per second per viewer")
+    parser.add_argument("--client-bytes-per-sec", type=int, default=CLIENT_BYTES_PER_SEC)
+    args = parser.parse_args()
+
+    simulation = StreamSimulation(ant_from_args(args), args.steps_per_tick, args.keyframe_every, args.steps)
+    server = StreamServer(simulation, args.tick_rate, args.client_fps, args.client_bytes_per_sec,
+                          max(LOG_SIZE, 2 * args.keyframe_every))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import numpy as np
+from ant_core import make_tables, rules_from_turn_string
+from macro_step import MacroGrid
+from sparse_grid import ChunkedGrid
+
+
+def test_memory_budget_holds_inside_the_root():
+    # RLR grows a chaotic blob that stays inside the root for long walks
+    rule_table, turn_table = make_tables(*rules_from_turn_string("RLR"))
+    budget = 1 << 20
+    macro, sparse = MacroGrid(memory_budget=budget), ChunkedGrid()
+    peak = [0]
+    intern = macro._intern
+
+    def tracked_intern(key):
+        node = intern(key)
+        peak[0] = max(peak[0], macro.nbytes)
+        return node
+
+    macro._intern = tracked_intern  # Checked after every node, not only between calls
+    state = sparse_state = (0, 0, 0)
+    for _ in range(20):
+        *state, taken = macro.run_steps(*state, rule_table, turn_table, 50000)
+        *sparse_state, _ = sparse.run_steps(*sparse_state, rule_table, turn_table, 50000)
+        assert taken == 50000
+    assert peak[0] <= budget
+    assert macro.compactions and macro.cache
+    # Walks stopped mid-root for compaction still give the same grid
+    assert state == sparse_state
+    x0, y0, x1, y1 = sparse.bounds()
+    assert np.array_equal(macro.window(x0, y0, x1 - x0, y1 - y0), sparse.window(x0, y0, x1 - x0, y1 - y0))
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from multi_ant import MULTI_KERNEL, MultiAntEngine
+
+BACKENDS = ["numpy"] + (["numba"] if MULTI_KERNEL is not None else [])
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_next_state_without_rules_is_in_range(backend):
+    # State 1 is only reached through next_state and has no rules of its own
+    engine = MultiAntEngine([{(0, 0): (1, 1, 1), (0, 1): (0, -1, 0)}], grid_size=16, backend=backend)
+    assert engine.write_table.shape[1] == 2
+    engine.add_ant(8, 8)
+    engine.step(10)
+    # An ant without a rule for its (state, color) stays put in that state
+    assert engine.state.tolist() == [1]
+    assert (engine.x[0], engine.y[0]) == (9, 8)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_painted_colors_beyond_tables_are_rejected(backend):
+    engine = MultiAntEngine([{(0, 0): (1, 1, 0), (0, 1): (0, -1, 0)}], grid_size=16, backend=backend)
+    engine.add_ant(8, 8)
+    engine.grid[3, 3] = 7
+    with pytest.raises(ValueError):
+        engine.step(1)
+    # Rebuilding the tables covers the painted colors, which keep their color and stop the ant
+    engine.set_turmites([{(0, 0): (1, 1, 0), (0, 1): (0, -1, 0)}])
+    assert engine.write_table.shape[2] == 8
+    engine.step(5)
+    assert engine.grid[3, 3] == 7
+
+
+def test_negative_states_are_rejected():
+    with pytest.raises(ValueError):
+        MultiAntEngine([{(0, 0): (1, 1, -1)}], grid_size=16)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_rejected_ants_leave_engine_unchanged(backend):
+    engine = MultiAntEngine([{(0, 0): (1, 1, 0), (0, 1): (0, -1, 0)}], grid_size=16, backend=backend)
+    engine.add_ant(8, 8)
+    for bad in [{"species": 50000}, {"species": -1}, {"states": 3}, {"states": -1}]:
+        with pytest.raises(ValueError):
+            engine.add_ants([1, 2], [1, 2], **bad)
+    assert engine.num_ants == 1
+    engine.step(10)
+    assert engine.ticks == 10
+
+
+@pytest.mark.skipif(MULTI_KERNEL is None, reason="needs Numba")
+def test_backends_agree_when_ants_collide():
+    # Four species that write different colors, started in pairs on shared
+    # cells and facing each other, so they keep meeting: the lowest index's
+    # write must win in both backends
+    turmites = [{(0, 0): (color, turn, 0), (0, color): (0, -turn, 0)}
+                for color, turn in [(1, 1), (2, -1), (3, 1), (4, -1)]]
+    engines = [MultiAntEngine(turmites, grid_size=16, backend=backend) for backend in ["numpy", "numba"]]
+    traces = []
+    for engine in engines:
+        engine.add_ants([8, 8, 8, 9, 9, 9], [8, 8, 8, 8, 8, 8], dirs=[0, 1, 2, 3, 0, 2],
+                        species=[3, 0, 1, 2, 1, 0])
+        headings = np.zeros((200, engine.num_ants), dtype=np.uint8)
+        colors = np.zeros((200, engine.num_ants), dtype=np.uint8)
+        engine.step(200, headings, colors)
+        traces.append((engine.grid.copy(), headings, colors, engine.x.copy(), engine.y.copy()))
+    for numpy_array, numba_array in zip(*traces):
+        assert np.array_equal(numpy_array, numba_array)
+    # The first tick wrote the lowest index's color on each shared cell: species 3 at (8, 8), 2 at (9, 8)
+    fresh = MultiAntEngine(turmites, grid_size=16, backend="numba")
+    fresh.add_ants([8, 8, 8, 9, 9, 9], [8, 8, 8, 8, 8, 8], dirs=[0, 1, 2, 3, 0, 2], species=[3, 0, 1, 2, 1, 0])
+    fresh.step(1)
+    assert (fresh.grid[8, 8], fresh.grid[8, 9]) == (4, 3)
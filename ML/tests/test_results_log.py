@@ -0,0 +1,47 @@
+import time
+from ant_core import rules_from_turn_string
+from results_log import ResultsSink, read_results, rules_record
+
+
+def wait_for_file(path, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if path.exists():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_lone_record_is_flushed_after_interval(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = ResultsSink(str(path), flush_interval=0.1)
+    sink.write(rules_record({0: 1, 1: 0}, {0: 1, 1: 0}, 10000))
+    assert not path.exists()  # Buffered, and no further writes follow
+    assert wait_for_file(path, 5.0)
+    assert len(read_results(str(path))) == 1
+    assert len(sink) == 1
+    sink.close()
+
+
+def test_batch_is_flushed_once_full(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = ResultsSink(str(path), flush_records=3, flush_interval=60.0)
+    for turns in ["RL", "RLL", "RLLR"]:
+        rules, turns = rules_from_turn_string(turns)
+        sink.write(rules_record(rules, turns, 100))
+    assert [len(record["rules"]) for record in read_results(str(path))] == [2, 3, 4]
+    sink.close()
+    assert ResultsSink(str(path)).count == 3
+
+
+def test_each_ruleset_is_logged_once(tmp_path):
+    path = tmp_path / "results.jsonl"
+    sink = ResultsSink(str(path))
+    assert sink.write(rules_record(*rules_from_turn_string("RL"), 10400))
+    assert not sink.write(rules_record(*rules_from_turn_string("RL"), 20800))
+    assert not sink.write(rules_record(*rules_from_turn_string("LR"), 10400))  # The mirror image
+    sink.close()
+    reopened = ResultsSink(str(path))
+    assert len(read_results(str(path))) == len(reopened) == 1
+    assert not reopened.write(rules_record(*rules_from_turn_string("RL"), 10400))
+    reopened.close()
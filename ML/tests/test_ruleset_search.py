@@ -0,0 +1,13 @@
+import ruleset_search
+
+
+def test_symmetry_must_hold_through_the_end(monkeypatch):
+    # Symmetric at the first check, broken later: chaotic, and never checked again
+    checks = iter([True, False])
+    monkeypatch.setattr(ruleset_search, "is_symmetric", lambda grid: next(checks, True))
+    assert ruleset_search.simulate("LLRR", 50000)["outcome"] == "chaotic"
+
+
+def test_symmetric_at_every_check(monkeypatch):
+    monkeypatch.setattr(ruleset_search, "is_symmetric", lambda grid: True)
+    assert ruleset_search.simulate("LLRR", 50000)["outcome"] == "symmetric"
@@ -0,0 +1,19 @@
+import numpy as np
+from results_log import ResultsSink
+from shm_vec_env import SharedMemoryVecEnv
+
+
+def test_worker_highways_reach_the_parent_log(tmp_path):
+    sink = ResultsSink(str(tmp_path / "results.jsonl"))
+    env = SharedMemoryVecEnv(2, results_log=sink)
+    try:
+        env.reset()
+        rewards = []
+        for _ in range(104):  # The classic ant reaches its highway in both workers
+            _, step_rewards, dones, infos = env.step(np.array([1, 1]))
+            rewards += step_rewards[dones].tolist()
+            assert all("results" not in info for info in infos)
+    finally:
+        env.close()
+    assert sorted(rewards) == [50, 50]  # Each worker found it new
+    assert len(sink) == 1  # Logged once, by the parent
@@ -0,0 +1,40 @@
+import time
+import numpy as np
+import pytest
+from langtons_ant import LangtonsAnt
+from mip_pyramid import MipPyramid
+from simulation_worker import SimulationWorker
+
+
+@pytest.mark.parametrize("backend", ["dense", "packed"])
+def test_traced_positions_keep_pyramid_current(backend):
+    # Driven without the thread: _step is one batch, read() serves the reader directly
+    ant = LangtonsAnt(backend, 256)
+    worker = SimulationWorker(ant)
+    pyramid = MipPyramid(256, 256)
+    worker.read(pyramid.update, positions=True)  # Nothing traced yet: a full diff
+    for steps in [100, 5000, 20000, 1]:
+        with worker.lock:
+            worker._step(steps)
+        worker.read(pyramid.update, positions=True)
+    with worker.lock:
+        ant.reser_simulatin()  # Clears cells the ant is not on
+        worker.invalidate()
+    worker.read(pyramid.update, positions=True)
+    expected = MipPyramid(256, 256)
+    expected.rebuild(ant.visible_grid())
+    for level, expected_level in zip(pyramid.levels, expected.levels):
+        assert np.array_equal(level, expected_level)
+
+
+def test_total_steps_counts_steps_taken():
+    # The ant starts on color 0, which has no rule, so it never moves
+    ant = LangtonsAnt("dense", 64, rules={1: 0}, turns={1: 1})
+    worker = SimulationWorker(ant)
+    with worker.lock:
+        assert worker._step(100) == 0
+    worker.start()
+    worker.start_simulation()
+    time.sleep(0.1)
+    worker.stop()
+    assert worker.total_steps == 0
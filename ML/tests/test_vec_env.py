@@ -0,0 +1,68 @@
+import random
+import numpy as np
+from ai_training import LangtonsAntEnv
+from results_log import ResultsSink
+from results_store import ResultsStore
+from vec_env import BatchedLangtonsAntVecEnv
+
+
+class Choices:
+    # Stands in for the random turns add_rule draws, the same in both envs
+    def __init__(self, turns):
+        self.turns = iter(turns)
+
+    def choice(self, options):
+        return next(self.turns, options[-1])
+
+
+def test_vec_env_matches_env(tmp_path, monkeypatch):
+    store = ResultsStore(str(tmp_path / "rulesets.sqlite"))
+    # As after a ruleset_search: every ruleset an episode passes through is known
+    store.put({"turns": "RL", "outcome": "highway", "steps": 10368, "period": 104, "drift": [-2, 2]})
+    for turns in ["RLL", "RLLR", "RLLRR", "RLLRRR", "RLLRRRR", "RLLRRRRR", "RLLRRRRRR", "RLLRRRRRRR"]:
+        store.put({"turns": turns, "outcome": "chaotic", "steps": 50000})
+    sink = ResultsSink(str(tmp_path / "results.jsonl"))
+    monkeypatch.setattr(random, "choice", Choices([-1]).choice)
+    env = LangtonsAntEnv(results_store=store, results_log=sink)
+    vec_env = BatchedLangtonsAntVecEnv(1, results_store=store, results_log=sink)
+    vec_env.rngs[0] = Choices([-1])
+    env.reset()
+    vec_env.reset()
+    # The classic ant to its known highway, then up to the known RLLRRRRRRR for the full budget
+    actions = [1] * 104 + [0] * 500
+    steps = []
+    for action in actions:
+        observation, reward, terminated, truncated, info = env.step(action)
+        vec_observations, vec_rewards, vec_dones, vec_infos = vec_env.step(np.array([action]))
+        if terminated:
+            assert np.array_equal(observation, vec_infos[0]["terminal_observation"])
+            observation, _ = env.reset()
+        assert np.array_equal(observation, vec_observations[0])
+        assert (reward, terminated) == (vec_rewards[0], vec_dones[0])
+        assert info.get("known_outcome") == vec_infos[0].get("known_outcome")
+        steps.append((reward, terminated))
+    assert steps[103] == (0, True)  # A known highway earns nothing
+    assert not sink.count
+    assert steps[104] == (0, False)  # Known rulesets on the way do not end the episode
+    assert steps[-1] == (-20, True)  # The last action of the budget, not simulated
+    assert all(not terminated for _, terminated in steps[104:-1])
+    sink.close()
+    store.close()
+
+
+def test_repeated_highway_is_rewarded_once(tmp_path):
+    sink = ResultsSink(str(tmp_path / "results.jsonl"))
+    env = LangtonsAntEnv(results_log=sink)
+    vec_env = BatchedLangtonsAntVecEnv(2, results_log=ResultsSink(str(tmp_path / "vec_results.jsonl")))
+    vec_env.reset()
+    rewards, vec_rewards = [], []
+    for _ in range(3 * 104):
+        _, reward, terminated, _, _ = env.step(1)
+        if terminated:
+            rewards.append(reward)
+            env.reset()
+        _, step_rewards, dones, _ = vec_env.step(np.array([1, 1]))
+        vec_rewards += step_rewards[dones].tolist()
+    assert rewards == [50, 0, 0]
+    assert sorted(vec_rewards) == [0] * 5 + [50]  # Two ants, one new highway between them
+    assert len(sink) == len(vec_env.results_log) == 1
@@ -0,0 +1,33 @@
+import time
+from stable_baselines3.common.callbacks import BaseCallback
+import instrumentation
+
+
+class InstrumentationCallback(BaseCallback):
+    # Sends the instrumentation timers and counters to the SB3 logger (and so
+    # to TensorBoard when it is configured) once per rollout, and times the
+    # rollouts and the PPO updates between them
+    def __init__(self, verbose=0):
+        super().__init__(verbose)
+        self.rollout_start = None
+        self.rollout_end = None
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self.rollout_end is not None:
+            instrumentation.add_time("ppo.update", now - self.rollout_end)
+        self.rollout_start = now
+
+    def _on_rollout_end(self):
+        self.rollout_end = time.perf_counter()
+        instrumentation.add_time("ppo.rollout", self.rollout_end - self.rollout_start)
+        stats = instrumentation.summary(clear=True)
+        elapsed = max(stats["elapsed"], 1e-9)
+        for name, (seconds, calls) in stats["timers"].items():
+            self.logger.record(f"perf/{name}_ms", 1000 * seconds)
+            self.logger.record(f"perf/{name}_share", seconds / elapsed)
+        for name, total in stats["counters"].items():
+            self.logger.record(f"perf/{name}_per_sec", total / elapsed)
+
+    def _on_step(self):
+        return True
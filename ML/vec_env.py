@@ -0,0 +1,180 @@
+import numpy as np
+import gymnasium as gym
+import instrumentation
+from stable_baselines3.common.vec_env import VecEnv
+from ant_core import turn_string_from_rules
+from batch_engine import BatchAntEngine
+from highway import BatchHighwayDetector
+from observations import Observer
+from results_log import default_sink, rules_record
+
+# Constants (same as ai_training.py)
+GRID_SIZE = 160
+STEPS_BEFORE_CHECK = 50000
+STEPS_PER_ACTION = 100
+MAX_RULES = 10
+OBS_MODE = "local"  # Same default as ai_training.OBS_MODE
+
+
+class BatchedLangtonsAntVecEnv(VecEnv):
+    # N copies of LangtonsAntEnv behind the SB3 VecEnv interface. All ants are
+    # advanced together by one BatchAntEngine call and checked by one
+    # BatchHighwayDetector, so a rollout step costs a few NumPy operations
+    # across the batch instead of N Python env steps. Observations and rewards
+    # match LangtonsAntEnv; finished episodes are auto-reset the SB3 way, with
+    # the final observation in info["terminal_observation"].
+    def __init__(self, num_envs, grid_size=GRID_SIZE, results_store=None, obs_mode=OBS_MODE, results_log=None):
+        self.render_mode = None
+        self.grid_size = grid_size
+        # Optional ResultsStore, only read: episodes change rules on a painted
+        # torus, so their highways are logged but never stored as a ruleset's outcome
+        self.results_store = results_store
+        self.results_log = default_sink() if results_log is None else results_log
+        self.engine = BatchAntEngine(num_envs, grid_size=grid_size, max_colors=MAX_RULES)
+        self.detector = BatchHighwayDetector(num_envs)
+        self.rules = [None] * num_envs
+        self.turns = [None] * num_envs
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.headings = np.empty((STEPS_PER_ACTION, num_envs), dtype=np.uint8)
+        self.colors = np.empty((STEPS_PER_ACTION, num_envs), dtype=np.uint8)
+        self.rngs = [np.random.default_rng() for _ in range(num_envs)]
+        self.actions = None
+        self.observer = Observer(obs_mode, num_envs, grid_size, MAX_RULES)
+        observation_space = self.observer.space
+        action_space = gym.spaces.Discrete(2)  # 0: add rule, 1: remove rule
+        super().__init__(num_envs, observation_space, action_space)
+
+    def _reset_env(self, i):
+        instrumentation.count("resets")
+        self.engine.reset(i)
+        self.rules[i] = {0: 1, 1: 0}
+        self.turns[i] = {0: 1, 1: -1}
+        self.engine.set_rules(i, self.rules[i], self.turns[i])
+        self.observer.reset(i)
+        self.observer.set_rules(i, self.turns[i])
+        self.detector.reset(i)
+        self.steps[i] = 0
+
+    def _observations(self):
+        # SB3 keeps the returned array across the next step, so hand out a copy of the shared buffer
+        with instrumentation.phase("vec_env.observe"):
+            observations = self.observer.observe(self.engine.grids, self.engine.x, self.engine.y).copy()
+        instrumentation.count("observation_bytes", observations.nbytes)
+        return observations
+
+    def reset(self):
+        for i in range(self.num_envs):
+            if self._seeds[i] is not None:
+                self.rngs[i] = np.random.default_rng(self._seeds[i])
+            self._reset_env(i)
+        self._reset_seeds()
+        self._reset_options()
+        return self._observations()
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        # Same rewards and dones as LangtonsAntEnv.step: a highway or
+        # STEPS_BEFORE_CHECK steps end an episode. A known highway earns
+        # nothing, and the last action of a budget spent on a ruleset known
+        # not to form one is not simulated.
+        known = [None] * self.num_envs
+        for i, action in enumerate(self.actions):
+            if action == 0:
+                self.add_rule(i)
+            elif action == 1:
+                self.remove_rule(i)
+            known[i] = self.lookup_known_result(i)
+        known_highway = np.array([result is not None and result["outcome"] == "highway" for result in known])
+        active = np.array([result is None or result["outcome"] == "highway"
+                           or self.steps[i] + STEPS_PER_ACTION < STEPS_BEFORE_CHECK
+                           for i, result in enumerate(known)])
+
+        x0, y0 = self.engine.x.copy(), self.engine.y.copy()
+        with instrumentation.phase("vec_env.simulate"):
+            self.engine.step(STEPS_PER_ACTION, self.headings, self.colors, active=None if active.all() else active)
+        instrumentation.count("steps", STEPS_PER_ACTION * int(active.sum()))
+        with instrumentation.phase("vec_env.highway"):
+            highway = self.detector.extend(self.headings, self.colors) & active
+        with instrumentation.phase("vec_env.observe"):
+            rule_tables = self.engine.rule_table
+            if not active.all():
+                # Skipped ants are traced as stuck on color 0: record it as left unchanged
+                rule_tables = rule_tables.copy()
+                rule_tables[~active, 0] = 0
+            self.observer.record(x0, y0, self.headings, self.colors, rule_tables)
+        self.steps[active] += STEPS_PER_ACTION
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)  # Highways are rewarded once logged, below
+        failed = ((self.steps >= STEPS_BEFORE_CHECK) & ~highway) | ~active
+        rewards[failed] -= 20  # Penalize for failing to create a highway
+        dones = highway | failed
+        infos = [{} if result is None else {"known_outcome": result["outcome"]} for result in known]
+
+        observations = self._observations()
+        for i in np.flatnonzero(dones):
+            if highway[i]:
+                infos[i]["highway_period"] = int(self.detector.period[i])
+                infos[i]["highway_drift"] = tuple(int(v) for v in self.detector.drift[i])
+                # Only a highway that is neither known nor logged before earns the reward
+                if not known_highway[i] and self.save_successful_rules(i):
+                    rewards[i] += 50  # Large reward for highway
+            infos[i]["terminal_observation"] = observations[i].copy()
+            infos[i]["TimeLimit.truncated"] = False
+            self._reset_env(i)
+        if dones.any():
+            observations[dones] = self.observer.observe(self.engine.grids, self.engine.x, self.engine.y)[dones]
+        return observations, rewards, dones, infos
+
+    def add_rule(self, i):
+        rules, turns = self.rules[i], self.turns[i]
+        if len(rules) < MAX_RULES:  # Limit to 10 rules
+            new_color = len(rules)
+            rules[new_color] = 0
+            rules[new_color - 1] = new_color
+            turns[new_color] = int(self.rngs[i].choice([-1, 1]))
+            self.engine.set_rules(i, rules, turns)
+            self.observer.set_rules(i, turns)
+
+    def remove_rule(self, i):
+        rules, turns = self.rules[i], self.turns[i]
+        if len(rules) > 2:
+            last_color = len(rules) - 1
+            # Convert all cells with the last color to 0
+            grid = self.engine.grids[i]
+            grid[grid == last_color] = 0
+            del rules[last_color]
+            del turns[last_color]
+            self.engine.set_rules(i, rules, turns)
+            self.observer.set_rules(i, turns)
+            self.observer.replace_color(i, last_color, 0)
+
+    def lookup_known_result(self, i):
+        if self.results_store is None:
+            return None
+        turn_string = turn_string_from_rules(self.rules[i], self.turns[i])
+        if turn_string is None:
+            return None
+        return self.results_store.get(turn_string, min_steps=STEPS_BEFORE_CHECK)
+
+    def save_successful_rules(self, i):
+        # False if the ruleset's highway was logged before
+        return self.results_log.write(rules_record(self.rules[i], self.turns[i], self.steps[i], self.detector.period[i],
+                                            self.detector.drift[i], "vec_env"))
+
+    def close(self):
+        pass
+
+    # The sub-environments are rows of shared arrays, so attribute access goes to this object
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(self, method_name)(i, *method_args, **method_kwargs) for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
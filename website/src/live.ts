@@ -0,0 +1,143 @@
+// Viewer for ML/stream_server.py: draws a simulation run by the Python
+// engine from the keyframes and deltas it streams over WebSocket.
+
+// Constants
+const DEFAULT_STREAM: string = 'ws://localhost:8765';
+const CANVAS_SIZE: number = 800;
+const MSG_KEYFRAME: number = 0;
+const MSG_DELTA: number = 1;
+const HEADER_SIZE: number = 21; // type u8, sequence u32, steps u64, ant x i32, ant y i32
+const ANT_COLOR: string = 'rgb(255, 0, 0)';
+
+// Get DOM elements
+const canvas = document.getElementById('gameCanvas') as HTMLCanvasElement;
+const ctx = canvas.getContext('2d') as CanvasRenderingContext2D;
+const streamInput = document.getElementById('streamUrl') as HTMLInputElement;
+const connectButton = document.getElementById('connectButton') as HTMLButtonElement;
+const statusText = document.getElementById('status') as HTMLDivElement;
+const stepsText = document.getElementById('steps') as HTMLDivElement;
+const rateText = document.getElementById('rate') as HTMLDivElement;
+canvas.width = CANVAS_SIZE;
+canvas.height = CANVAS_SIZE;
+
+// The view, one pixel per cell, scaled up onto the canvas
+const board = document.createElement('canvas');
+const boardCtx = board.getContext('2d') as CanvasRenderingContext2D;
+
+class LiveView {
+    private image: ImageData | null = null;
+    private pixels: Uint32Array | null = null; // One RGBA word per cell
+    private palette: Uint32Array = new Uint32Array(0);
+    private seq: number = -1;
+    private dirty: boolean = false;
+    private antX: number = 0;
+    private antY: number = 0;
+    private steps: number = 0;
+    private bytes: number = 0;
+    private socket: WebSocket | null = null;
+    // Keyframes are decompressed asynchronously, so messages are applied in arrival order through this chain
+    private pending: Promise<void> = Promise.resolve();
+
+    connect(url: string): void {
+        this.socket?.close();
+        this.seq = -1;
+        const socket = new WebSocket(url);
+        socket.binaryType = 'arraybuffer';
+        socket.onopen = () => { statusText.textContent = `Connected to ${url}`; };
+        socket.onclose = () => { statusText.textContent = 'Disconnected'; };
+        socket.onerror = () => { statusText.textContent = `Could not connect to ${url}`; };
+        socket.onmessage = (event: MessageEvent) => {
+            const data = event.data as ArrayBuffer;
+            this.bytes += data.byteLength;
+            this.pending = this.pending.then(() => this.apply(data));
+        };
+        this.socket = socket;
+    }
+
+    private async apply(data: ArrayBuffer): Promise<void> {
+        const view = new DataView(data);
+        const type = view.getUint8(0);
+        const seq = view.getUint32(1, true);
+        this.steps = Number(view.getBigUint64(5, true));
+        this.antX = view.getInt32(13, true);
+        this.antY = view.getInt32(17, true);
+        if (type === MSG_KEYFRAME) {
+            const width = view.getUint32(HEADER_SIZE, true);
+            const height = view.getUint32(HEADER_SIZE + 4, true);
+            const colors = view.getUint16(HEADER_SIZE + 8, true);
+            const paletteStart = HEADER_SIZE + 10;
+            this.palette = new Uint32Array(256);
+            for (let i = 0; i < colors; i++) {
+                const [r, g, b] = new Uint8Array(data, paletteStart + 3 * i, 3);
+                this.palette[i] = (255 << 24 | b << 16 | g << 8 | r) >>> 0;
+            }
+            // Cells are zlib data, the "deflate" format of the Compression Streams API
+            const compressed = new Blob([data.slice(paletteStart + 3 * colors)]);
+            const cells = new Uint8Array(await new Response(
+                compressed.stream().pipeThrough(new DecompressionStream('deflate'))).arrayBuffer());
+            if (board.width !== width || board.height !== height) {
+                board.width = width;
+                board.height = height;
+            }
+            this.image = boardCtx.createImageData(width, height);
+            this.pixels = new Uint32Array(this.image.data.buffer);
+            for (let i = 0; i < cells.length; i++) {
+                this.pixels[i] = this.palette[cells[i]];
+            }
+        } else if (type === MSG_DELTA && this.pixels !== null && seq === this.seq + 1) {
+            const count = view.getUint32(HEADER_SIZE, true);
+            const start = HEADER_SIZE + 4;
+            // Copied out, as the indices are not 4-byte aligned in the message
+            const indices = new Uint32Array(data.slice(start, start + 4 * count));
+            const colors = new Uint8Array(data, start + 4 * count, count);
+            for (let i = 0; i < count; i++) {
+                this.pixels[indices[i]] = this.palette[colors[i]];
+            }
+        } else {
+            return; // A delta before the first keyframe, or out of order
+        }
+        this.seq = seq;
+        this.dirty = true;
+    }
+
+    draw(): void {
+        if (!this.dirty || this.image === null) return;
+        this.dirty = false;
+        boardCtx.putImageData(this.image, 0, 0);
+        ctx.imageSmoothingEnabled = false;
+        ctx.drawImage(board, 0, 0, CANVAS_SIZE, CANVAS_SIZE);
+        const cell = CANVAS_SIZE / board.width;
+        ctx.fillStyle = ANT_COLOR;
+        ctx.fillRect(this.antX * cell, this.antY * cell, Math.max(cell, 2), Math.max(cell, 2));
+        stepsText.textContent = `Steps: ${this.steps.toLocaleString()}`;
+    }
+
+    takeBytes(): number {
+        const bytes = this.bytes;
+        this.bytes = 0;
+        return bytes;
+    }
+}
+
+const live = new LiveView();
+
+// Redraw at most once per animation frame, however many messages arrived
+function animate(): void {
+    live.draw();
+    requestAnimationFrame(animate);
+}
+
+// Received bandwidth, once a second
+setInterval(() => {
+    rateText.textContent = `Stream: ${(live.takeBytes() / 1024).toFixed(1)} KiB/s`;
+}, 1000);
+
+// Event listeners
+connectButton.addEventListener('click', () => {
+    live.connect(streamInput.value);
+});
+
+// Connect to ?stream=ws://host:port, or the default local server
+streamInput.value = new URLSearchParams(window.location.search).get('stream') ?? DEFAULT_STREAM;
+live.connect(streamInput.value);
+animate();
@@ -19,6 +19,11 @@ app.get('/ant', (req: express.Request, res: express.Response) => {
     res.render('ant');
 });
 
+// Viewer for a simulation streamed by the Python engine (ML/stream_server.py)
+app.get('/live', (req: express.Request, res: express.Response) => {
+    res.render('live');
+});
+
 // Start the server
 const PORT = process.env.PORT;
 